@@ -0,0 +1,40 @@
+from typing import Annotated, Any
+
+from fastapi import APIRouter, Depends, HTTPException
+
+from models.user import User
+
+from repositories.base import BaseRepository
+from repositories.indexes import IndexRegistry
+from repositories.schemas import UnindexedQueryShape
+
+from services.auth import AuthService
+
+async def get_admin_user(user: Annotated[User, Depends(AuthService.get_user_from_token)]) -> User:
+    # users listed in AUTH_ADMIN_USER_IDS
+    if not AuthService.is_admin(user):
+        raise HTTPException(status_code=403, detail="Admin users only")
+
+    return user
+
+router = APIRouter(tags=["Admin"])
+
+@router.get("/unindexed-queries")
+async def get_unindexed_queries(user: Annotated[User, Depends(get_admin_user)]) -> list[UnindexedQueryShape]:
+    return IndexRegistry.get_unindexed_shapes()
+
+@router.get("/single-flight")
+async def get_single_flight_stats(user: Annotated[User, Depends(get_admin_user)]) -> dict[str, int]:
+    return BaseRepository.get_single_flight().stats()
+
+@router.get("/entity-cache")
+async def get_entity_cache_stats(user: Annotated[User, Depends(get_admin_user)]) -> dict[str, dict[str, int]]:
+    return BaseRepository.get_entity_cache().stats()
+
+@router.get("/password-hashing")
+async def get_password_hashing_stats(user: Annotated[User, Depends(get_admin_user)]) -> dict[str, Any]:
+    return AuthService.get_hashing_pool().stats()
+
+@router.get("/login-throttle")
+async def get_login_throttle_stats(user: Annotated[User, Depends(get_admin_user)]) -> dict[str, int]:
+    return AuthService.get_login_throttle().stats()
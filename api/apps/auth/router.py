@@ -3,18 +3,25 @@ from apps.auth.requests import LoginRequest
 from apps.auth.responses import LoginResponse
 from services.auth import AuthService
 
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Request
 
-from services.exceptions import UserNotFoundExcepotion
+from services.exceptions import IncorrectPasswordException, LoginThrottledException, PasswordHashingSaturatedException, UserNotFoundExcepotion
 
 router = APIRouter(tags=["Auth"])
 
 @router.post("/login")
-async def login(request: LoginRequest) -> LoginResponse:
+async def login(request: LoginRequest, http_request: Request) -> LoginResponse:
+    # direct peer address, deployments behind a proxy need uvicorn's --forwarded-allow-ips for the real client
+    client_ip = http_request.client.host if http_request.client is not None else None
+
     try:
-        token = await AuthService.login(request)
-    except UserNotFoundExcepotion:
+        token = await AuthService.login(request, client_ip)
+    except (UserNotFoundExcepotion, IncorrectPasswordException):
         raise HTTPException(status_code=400, detail="Incorrect username/email or password")
+    except LoginThrottledException as ex:
+        raise HTTPException(status_code=429, detail="Too many login attempts, try again later", headers={"Retry-After": str(ex.retry_after_seconds)})
+    except PasswordHashingSaturatedException:
+        raise HTTPException(status_code=503, detail="Too many logins in progress, try again later", headers={"Retry-After": "1"})
 
     return LoginResponse.model_validate(token.model_dump())
 
@@ -11,9 +11,11 @@ from repositories.user import UserRepository
 from models.user import User, UserDataPublic
 
 from services.auth import AuthService
-from services.exceptions import UsernameExistsException, EmailExistsException
+from services.exceptions import PasswordHashingSaturatedException, UsernameExistsException, EmailExistsException
+from services.serialization import NDJSON_MEDIA_TYPE, ResponseSerializer
 
 from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import StreamingResponse
 
 router = APIRouter(tags=["User"])
 
@@ -27,10 +29,10 @@ async def get_user_by_id(_id: PydanticObjectId) -> GetUserResponse:
     return GetUserResponse.model_validate(user.model_dump())
 
 @router.get("/all")
-async def get_all_users():
+async def get_all_users() -> StreamingResponse:
     # TODO: For debugging, remove later
     repo = await RepositoryFactory.get_repository(UserRepository)
-    return await repo.get_all().to_list()
+    return StreamingResponse(ResponseSerializer.iter_ndjson(repo.iter_batches(repo.get_all())), media_type = NDJSON_MEDIA_TYPE)
 
 @router.post("/")
 async def create_user(request: CreateUserRequest) -> CreateUserResponse:
@@ -40,10 +42,19 @@ async def create_user(request: CreateUserRequest) -> CreateUserResponse:
         raise HTTPException(status_code=400, detail=f"Username '{request.username}' is taken")
     except EmailExistsException:
         raise HTTPException(status_code=400, detail=f"Email '{request.email}' is used by another user")
+    except PasswordHashingSaturatedException:
+        raise HTTPException(status_code=503, detail="Server is busy, try again later", headers={"Retry-After": "1"})
 
     return CreateUserResponse.model_validate(new_user.model_dump())
 
 @router.put("/{_id}")
 async def update_user(_id: PydanticObjectId, request: UpdateUserRequest):
     # TODO: Authentication - or remove this endpoint and add reset password endpoint
-    return await AuthService.update_user(_id, request)
\ No newline at end of file
+    try:
+        return await AuthService.update_user(_id, request)
+    except UsernameExistsException:
+        raise HTTPException(status_code=400, detail=f"Username '{request.username}' is taken")
+    except EmailExistsException:
+        raise HTTPException(status_code=400, detail=f"Email '{request.email}' is used by another user")
+    except PasswordHashingSaturatedException:
+        raise HTTPException(status_code=503, detail="Server is busy, try again later", headers={"Retry-After": "1"})
\ No newline at end of file
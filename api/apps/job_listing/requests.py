@@ -0,0 +1,67 @@
+from datetime import datetime
+from enum import StrEnum
+from typing import ClassVar
+
+from beanie import PydanticObjectId
+from pydantic import Field, model_validator
+
+from apps.schemas import BaseRequest
+from models.job_listing import Currency, ExperienceLevel, WorkplaceType
+
+class ListingView(StrEnum):
+    SUMMARY = "summary"
+    FULL = "full"
+
+class ListingFilterRequest(BaseRequest):
+    # each field is backed by an index declared on JobListing
+    min_salary: float | None = None # listings paying up to at least this much
+    max_salary: float | None = None # listings paying at least this much at the low end
+    currency: Currency | None = None
+
+    workplace_type: list[WorkplaceType] | None = None # any of
+    experience: list[ExperienceLevel] | None = None # any of
+
+    skills_any: list[str] | None = None
+    skills_all: list[str] | None = None
+
+    company: str | None = None
+    location: str | None = None
+
+    posted_after: datetime | None = None
+    posted_before: datetime | None = None
+
+    @model_validator(mode="after")
+    def _check_salary_currency(self):
+        if (self.min_salary is not None or self.max_salary is not None) and self.currency is None:
+            raise ValueError("currency is required when filtering by salary")
+
+        return self
+
+class ListingPageRequest(ListingFilterRequest):
+    page: int = 1
+    size: int = 10
+    after: str | None = None
+    view: ListingView = ListingView.FULL
+
+class ListingByIdsRequest(BaseRequest):
+    MAX_IDS: ClassVar[int] = 100
+
+    ids: list[PydanticObjectId] = Field(min_length = 1, max_length = MAX_IDS)
+    view: ListingView = ListingView.FULL
+
+class ListingSearchRequest(ListingFilterRequest):
+    q: str = Field(min_length = 1, max_length = 256)
+    page: int = 1
+    size: int = 10
+    view: ListingView = ListingView.FULL
+
+class MarketStatsRequest(BaseRequest):
+    # omitted values match any value, omitting currency returns one result per currency
+    skill: str | None = None
+    workplace_type: WorkplaceType | None = None
+    experience: ExperienceLevel | None = None
+    currency: Currency | None = None
+
+class ListingExportRequest(ListingFilterRequest):
+    order_by: str = "date_created"
+    ascending: bool = False
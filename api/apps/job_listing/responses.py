@@ -0,0 +1,62 @@
+from datetime import datetime
+
+from apps.schemas import BaseResponse
+from models.export_job import ExportJobStatus
+from models.import_job import ImportErrorTypeCount, ImportJobStatus, ImportPriority
+from models.job_listing import Currency
+
+class FacetValueCount(BaseResponse):
+    value: int | str
+    count: int
+
+class ListingFacetsResponse(BaseResponse):
+    # most common values first
+    skills: list[FacetValueCount]
+    workplace_type: list[FacetValueCount]
+    currency: list[FacetValueCount]
+    experience: list[FacetValueCount]
+
+class SalaryStats(BaseResponse):
+    # quantiles are approximate, see MarketStatsService.SKETCH_RELATIVE_ERROR
+    count: int
+    mean: float
+    p25: float
+    median: float
+    p75: float
+    p90: float
+
+class MarketStatsResponse(BaseResponse):
+    currency: Currency
+    count: int
+    min_salary: SalaryStats | None
+    max_salary: SalaryStats | None
+
+class ExportJobResponse(BaseResponse):
+    # the public part of ExportJobRecord, lease and file fields stay internal
+    job_id: str
+    status: ExportJobStatus
+    rows_written: int
+    error: str | None
+    date_created: datetime
+    date_finished: datetime | None
+class ImportJobResponse(BaseResponse):
+    # status and progress of ImportJobRecord, worker, lease and file fields stay internal
+    job_id: str
+    priority: ImportPriority
+    status: ImportJobStatus
+    cancel_requested: bool
+    error: str | None
+
+    rows_read: int
+    rows_validated: int
+    rows_inserted: int
+    rows_rejected: int
+    bytes_processed: int
+    bytes_total: int | None
+    rows_per_second: float
+    rejected_error_types: list[ImportErrorTypeCount]
+
+    date_created: datetime
+    date_started: datetime | None
+    date_updated: datetime | None
+    date_finished: datetime | None
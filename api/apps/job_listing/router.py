@@ -1,38 +1,93 @@
 from typing import Annotated
 from beanie import PydanticObjectId
 
-from apps.schemas import PaginatedResponse
+from apps.job_listing.requests import ListingByIdsRequest, ListingExportRequest, ListingFilterRequest, ListingPageRequest, ListingSearchRequest, ListingView, MarketStatsRequest
+from apps.job_listing.responses import ExportJobResponse, ImportJobResponse, ListingFacetsResponse, MarketStatsResponse
+from apps.schemas import ItemsByIdsResponse, PaginatedResponse, ScoredItem
 from repositories.factory import RepositoryFactory
+from repositories.exceptions import InvalidCursorException, OrderFieldNotExistsException, UnindexedQueryException
 from repositories.job_listing import JobListingRepository
+from repositories.schemas import OrderByField
 
-from models.job_listing import JobListing, JobListingData
+from models.import_job import ImportPriority
+from models.job_listing import JobListing, JobListingData, JobListingSummary
 from models.user import User
 
-from fastapi import APIRouter, Depends, UploadFile
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, UploadFile
+from fastapi.responses import FileResponse, StreamingResponse
 
 from services.auth import AuthService
+from services.data_export import ExportService
 from services.data_import import ImportService
+from services.exceptions import (ExportJobNotFinishedException, ExportJobNotFoundException, ImportJobNoRejectedRowsException,
+                                 ImportJobNotCancellableException, ImportJobNotFinishedException, ImportJobNotFoundException)
 from services.factory import ServiceFactory
 from services.job_listing import JobListingService
+from services.listing_facet import ListingFacetService
+from services.market_stats import MarketStatsService
+from services.serialization import NDJSON_MEDIA_TYPE
 
 router = APIRouter(tags=["Job listings"])
 
 # TODO: Add response classes
 
+_LISTING_VIEW_PROJECTIONS = {
+    ListingView.SUMMARY: JobListingSummary,
+    ListingView.FULL: None,
+}
+
 @router.get("/all")
-async def get_all_listings():
-    # TODO: For debugging, remove later
-    listing_repo = await RepositoryFactory.get_repository(JobListingRepository)
-    return await listing_repo.get_all().to_list()
+async def get_all_listings(listing_service: JobListingService = Depends(ServiceFactory.get_job_listing_service)) -> StreamingResponse:
+    # every listing as one json document per line, streamed in batches (see DocumentService.export_ndjson)
+    return StreamingResponse(listing_service.export_ndjson(), media_type = NDJSON_MEDIA_TYPE)
+
+@router.get("/", response_model = PaginatedResponse[JobListing] | PaginatedResponse[JobListingSummary])
+async def get_listing_page(request: Annotated[ListingPageRequest, Query()],
+                           listing_service: JobListingService = Depends(ServiceFactory.get_job_listing_service)) -> Response:
+    try:
+        content = await listing_service.get_page_json(request.page, request.size,
+            *listing_service.get_filter_mappings(request),
+            after = request.after,
+            projection_model = _LISTING_VIEW_PROJECTIONS[request.view],
+        )
+        return Response(content, media_type = "application/json")
+    except InvalidCursorException:
+        raise HTTPException(status_code=400, detail="Invalid or expired page cursor")
+    except UnindexedQueryException:
+        raise HTTPException(status_code=400, detail="Unsupported filter and sort combination")
+
+@router.get("/search")
+async def search_listings(request: Annotated[ListingSearchRequest, Query()],
+                          listing_service: JobListingService = Depends(ServiceFactory.get_job_listing_service)) -> PaginatedResponse[ScoredItem[JobListing]] | PaginatedResponse[ScoredItem[JobListingSummary]]:
+    return await listing_service.search(request.q, request.page, request.size,
+        *listing_service.get_filter_mappings(request),
+        projection_model = _LISTING_VIEW_PROJECTIONS[request.view],
+    )
+
+@router.get("/facets")
+async def get_listing_facets(request: Annotated[ListingFilterRequest, Query()],
+                             listing_service: JobListingService = Depends(ServiceFactory.get_job_listing_service),
+                             facet_service: ListingFacetService = Depends(ServiceFactory.get_listing_facet_service)) -> ListingFacetsResponse:
+    return await facet_service.get_facets(*listing_service.get_filter_mappings(request))
 
-@router.get("/")
-async def get_listing_page(page: int = 1, size: int = 10, listing_service: JobListingService = Depends(ServiceFactory.get_job_listing_service)) -> PaginatedResponse[JobListing]:
-    return await listing_service.get_page(page, size)
+@router.get("/market-stats")
+async def get_market_stats(request: Annotated[MarketStatsRequest, Query()],
+                           market_stats_service: MarketStatsService = Depends(ServiceFactory.get_market_stats_service)) -> list[MarketStatsResponse]:
+    return await market_stats_service.get_stats(request.skill, request.workplace_type, request.experience, request.currency)
 
 @router.get("/by_id/{_id}")
 async def get_listing_by_id(_id: PydanticObjectId, listing_service: JobListingService = Depends(ServiceFactory.get_job_listing_service)) -> JobListing:
     return await listing_service.get_by_id(_id)
 
+@router.post("/by_ids")
+async def get_listings_by_ids(request: ListingByIdsRequest,
+                              listing_service: JobListingService = Depends(ServiceFactory.get_job_listing_service)) -> ItemsByIdsResponse[JobListing] | ItemsByIdsResponse[JobListingSummary]:
+    projection_model = _LISTING_VIEW_PROJECTIONS[request.view]
+    items, missing_ids = await listing_service.get_many(request.ids, projection_model = projection_model)
+
+    item_type = projection_model if projection_model is not None else JobListing
+    return ItemsByIdsResponse[item_type].model_construct(items = items, missing_ids = missing_ids)
+
 @router.post("/shortlist/{_id}")
 async def shortlist_listing(_id: PydanticObjectId,
                             user: Annotated[User, Depends(AuthService.get_user_from_token)],
@@ -46,13 +101,97 @@ async def create_job_listing(request: JobListingData) -> JobListing:
     return await listing_repo.create(request)
 
 @router.post("/upload")
-async def upload_listings(file: UploadFile, import_service: ImportService = Depends(ServiceFactory.get_import_service)):
-    job = await import_service.import_file(file, JobListing, JobListingData, JobListingRepository)
+async def upload_listings(file: UploadFile,
+                          user: Annotated[User | None, Depends(AuthService.get_optional_user_from_token)],
+                          priority: ImportPriority = ImportPriority.NORMAL,
+                          import_service: ImportService = Depends(ServiceFactory.get_import_service)):
+    record = await import_service.import_file(file, JobListing, JobListingData, JobListingRepository,
+        user_id = user.id if user is not None else None,
+        priority = priority,
+    )
     return {
-        "job": job.id,
+        "job": record.job_id,
+        "status": record.status,
+        "priority": record.priority,
         "filename":file.filename,
         "content_type":file.content_type,
         "headers":file.headers,
         "size":file.size,
     }
 
+@router.get("/upload/{job_id}")
+async def get_upload_job(job_id: str,
+                         user: Annotated[User, Depends(AuthService.get_user_from_token)],
+                         import_service: ImportService = Depends(ServiceFactory.get_import_service)) -> ImportJobResponse:
+    try:
+        record = await import_service.get_job(job_id, user.id)
+    except ImportJobNotFoundException:
+        raise HTTPException(status_code=404, detail=f"Import job '{job_id}' not found")
+
+    return ImportJobResponse.model_validate(record.model_dump())
+
+@router.get("/upload/{job_id}/rejected")
+async def download_upload_rejected_rows(job_id: str,
+                                        user: Annotated[User, Depends(AuthService.get_user_from_token)],
+                                        import_service: ImportService = Depends(ServiceFactory.get_import_service)) -> FileResponse:
+    try:
+        file_path = await import_service.get_rejected_file_path(job_id, user.id)
+    except ImportJobNotFoundException:
+        raise HTTPException(status_code=404, detail=f"Import job '{job_id}' not found")
+    except ImportJobNoRejectedRowsException:
+        raise HTTPException(status_code=404, detail=f"Import job '{job_id}' did not reject any rows")
+    except ImportJobNotFinishedException as ex:
+        raise HTTPException(status_code=409, detail=f"Import job '{job_id}' is {ex.status}")
+
+    return FileResponse(file_path, media_type = "application/x-ndjson", filename = f"listings_{job_id}_rejected.jsonl")
+
+@router.delete("/upload/{job_id}")
+async def cancel_upload(job_id: str,
+                        user: Annotated[User, Depends(AuthService.get_user_from_token)],
+                        import_service: ImportService = Depends(ServiceFactory.get_import_service)) -> ImportJobResponse:
+    try:
+        record = await import_service.cancel_job(job_id, user.id)
+    except ImportJobNotFoundException:
+        raise HTTPException(status_code=404, detail=f"Import job '{job_id}' not found")
+    except ImportJobNotCancellableException as ex:
+        raise HTTPException(status_code=409, detail=f"Import job '{job_id}' is {ex.status}")
+
+    return ImportJobResponse.model_validate(record.model_dump())
+
+@router.post("/export")
+async def export_listings(request: ListingExportRequest,
+                          listing_service: JobListingService = Depends(ServiceFactory.get_job_listing_service),
+                          export_service: ExportService = Depends(ServiceFactory.get_export_service)) -> ExportJobResponse:
+    try:
+        record = await export_service.export_csv(*listing_service.get_filter_mappings(request),
+            order_by = [OrderByField(field_name = request.order_by, ascending = request.ascending)],
+            model_type = JobListing,
+            model_data_type = JobListingData,
+            repo_type = JobListingRepository,
+        )
+    except OrderFieldNotExistsException:
+        raise HTTPException(status_code=400, detail=f"Can not order by '{request.order_by}'")
+    except UnindexedQueryException:
+        raise HTTPException(status_code=400, detail="Unsupported filter and sort combination")
+
+    return ExportJobResponse.model_validate(record.model_dump())
+
+@router.get("/export/{job_id}")
+async def get_export_job(job_id: str, export_service: ExportService = Depends(ServiceFactory.get_export_service)) -> ExportJobResponse:
+    try:
+        record = await export_service.get_job(job_id)
+    except ExportJobNotFoundException:
+        raise HTTPException(status_code=404, detail=f"Export job '{job_id}' not found")
+
+    return ExportJobResponse.model_validate(record.model_dump())
+
+@router.get("/export/{job_id}/download")
+async def download_export(job_id: str, export_service: ExportService = Depends(ServiceFactory.get_export_service)) -> FileResponse:
+    try:
+        file_path = await export_service.get_export_file_path(job_id)
+    except ExportJobNotFoundException:
+        raise HTTPException(status_code=404, detail=f"Export job '{job_id}' not found")
+    except ExportJobNotFinishedException as ex:
+        raise HTTPException(status_code=409, detail=f"Export job '{job_id}' is {ex.status}")
+
+    return FileResponse(file_path, media_type = "text/csv", filename = f"listings_{job_id}.csv")
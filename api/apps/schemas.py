@@ -1,3 +1,4 @@
+from beanie import PydanticObjectId
 from pydantic import BaseModel
 
 from typing import TypeVar, Generic
@@ -11,4 +12,14 @@ class PaginatedResponse(BaseResponse, Generic[TPageItem]):
     page: int
     size: int
     element_count: int
-    items: list[TPageItem]
\ No newline at end of file
+    element_count_exact: bool = True # False when element_count is an estimate or a lower bound
+    items: list[TPageItem]
+    next_cursor: str | None = None
+
+class ScoredItem(BaseResponse, Generic[TPageItem]):
+    score: float
+    item: TPageItem
+
+class ItemsByIdsResponse(BaseResponse, Generic[TPageItem]):
+    items: list[TPageItem] # in request order
+    missing_ids: list[PydanticObjectId]
@@ -6,13 +6,26 @@ from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
 
 from repositories.factory import RepositoryFactory
+from services.auth import AuthService
+from services.data_export import ExportService
+from services.data_import import ImportService
+from services.job_listing import JobListingService
+from services.listing_facet import ListingFacetService
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     await RepositoryFactory.setup()
+    await JobListingService.setup_search()
+    await ListingFacetService.setup()
+    await ImportService.setup()
+    await ExportService.setup()
 
     yield
 
+    await ExportService.teardown()
+    await ImportService.teardown()
+    await JobListingService.teardown_search()
+    AuthService.teardown()
     await RepositoryFactory.teardown()
 
 app = FastAPI(lifespan=lifespan)
@@ -36,4 +49,7 @@ from apps.auth.router import router as auth_router
 app.include_router(auth_router, prefix="/auth")
 
 from apps.job_listing.router import router as listing_router
-app.include_router(listing_router, prefix="/listing")
\ No newline at end of file
+app.include_router(listing_router, prefix="/listing")
+
+from apps.admin.router import router as admin_router
+app.include_router(admin_router, prefix="/admin")
\ No newline at end of file
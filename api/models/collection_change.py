@@ -0,0 +1,24 @@
+import pymongo
+from pymongo import IndexModel
+
+from beanie import Document, PydanticObjectId
+
+from datetime import datetime
+
+from models.base import BaseModelFieldData
+
+class CollectionChangeData(BaseModelFieldData):
+    collection: str
+    generation: int # the write generation this write bumped the collection to
+    ids: list[PydanticObjectId] # created, updated or deleted documents
+    date_created: datetime
+
+class CollectionChange(CollectionChangeData, Document):
+    # ids written per generation through a BaseRepository with LOG_CHANGES, in any process, so in-process indexes can catch up
+    class Settings:
+        name = "collection_changes"
+        indexes = [
+            IndexModel([("collection", pymongo.ASCENDING), ("generation", pymongo.ASCENDING)], unique=True, name="collection_generation"),
+            # readers that fall further behind rebuild from a full scan
+            IndexModel([("date_created", pymongo.ASCENDING)], expireAfterSeconds=24*60*60, name="date_created_ttl"),
+        ]
@@ -0,0 +1,18 @@
+import pymongo
+from pymongo import IndexModel
+
+from beanie import Document
+
+from models.base import BaseModelFieldData
+
+class CollectionGenerationData(BaseModelFieldData):
+    collection: str
+    generation: int = 0
+
+class CollectionGeneration(CollectionGenerationData, Document):
+    # bumped on every write through a BaseRepository with TRACK_GENERATION, in any process, so caches can tell their entries are stale
+    class Settings:
+        name = "collection_generations"
+        indexes = [
+            IndexModel([("collection", pymongo.ASCENDING)], unique=True, name="collection"),
+        ]
@@ -0,0 +1,38 @@
+import pymongo
+from pymongo import IndexModel
+
+from beanie import Document
+
+from datetime import datetime
+from enum import StrEnum
+
+from models.base import BaseModelFieldData
+
+class ExportJobStatus(StrEnum):
+    PENDING = "pending"
+    RUNNING = "running"
+    FINISHED = "finished"
+    FAILED = "failed"
+
+class ExportJobRecordData(BaseModelFieldData):
+    job_id: str
+    file_name: str
+    status: ExportJobStatus = ExportJobStatus.PENDING
+    claimed_by: str | None = None # "host:pid" of the api process that submitted the job
+    lease_expires_at: datetime | None = None # renewed by that api process, once past an unfinished job counts as interrupted
+
+    rows_written: int = 0
+    error: str | None = None
+
+    date_created: datetime
+    date_finished: datetime | None = None
+
+class ExportJobRecord(ExportJobRecordData, Document):
+    # status of an ExportService job, written by the job process
+    class Settings:
+        name = "export_jobs"
+        indexes = [
+            IndexModel([("job_id", pymongo.ASCENDING)], unique=True, name="job_id"),
+            IndexModel([("status", pymongo.ASCENDING), ("lease_expires_at", pymongo.ASCENDING)], name="status_lease"),
+            IndexModel([("date_finished", pymongo.ASCENDING)], name="date_finished"),
+        ]
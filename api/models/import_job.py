@@ -0,0 +1,79 @@
+import pymongo
+from pymongo import IndexModel
+
+from beanie import Document, PydanticObjectId
+
+from datetime import datetime
+from enum import IntEnum, StrEnum
+from typing import Any
+
+from pydantic import BaseModel
+
+from models.base import BaseModelFieldData
+
+class ImportJobStatus(StrEnum):
+    QUEUED = "queued"
+    RUNNING = "running"
+    FINISHED = "finished"
+    FAILED = "failed"
+    CANCELLED = "cancelled"
+
+class ImportPriority(IntEnum):
+    LOW = 0
+    NORMAL = 1
+    HIGH = 2
+
+class ImportErrorTypeCount(BaseModel):
+    error_type: str # "field: type" of a validation error
+    count: int
+
+class ImportJobRecordData(BaseModelFieldData):
+    job_id: str
+    user_id: PydanticObjectId | None = None # None for anonymous uploads, they share one per user cap
+    priority: ImportPriority = ImportPriority.NORMAL
+    status: ImportJobStatus = ImportJobStatus.QUEUED
+    cancel_requested: bool = False # running jobs see it with their next progress update, stop at the next batch
+    claimed_by: str | None = None # "host:pid" of the api process running the job
+    lease_expires_at: datetime | None = None # renewed by the api process running the job, once past the job counts as interrupted
+
+    file_name: str # in the import temp folder
+    file_content_type: str | None = None
+    file_extension: str | None = None
+    reader_kwargs: dict[str, Any] = {}
+
+    # "module:qualname" import paths, resolved by the worker
+    repo_type: str
+    model_type: str
+    model_data_type: str
+
+    error: str | None = None
+
+    # progress, written by the worker every few seconds
+    rows_read: int = 0
+    rows_validated: int = 0
+    rows_inserted: int = 0
+    rows_rejected: int = 0
+    bytes_processed: int = 0
+    bytes_total: int | None = None
+    rows_per_second: float = 0.0
+
+    # rejected rows are written to this file in the import temp folder, None until a row is rejected
+    rejected_file_name: str | None = None
+    rejected_error_types: list[ImportErrorTypeCount] = [] # most frequent first
+
+    date_created: datetime
+    date_started: datetime | None = None
+    date_updated: datetime | None = None # last progress update
+    date_finished: datetime | None = None
+
+class ImportJobRecord(ImportJobRecordData, Document):
+    # durable import queue, also the status of each import job
+    class Settings:
+        name = "import_jobs"
+        indexes = [
+            IndexModel([("job_id", pymongo.ASCENDING)], unique=True, name="job_id"),
+            # next job to claim: highest priority first, then oldest
+            IndexModel([("status", pymongo.ASCENDING), ("priority", pymongo.DESCENDING), ("date_created", pymongo.ASCENDING)], name="status_queue_order"),
+            IndexModel([("status", pymongo.ASCENDING), ("user_id", pymongo.ASCENDING)], name="status_user"),
+            IndexModel([("status", pymongo.ASCENDING), ("lease_expires_at", pymongo.ASCENDING)], name="status_lease"),
+        ]
@@ -1,9 +1,12 @@
+import json
 import pymongo
+from pymongo import IndexModel
 
-from typing import Annotated
-from beanie import Document, Indexed
+from beanie import Document, PydanticObjectId
+from pydantic import BaseModel, BeforeValidator, Field
 
 from datetime import datetime
+from typing import Annotated
 from enum import StrEnum, IntEnum
 
 from models.base import BaseModelFieldData
@@ -25,9 +28,16 @@ class ExperienceLevel(IntEnum):
     Senior = 3
     Executive = 4
 
+def _parse_json_list(value):
+    # csv cells hold lists as JSON arrays, see ExportService
+    if isinstance(value, str):
+        return json.loads(value)
+
+    return value
+
 class JobListingData(BaseModelFieldData):
     ext_id: str
-    title: Annotated[str, Indexed(index_type=pymongo.TEXT)]
+    title: str
     company: str # TODO: Another document ?
     source_url: str
 
@@ -45,8 +55,51 @@ class JobListingData(BaseModelFieldData):
     min_experience_years: int | None
     max_experience_years: int | None
 
-    expected_skills: list[str] | None # TODO: Another document ?
+    expected_skills: Annotated[list[str] | None, BeforeValidator(_parse_json_list)] # TODO: Another document ?
 
     description: str
 
-class JobListing(JobListingData, Document): ...
+def _feed_index(*equality_fields: str, name: str):
+    # equality fields first, then the default feed sort (date_created desc, _id tie-breaker)
+    keys = [(field, pymongo.ASCENDING) for field in equality_fields]
+    keys += [("date_created", pymongo.DESCENDING), ("_id", pymongo.DESCENDING)]
+    return IndexModel(keys, name=name)
+
+class JobListing(JobListingData, Document):
+    class Settings:
+        # every filter of ListingFilterRequest leads at least one of these, combined with the default sort
+        indexes = [
+            _feed_index(name="feed"),
+            _feed_index("workplace_type", name="workplace_type_feed"),
+            _feed_index("expected_experience", name="experience_feed"),
+            _feed_index("expected_skills", name="skills_feed"),
+            _feed_index("company", name="company_feed"),
+            _feed_index("location", name="location_feed"),
+            _feed_index("salary_currency", name="currency_feed"),
+            IndexModel([("salary_currency", pymongo.ASCENDING), ("max_salary_monthly", pymongo.ASCENDING)], name="currency_max_salary"),
+            IndexModel([("salary_currency", pymongo.ASCENDING), ("min_salary_monthly", pymongo.ASCENDING)], name="currency_min_salary"),
+            IndexModel([("date_posted", pymongo.DESCENDING)], name="date_posted"),
+            # only one text index is allowed per collection
+            IndexModel(
+                [("title", pymongo.TEXT), ("expected_skills", pymongo.TEXT), ("company", pymongo.TEXT), ("description", pymongo.TEXT)],
+                weights={"title": 10, "expected_skills": 5, "company": 3, "description": 1},
+                name="listing_text",
+            ),
+        ]
+
+class JobListingSummary(BaseModel):
+    # projection for list views, leaves out unbounded fields like description
+    id: PydanticObjectId = Field(alias="_id")
+
+    title: str
+    company: str
+    location: str
+
+    date_posted: datetime
+    date_created: datetime # default sort key, needed for page cursors
+
+    salary_currency: Currency
+    min_salary_monthly: float | None
+    max_salary_monthly: float | None
+
+    workplace_type: WorkplaceType
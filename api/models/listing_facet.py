@@ -0,0 +1,27 @@
+import pymongo
+from pymongo import IndexModel
+
+from beanie import Document
+
+from enum import StrEnum
+
+from models.base import BaseModelFieldData
+
+class ListingFacet(StrEnum): # values are JobListing field names
+    SKILL = "expected_skills"
+    WORKPLACE_TYPE = "workplace_type"
+    CURRENCY = "salary_currency"
+    EXPERIENCE = "expected_experience"
+
+class ListingFacetCountData(BaseModelFieldData):
+    facet: ListingFacet
+    value: int | str
+    count: int
+
+class ListingFacetCount(ListingFacetCountData, Document):
+    # materialized count of listings per facet value, see ListingFacetService
+    class Settings:
+        name = "listing_facet_counts"
+        indexes = [
+            IndexModel([("facet", pymongo.ASCENDING), ("value", pymongo.ASCENDING)], unique=True, name="facet_value"),
+        ]
@@ -0,0 +1,33 @@
+import pymongo
+from pymongo import IndexModel
+
+from beanie import Document
+from pydantic import BaseModel, Field
+
+from models.base import BaseModelFieldData
+
+class SalarySketch(BaseModel):
+    count: int = 0
+    sum: float = 0
+    # log bucket index -> number of values, see MarketStatsService for the bucket mapping
+    buckets: dict[str, int] = Field(default_factory = dict)
+
+class MarketStatsData(BaseModelFieldData):
+    key: str
+    # "*" matches any value
+    skill: str
+    workplace_type: str
+    experience: str
+    currency: str
+
+    count: int = 0
+    min_salary: SalarySketch = Field(default_factory = SalarySketch)
+    max_salary: SalarySketch = Field(default_factory = SalarySketch)
+
+class MarketStats(MarketStatsData, Document):
+    # materialized listing statistics, see MarketStatsService
+    class Settings:
+        name = "market_stats"
+        indexes = [
+            IndexModel([("key", pymongo.ASCENDING)], unique=True, name="key"),
+        ]
@@ -1,3 +1,6 @@
+import pymongo
+from pymongo import IndexModel
+
 from beanie import Document
 from pydantic import EmailStr
 
@@ -11,4 +14,10 @@ class UserDataPublic(BaseModelFieldData):
 class UserDataFull(UserDataPublic):
     password: str
 
-class User(UserDataFull, Document): ...
+class User(UserDataFull, Document):
+    class Settings:
+        # uniqueness is enforced by the indexes, login looks users up by either of them
+        indexes = [
+            IndexModel([("username", pymongo.ASCENDING)], unique=True, name="username"),
+            IndexModel([("email", pymongo.ASCENDING)], unique=True, name="email"),
+        ]
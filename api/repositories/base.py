@@ -1,27 +1,84 @@
+import inspect
+import logging
+import time
+
+from datetime import datetime
+
 from beanie import Document, PydanticObjectId, SortDirection
 from beanie.odm.queries.find import FindOne, FindMany
-from beanie.odm.queries.delete import DeleteOne
+from beanie.odm.utils.dump import get_dict
+from beanie.odm.utils.parsing import parse_obj
+from beanie.odm.utils.projection import get_projection
 
+from bson import json_util
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ReturnDocument
+from pymongo.results import DeleteResult, InsertManyResult
 
-from typing import Any, Awaitable, Iterable, Mapping, get_origin, overload, TypeVar, Generic, Callable, get_args, Self
+from typing import Any, AsyncGenerator, Awaitable, Hashable, Iterable, Mapping, get_origin, overload, TypeVar, Generic, Callable, get_args, Self
 
-from pydantic import ValidationError
+from pydantic import BaseModel, ValidationError
 
+from repositories.cache import EntityCache
+from repositories.indexes import IndexRegistry
+from repositories.single_flight import SingleFlight
 from repositories.exceptions import MissingIdException, ModelValidationException, OrderFieldNotExistsException
+from repositories.utils import aggregate_to_list, build_keyset_filter, decode_cursor, encode_cursor
 
 from models.base import BaseModelFieldData, TModel, TModelData
+from models.collection_change import CollectionChange
+from models.collection_generation import CollectionGeneration
 from repositories.schemas import OrderByField
 
 # TODO: Write query tests
 
+logger = logging.getLogger(__name__)
+
+class RepositoryWriteListener:
+    """
+    Gets notified after a repository writes documents, see `BaseRepository.add_write_listener`.
+    Only writes made through the repository in this process are seen. Methods may be coroutines,
+    their exceptions are logged and do not fail the write.
+    `previous_items` are the documents as they were before the write, None where there was none (or it was not valid).
+    """
+    def on_create(self, items: list[Document]) -> Awaitable[None] | None: ...
+    def on_update(self, items: list[Document], previous_items: list[Document | None]) -> Awaitable[None] | None: ...
+    def on_delete(self, ids: list[PydanticObjectId], previous_items: list[Document | None]) -> Awaitable[None] | None: ...
+
 class BaseRepository(Generic[TModel, TModelData]):
+    _ID_FIELD_NAME = "_id"
+    _STAGING_SUFFIX = "_staging"
+    _ITER_BATCH_SIZE = 1000
+    _TEXT_SCORE_FIELD_NAME = "score"
+
+    SINGLE_FLIGHT_MAX_KEYS = 10_000
+    _SINGLE_FLIGHT: SingleFlight = SingleFlight(SINGLE_FLIGHT_MAX_KEYS) # shared by all repositories, keys start with the model name
+
+    # per model limits of the `get_by_id_cached` entity cache, 0 disables it
+    ENTITY_CACHE_MAX_ENTRIES = 0
+    ENTITY_CACHE_TTL_SECONDS = 60
+    _ENTITY_CACHE: EntityCache = EntityCache()
+
+    # write generation of the collection, lets caches of any process tell their entries are stale (see get_page_json),
+    # only bumped for collections that enable it, reads are cached in-process for GENERATION_CACHE_TTL_SECONDS
+    TRACK_GENERATION = False
+    GENERATION_CACHE_TTL_SECONDS = 1.0
+
+    # also logs the written ids per generation (see CollectionChange), lets in-process indexes apply writes of any process,
+    # requires TRACK_GENERATION
+    LOG_CHANGES = False
+
     def __init__(self, client: AsyncIOMotorClient):
         self._client: AsyncIOMotorClient = client
 
+        self._generation: int | None = None
+        self._generation_expires_at = 0.0
+
     def __init_subclass__(self):
         super().__init_subclass__()
 
+        self._write_listeners: list[RepositoryWriteListener] = []
+
         for base in self.__orig_bases__: # get generic types
             if get_origin(base) is BaseRepository:
                 args_ = get_args(base)
@@ -31,6 +88,94 @@ class BaseRepository(Generic[TModel, TModelData]):
                     elif issubclass(arg_, BaseModelFieldData):
                         self._model_data_type = arg_
 
+        self._ENTITY_CACHE.configure(self._model_type.__name__, self.ENTITY_CACHE_MAX_ENTRIES, self.ENTITY_CACHE_TTL_SECONDS)
+
+    @classmethod
+    def add_write_listener(cls, listener: RepositoryWriteListener):
+        cls._write_listeners.append(listener)
+
+    async def _read_generation(self) -> int:
+        generation = await CollectionGeneration.get_pymongo_collection().find_one(
+            {"collection": self._model_type.get_collection_name()}, {"generation": 1})
+
+        return generation["generation"] if generation is not None else 0
+
+    def _set_generation(self, generation: int):
+        self._generation = generation
+        self._generation_expires_at = time.monotonic() + self.GENERATION_CACHE_TTL_SECONDS
+
+    async def get_generation(self) -> int:
+        """
+        Writes of this process are seen right away, writes of other processes within GENERATION_CACHE_TTL_SECONDS.
+        """
+        if self._generation is None or time.monotonic() >= self._generation_expires_at:
+            self._set_generation(await self.single_flight(("generation",), self._read_generation))
+
+        return self._generation
+
+    async def _bump_generation(self, ids: list[PydanticObjectId]):
+        if not self.TRACK_GENERATION:
+            return
+
+        collection_name = self._model_type.get_collection_name()
+        generation = await CollectionGeneration.get_pymongo_collection().find_one_and_update(
+            {"collection": collection_name}, {"$inc": {"generation": 1}},
+            projection = {"generation": 1}, upsert = True, return_document = ReturnDocument.AFTER)
+        self._set_generation(generation["generation"])
+
+        if self.LOG_CHANGES:
+            await CollectionChange.get_pymongo_collection().insert_one({
+                "collection": collection_name, "generation": generation["generation"], "ids": ids, "date_created": datetime.now(),
+            })
+
+    @classmethod
+    def get_entity_cache(cls) -> EntityCache:
+        return BaseRepository._ENTITY_CACHE
+
+    @classmethod
+    def get_single_flight(cls) -> SingleFlight:
+        return BaseRepository._SINGLE_FLIGHT
+
+    async def single_flight(self, key: tuple[Hashable, ...], fetch: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Runs `fetch`, or joins an identical in-flight read of this model with the same `key`.
+        The result is shared between the joined callers and must not be mutated.
+        """
+        return await self._SINGLE_FLIGHT.do((self._model_type.__name__, *key), fetch)
+
+    async def _after_write(self, method_name: str, ids: list[PydanticObjectId], *args):
+        """
+        Bumps the generation (logging the written `ids`) and notifies the write listeners. The write is already persisted,
+        failures are logged instead of raised, the caller must not see an error for a successful write.
+        """
+        try:
+            await self._bump_generation(ids)
+        except Exception:
+            logger.exception("Could not bump the write generation of %s", self._model_type.__name__)
+
+        for listener in self._write_listeners:
+            try:
+                result = getattr(listener, method_name)(*args)
+                if inspect.isawaitable(result):
+                    await result
+            except Exception:
+                logger.exception("Write listener %s failed on %s of %s", type(listener).__name__, method_name, self._model_type.__name__)
+
+    async def _replace_collection(self, documents: list[Mapping[str, Any]]):
+        """
+        Writes `documents` to a staging collection and renames it over the live one, readers never see a partial collection.
+        Writes to the live collection while the documents were computed are lost, only for derived collections.
+        """
+        collection = self._model_type.get_pymongo_collection()
+        staging = collection.database.get_collection(f"{collection.name}{self._STAGING_SUFFIX}")
+
+        await staging.drop() # left over by an interrupted rebuild
+        await staging.create_indexes(self._model_type.Settings.indexes) # also creates the collection, documents may be empty
+        if documents:
+            await staging.insert_many(documents)
+
+        await staging.rename(collection.name, dropTarget = True)
+
     def _ensure_model_instance(self, item: TModel | TModelData | dict[str, Any]) -> TModel:
         try:
             if isinstance(item, self._model_type):
@@ -47,72 +192,256 @@ class BaseRepository(Generic[TModel, TModelData]):
 
         raise ModelValidationException(item, self._model_type)
 
+    def _parse_previous(self, document: Mapping[str, Any] | None) -> TModel | None:
+        if document is None:
+            return None
+
+        try:
+            return self._model_type.model_validate(document)
+        except ValidationError:
+            return None
+
     def _ensure_model_iterable(self, items: Iterable[TModel | TModelData | dict[str, Any]]) -> Iterable[TModel]:
         return [self._ensure_model_instance(item) for item in items]
 
     def _parse_order_by(self, order_by: list[OrderByField]):
         parsed_order_by = []
 
-        model_fields = set(self._model_type.model_fields.keys())
+        model_fields = self._model_type.model_fields
         for order_by_field in order_by:
             field_name = order_by_field.field_name
             if field_name not in model_fields:
                 raise OrderFieldNotExistsException(field_name, self._model_type)
 
+            db_field_name = model_fields[field_name].alias or field_name
             direction = SortDirection.ASCENDING if order_by_field.ascending else SortDirection.DESCENDING
-            parsed_order_by.append((field_name, direction))
+            parsed_order_by.append((db_field_name, direction))
+
+        # _id as tie-breaker, so documents with equal sort values always come in the same order
+        if all(field_name != self._ID_FIELD_NAME for field_name, _ in parsed_order_by):
+            direction = parsed_order_by[0][1] if parsed_order_by else SortDirection.ASCENDING
+            parsed_order_by.append((self._ID_FIELD_NAME, direction))
 
         return parsed_order_by
 
+    def _get_sort_value(self, item: BaseModel, db_field_name: str):
+        field_name = "id" if db_field_name == self._ID_FIELD_NAME else db_field_name
+        if field_name not in type(item).model_fields:
+            raise OrderFieldNotExistsException(field_name, type(item))
+
+        return getattr(item, field_name)
+
+    def get_cursor(self, item: BaseModel, order_by: list[OrderByField] = None) -> str:
+        """
+        Returns an opaque keyset cursor pointing right after `item`, to be passed as `after` to `find`
+        with the same `order_by`.
+        """
+        parsed_order_by = self._parse_order_by(order_by or [])
+        field_names = [field_name for field_name, _ in parsed_order_by]
+
+        return encode_cursor(field_names, [self._get_sort_value(item, field_name) for field_name in field_names])
+
     # Read
-    def find(self, *query: Mapping[Any, Any] | bool, order_by: list[OrderByField] = None) -> FindMany[TModel]:
-        result = self._model_type.find(*query)
-        if order_by is not None:
-            parsed_order_by = self._parse_order_by(order_by)
+    def find(self, *query: Mapping[Any, Any] | bool, order_by: list[OrderByField] = None, after: str = None,
+             projection_model: type[BaseModel] = None) -> FindMany[TModel]:
+        parsed_order_by = None
+        if order_by is not None or after is not None:
+            parsed_order_by = self._parse_order_by(order_by or [])
+
+        if after is not None:
+            values = decode_cursor(after, [field_name for field_name, _ in parsed_order_by])
+            query = (*query, build_keyset_filter(parsed_order_by, values))
+
+        result = self._model_type.find(*query, projection_model = projection_model)
+        if parsed_order_by is not None:
             result.sort(parsed_order_by)
 
+        if IndexRegistry.check(self._model_type, result.get_filter_query(), parsed_order_by or []):
+            result.pymongo_kwargs["allow_disk_use"] = True
+
         return result
 
+    async def find_page_with_total(self, query: FindMany[TModel], skip: int, limit: int) -> tuple[list[TModel], int]:
+        """
+        Fetches a page of `query` and the total number of matching documents in one round trip,
+        with a `$match` -> `$sort` -> `$facet` aggregation.
+        """
+        projection_model = query.get_projection_model()
+
+        items_pipeline = [{"$skip": skip}, {"$limit": limit}]
+        if projection_model is not self._model_type:
+            items_pipeline.append({"$project": get_projection(projection_model)})
+
+        pipeline = query.build_aggregation_pipeline() # $match and $sort of the query
+        pipeline.append({"$facet": {
+            "items": items_pipeline,
+            "total": [{"$count": "count"}],
+        }})
+
+        aggregate_kwargs = {}
+        if query.pymongo_kwargs.get("allow_disk_use"):
+            aggregate_kwargs["allowDiskUse"] = True
+
+        async def fetch():
+            result = await aggregate_to_list(self._model_type.get_pymongo_collection(), pipeline, **aggregate_kwargs)
+            facets = result[0]
+
+            items = [parse_obj(projection_model, item) for item in facets["items"]]
+            total = facets["total"][0]["count"] if facets["total"] else 0
+
+            return items, total
+
+        # the pipeline is not key-sorted, $sort key order matters
+        key = ("page_with_total", json_util.dumps(pipeline), projection_model.__name__, bool(aggregate_kwargs))
+        return await self.single_flight(key, fetch)
+
+    async def find_text_scored(self, query: FindMany[TModel], skip: int, limit: int) -> list[tuple[BaseModel, float]]:
+        """
+        Fetches a page of a `$text` query ordered by relevance, returns (item, text score) pairs.
+        """
+        projection = get_projection(query.get_projection_model()) or {}
+        projection = {**projection, self._TEXT_SCORE_FIELD_NAME: {"$meta": "textScore"}}
+
+        sort = [(self._TEXT_SCORE_FIELD_NAME, {"$meta": "textScore"}), (self._ID_FIELD_NAME, SortDirection.ASCENDING)]
+
+        async def fetch():
+            cursor = self._model_type.get_pymongo_collection().find(query.get_filter_query(), projection, sort = sort, skip = skip, limit = limit)
+            documents = await cursor.to_list(None)
+
+            return [(parse_obj(query.get_projection_model(), document), document[self._TEXT_SCORE_FIELD_NAME]) for document in documents]
+
+        key = ("text_scored", json_util.dumps(query.get_filter_query(), sort_keys = True), query.get_projection_model().__name__, skip, limit)
+        return await self.single_flight(key, fetch)
+
+    async def count_values(self, query: FindMany[TModel], field_names: list[str]) -> dict[str, dict[Any, int]]:
+        """
+        Counts documents matching `query` per value of each field (per element for array fields) with one `$facet` aggregation.
+        Missing and null values are not counted.
+        """
+        pipeline = query.build_aggregation_pipeline()
+        pipeline.append({"$facet": {
+            field_name: [
+                {"$unwind": f"${field_name}"},
+                {"$group": {"_id": f"${field_name}", "count": {"$sum": 1}}},
+            ]
+            for field_name in field_names
+        }})
+
+        result = await aggregate_to_list(self._model_type.get_pymongo_collection(), pipeline)
+        facets = result[0]
+
+        return {
+            field_name: {value_count["_id"]: value_count["count"] for value_count in facets[field_name] if value_count["_id"] is not None}
+            for field_name in field_names
+        }
+
+    async def iter_batches(self, query: FindMany[TModel], batch_size: int = None) -> AsyncGenerator[list[TModel]]:
+        """
+        Iterates `query` in lists of `batch_size` items, the cursor only fetches the next batch once the previous one is consumed.
+        """
+        if batch_size is None:
+            batch_size = self._ITER_BATCH_SIZE
+
+        query.pymongo_kwargs["batch_size"] = batch_size
+
+        batch = []
+        async for item in query:
+            batch.append(item)
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+
+        if batch:
+            yield batch
+
     def get_by_id(self, _id: PydanticObjectId) -> FindOne[TModel]:
         return self._model_type.find_one({"_id": _id})
 
+    async def get_by_id_cached(self, _id: PydanticObjectId) -> TModel | None:
+        """
+        `get_by_id` read through the model's entity cache, concurrent misses share one query.
+        Cached documents are shared between callers and must not be mutated, `update`/`delete` invalidate them.
+        Writes of other processes are only seen once the entry expires.
+        """
+        model_name = self._model_type.__name__
+        if not self._ENTITY_CACHE.is_enabled(model_name):
+            return await self.single_flight(("get_by_id", _id), lambda: self.get_by_id(_id))
+
+        item = self._ENTITY_CACHE.get(model_name, _id)
+        if item is not None:
+            return item
+
+        version = self._ENTITY_CACHE.get_version(model_name)
+        item = await self.single_flight(("get_by_id", _id), lambda: self.get_by_id(_id))
+        if item is not None:
+            self._ENTITY_CACHE.set(model_name, _id, item, version)
+
+        return item
+
+    async def get_many(self, ids: Iterable[PydanticObjectId], projection_model: type[BaseModel] = None) -> tuple[list[TModel], list[PydanticObjectId]]:
+        """
+        Fetches documents by id with a single `$in` query.
+        Returns the found documents in the order of `ids` (duplicates once) and the ids that were not found.
+        """
+        ids = list(dict.fromkeys(ids))
+        if not ids:
+            return [], []
+
+        query = self._model_type.find({self._ID_FIELD_NAME: {"$in": ids}}, projection_model = projection_model)
+        items = await self.single_flight(("get_many", tuple(ids), query.get_projection_model().__name__), query.to_list)
+        items_by_id = {item.id: item for item in items}
+
+        found_items = [items_by_id[_id] for _id in ids if _id in items_by_id]
+        missing_ids = [_id for _id in ids if _id not in items_by_id]
+
+        return found_items, missing_ids
+
     def get_all(self) -> FindMany[TModel]:
         return self._model_type.all()
 
     # Create
     @overload
-    def create(self, item: dict[str, Any]) -> Awaitable[TModel]: ...
+    async def create(self, item: dict[str, Any]) -> TModel: ...
 
     @overload
-    def create(self, item: TModel) -> Awaitable[TModel]: ...
+    async def create(self, item: TModel) -> TModel: ...
 
     @overload
-    def create(self, item: TModelData) -> Awaitable[TModel]: ...
+    async def create(self, item: TModelData) -> TModel: ...
+
+    async def create(self, item: TModel | TModelData | dict[str, Any]) -> TModel:
+        item = await self._ensure_model_instance(item).create()
+        await self._after_write("on_create", [item.id], [item])
 
-    def create(self, item: TModel | TModelData | dict[str, Any]) -> Awaitable[TModel]:
-        return self._ensure_model_instance(item).create()
+        return item
 
-    def create_many(self, items: Iterable[TModel | TModelData | dict[str, Any]]):
+    async def create_many(self, items: Iterable[TModel | TModelData | dict[str, Any]]) -> InsertManyResult:
         items = self._ensure_model_iterable(items)
-        return self._model_type.insert_many(items)
+        result = await self._model_type.insert_many(items)
+
+        for item, _id in zip(items, result.inserted_ids):
+            item.id = _id
+        await self._after_write("on_create", list(result.inserted_ids), items)
+
+        return result
 
     # Update
     @overload
-    def update(self, item: dict[str, Any], _id: PydanticObjectId) -> Awaitable[TModel]: ...
+    async def update(self, item: dict[str, Any], _id: PydanticObjectId) -> TModel: ...
 
     @overload
-    def update(self, item: dict[str, Any]) -> Awaitable[TModel]: ...
+    async def update(self, item: dict[str, Any]) -> TModel: ...
 
     @overload
-    def update(self, item: TModel, _id: PydanticObjectId) -> Awaitable[TModel]: ...
+    async def update(self, item: TModel, _id: PydanticObjectId) -> TModel: ...
 
     @overload
-    def update(self, item: TModel) -> Awaitable[TModel]: ...
+    async def update(self, item: TModel) -> TModel: ...
 
     @overload
-    def update(self, item_data: TModelData, _id: PydanticObjectId) -> Awaitable[TModel]: ...
+    async def update(self, item_data: TModelData, _id: PydanticObjectId) -> TModel: ...
 
-    def update(self, item: TModel, _id: PydanticObjectId | None = None) -> Awaitable[TModel]:
+    async def update(self, item: TModel, _id: PydanticObjectId | None = None) -> TModel:
         item = self._ensure_model_instance(item)
         if _id is None:
             if item.id is None:
@@ -120,17 +449,22 @@ class BaseRepository(Generic[TModel, TModelData]):
         else: # if id is sent as parameter set it regardless if id is present in item or not
             item.id = _id
 
+        # replaced in one round trip that also returns the previous document, listeners apply the difference
+        previous = await self._model_type.get_pymongo_collection().find_one_and_replace(
+            {self._ID_FIELD_NAME: item.id}, get_dict(item, to_db = True), upsert = True)
+        self._ENTITY_CACHE.invalidate(self._model_type.__name__, [item.id])
+        await self._after_write("on_update", [item.id], [item], [self._parse_previous(previous)])
 
-        return item.save()
+        return item
 
     # Delete
     @overload
-    def delete(self, item: TModel) -> DeleteOne: ...
+    async def delete(self, item: TModel) -> DeleteResult | None: ...
 
     @overload
-    def delete(self, _id: PydanticObjectId) -> DeleteOne: ...
+    async def delete(self, _id: PydanticObjectId) -> DeleteResult | None: ...
 
-    def delete(self, item_data: PydanticObjectId | TModel) -> DeleteOne:
+    async def delete(self, item_data: PydanticObjectId | TModel) -> DeleteResult | None:
         if isinstance(item_data, PydanticObjectId):
             _id = item_data
 
@@ -140,6 +474,10 @@ class BaseRepository(Generic[TModel, TModelData]):
         else:
             raise MissingIdException("ID is required either in data object or as parameter for delete.")
 
-        return self.get_by_id(_id).delete()
+        previous = await self._model_type.get_pymongo_collection().find_one_and_delete({self._ID_FIELD_NAME: _id})
+        self._ENTITY_CACHE.invalidate(self._model_type.__name__, [_id])
+        await self._after_write("on_delete", [_id], [_id], [self._parse_previous(previous)])
+
+        return DeleteResult({"n": int(previous is not None)}, acknowledged = True)
 
 TRepo = TypeVar("TRepo", bound=BaseRepository)
\ No newline at end of file
@@ -0,0 +1,176 @@
+import time
+
+from collections import OrderedDict
+from typing import Any, Generic, Hashable, Iterable, TypeVar
+
+TKey = TypeVar("TKey", bound = Hashable)
+TValue = TypeVar("TValue")
+
+class TTLCache(Generic[TKey, TValue]):
+    """
+    In-process LRU cache with optional per-entry expiry.
+    Not thread safe, meant to be used from the event loop.
+    """
+    def __init__(self, max_entries: int, ttl_seconds: float | None = None):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+
+        self._entries: OrderedDict[TKey, tuple[float | None, TValue]] = OrderedDict()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key: TKey, default: TValue | None = None) -> TValue | None:
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return default
+
+        expires_at, value = entry
+        if expires_at is not None and expires_at <= time.monotonic():
+            del self._entries[key]
+            self.misses += 1
+            return default
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: TKey, value: TValue, ttl_seconds: float | None = None):
+        if ttl_seconds is None:
+            ttl_seconds = self.ttl_seconds
+
+        expires_at = time.monotonic() + ttl_seconds if ttl_seconds is not None else None
+        self._entries[key] = (expires_at, value)
+        self._entries.move_to_end(key)
+
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last = False)
+            self.evictions += 1
+
+    def pop(self, key: TKey, default: TValue | None = None) -> TValue | None:
+        entry = self._entries.pop(key, None)
+        return entry[1] if entry is not None else default
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+class BytesLRUCache(Generic[TKey]):
+    """
+    In-process LRU cache of bytes values, bounded by their total size.
+    Not thread safe, meant to be used from the event loop.
+    """
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+
+        self._entries: OrderedDict[TKey, bytes] = OrderedDict()
+        self._size = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key: TKey) -> bytes | None:
+        value = self._entries.get(key)
+        if value is None:
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: TKey, value: bytes):
+        if len(value) > self.max_bytes:
+            return
+
+        self.pop(key)
+        self._entries[key] = value
+        self._size += len(value)
+
+        while self._size > self.max_bytes:
+            _, evicted_value = self._entries.popitem(last = False)
+            self._size -= len(evicted_value)
+            self.evictions += 1
+
+    def pop(self, key: TKey) -> bytes | None:
+        value = self._entries.pop(key, None)
+        if value is not None:
+            self._size -= len(value)
+
+        return value
+
+    def clear(self):
+        self._entries.clear()
+        self._size = 0
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "entries": len(self._entries),
+            "bytes": self._size,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+class EntityCache:
+    """
+    Documents by id, one `TTLCache` per model so a hot model can not evict another's entries.
+    Invalidations bump a per-model version, reads that started before one are not cached.
+    Not thread safe, meant to be used from the event loop.
+    """
+    def __init__(self):
+        self._caches: dict[str, TTLCache[Hashable, Any]] = {}
+        self._versions: dict[str, int] = {}
+
+    def configure(self, model_name: str, max_entries: int, ttl_seconds: float | None):
+        self._caches[model_name] = TTLCache(max_entries, ttl_seconds)
+
+    def is_enabled(self, model_name: str) -> bool:
+        cache = self._caches.get(model_name)
+        return cache is not None and cache.max_entries > 0
+
+    def get_version(self, model_name: str) -> int:
+        return self._versions.get(model_name, 0)
+
+    def get(self, model_name: str, _id: Hashable) -> Any | None:
+        return self._caches[model_name].get(_id)
+
+    def set(self, model_name: str, _id: Hashable, item: Any, version: int):
+        if version != self.get_version(model_name):
+            return # invalidated while it was being read
+
+        self._caches[model_name].set(_id, item)
+
+    def invalidate(self, model_name: str, ids: Iterable[Hashable]):
+        self._versions[model_name] = self.get_version(model_name) + 1
+
+        cache = self._caches.get(model_name)
+        if cache is not None:
+            for _id in ids:
+                cache.pop(_id)
+
+    def clear(self):
+        for model_name, cache in self._caches.items():
+            cache.clear()
+            self._versions[model_name] = self.get_version(model_name) + 1
+
+    def stats(self) -> dict[str, dict[str, Any]]:
+        return {model_name: cache.stats() for model_name, cache in self._caches.items() if cache.max_entries > 0}
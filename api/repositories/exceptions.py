@@ -36,4 +36,25 @@ class ModelValidationException(BaseRepositoryException):
 class OrderFieldNotExistsException(BaseRepositoryException):
     def __init__(self, field_name: str, model: type[Document]):
         message = f"Field '{field_name}' does not exist in model: {model}"
-        super().__init__(message)
\ No newline at end of file
+        super().__init__(message)
+
+class InvalidCursorException(BaseRepositoryException):
+    def __init__(self, cursor: str, reason: str):
+        self.cursor = cursor
+        self.reason = reason
+
+        message = f"Invalid pagination cursor '{cursor}': {reason}"
+        super().__init__(message)
+
+class UnindexedQueryException(BaseRepositoryException):
+    def __init__(self, shape):
+        self.shape = shape
+
+        message = f"No index supports {shape.model_name} query with filter fields {shape.equality_fields + shape.range_fields} and sort {shape.sort}"
+        super().__init__(message)
+
+class BadIndexPolicyException(BaseRepositoryException):
+    def __init__(self, env_key: str, value: str, allowed_values: list[str]):
+        message = f"Bad value '{value}' for {env_key}, must be one of {allowed_values}"
+        super().__init__(message)
+
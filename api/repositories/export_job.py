@@ -0,0 +1,52 @@
+from datetime import datetime
+from typing import Any
+
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from repositories.base import BaseRepository
+
+from models.export_job import ExportJobRecord, ExportJobRecordData, ExportJobStatus
+
+_UNFINISHED_STATUSES = [ExportJobStatus.PENDING.value, ExportJobStatus.RUNNING.value]
+
+class ExportJobRepository(BaseRepository[ExportJobRecord, ExportJobRecordData]):
+    def __init__(self, client: AsyncIOMotorClient):
+        super().__init__(client)
+
+    def fetch_by_job_id(self, job_id: str):
+        return self.find(ExportJobRecord.job_id == job_id).first_or_none()
+
+    async def set_fields(self, job_id: str, **fields: Any):
+        # targeted $set, progress updates do not rewrite the whole record
+        await ExportJobRecord.get_pymongo_collection().update_one({"job_id": job_id}, {"$set": fields})
+
+    async def fail_if_unfinished(self, job_id: str, error: str):
+        await ExportJobRecord.get_pymongo_collection().update_one(
+            {"job_id": job_id, "status": {"$in": _UNFINISHED_STATUSES}},
+            {"$set": {"status": ExportJobStatus.FAILED.value, "error": error, "date_finished": datetime.now()}},
+        )
+
+    async def renew_leases(self, job_ids: list[str], claimed_by: str, lease_expires_at: datetime):
+        if not job_ids:
+            return
+
+        await ExportJobRecord.get_pymongo_collection().update_many(
+            {"job_id": {"$in": job_ids}, "status": {"$in": _UNFINISHED_STATUSES}, "claimed_by": claimed_by},
+            {"$set": {"lease_expires_at": lease_expires_at}},
+        )
+
+    async def fail_expired_leases(self, error: str) -> int:
+        """
+        Fails the unfinished jobs whose lease ran out, on any host, returns how many.
+        """
+        now = datetime.now()
+        result = await ExportJobRecord.get_pymongo_collection().update_many(
+            {"status": {"$in": _UNFINISHED_STATUSES}, "lease_expires_at": {"$lt": now}},
+            {"$set": {"status": ExportJobStatus.FAILED.value, "error": error, "date_finished": now}},
+        )
+
+        return result.modified_count
+
+    async def delete_finished_before(self, date: datetime) -> int:
+        result = await ExportJobRecord.get_pymongo_collection().delete_many({"date_finished": {"$lt": date}})
+        return result.deleted_count
@@ -9,9 +9,11 @@ import inspect
 
 from typing import Type, TypeVar
 
-from motor.motor_asyncio import AsyncIOMotorClient
+from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorDatabase
+from pymongo.errors import OperationFailure
 
 from repositories.base import BaseRepository
+from repositories.indexes import IndexRegistry
 from repositories.schemas import MongoClientCredentials
 from repositories.exceptions import RepositoryNotFoundException
 
@@ -34,6 +36,14 @@ class RepositoryFactory:
 
     _INSTANCES: dict[str,object] = {}
 
+    # indexes created outside the models (by ops, e.g. from IndexRegistry suggestions) are kept
+    _ALLOW_INDEX_DROPPING = False
+
+    # (collection, index) pairs replaced by declarations on the models, dropped before beanie creates the new ones
+    _REPLACED_INDEXES: list[tuple[str, str]] = [
+        ("JobListing", "title_text"), # replaced by "listing_text", a collection can only have one text index
+    ]
+
     @classmethod
     async def _get_credentials_from_env(cls):
         host = os.getenv(cls.ENV_DB_HOST_KEY)
@@ -89,11 +99,29 @@ class RepositoryFactory:
 
         model_classes = await cls._get_model_classes()
 
+        database = cls._DB_CLIENT.get_database(cls._CREDENTIALS.db_name)
+        await cls._drop_replaced_indexes(database)
+
         await beanie.init_beanie(
-            database=cls._DB_CLIENT.get_database(cls._CREDENTIALS.db_name),
+            database=database,
             document_models = model_classes,
+            allow_index_dropping = cls._ALLOW_INDEX_DROPPING,
         )
 
+        await IndexRegistry.sync(model_classes)
+
+    @classmethod
+    async def _drop_replaced_indexes(cls, database: AsyncIOMotorDatabase):
+        for collection_name, index_name in cls._REPLACED_INDEXES:
+            collection = database.get_collection(collection_name)
+            if index_name not in await collection.index_information():
+                continue
+
+            try:
+                await collection.drop_index(index_name)
+            except OperationFailure: # dropped by another process in the meantime
+                pass
+
     @classmethod
     async def _create_client(cls):
         creds = await cls._get_credentials()
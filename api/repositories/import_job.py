@@ -0,0 +1,111 @@
+from datetime import datetime
+from typing import Any
+
+from beanie import PydanticObjectId
+from beanie.odm.utils.parsing import parse_obj
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ReturnDocument
+
+from repositories.base import BaseRepository
+from repositories.utils import aggregate_to_list
+
+from models.import_job import ImportJobRecord, ImportJobRecordData, ImportJobStatus
+
+class ImportJobRepository(BaseRepository[ImportJobRecord, ImportJobRecordData]):
+    """
+    Status changes are single conditional updates, so api processes sharing the queue never claim or cancel a job twice.
+    """
+    def __init__(self, client: AsyncIOMotorClient):
+        super().__init__(client)
+
+    def fetch_by_job_id(self, job_id: str):
+        return self.find(ImportJobRecord.job_id == job_id).first_or_none()
+
+    async def count_running_by_user(self) -> dict[PydanticObjectId | None, int]:
+        pipeline = [
+            {"$match": {"status": ImportJobStatus.RUNNING.value}},
+            {"$group": {"_id": "$user_id", "count": {"$sum": 1}}},
+        ]
+        result = await aggregate_to_list(ImportJobRecord.get_pymongo_collection(), pipeline)
+
+        return {user_count["_id"]: user_count["count"] for user_count in result}
+
+    async def claim_next(self, excluded_user_ids: list[PydanticObjectId | None], claimed_by: str, lease_expires_at: datetime) -> ImportJobRecord | None:
+        filter_query: dict[str, Any] = {"status": ImportJobStatus.QUEUED.value}
+        if excluded_user_ids:
+            filter_query["user_id"] = {"$nin": excluded_user_ids}
+
+        document = await ImportJobRecord.get_pymongo_collection().find_one_and_update(
+            filter_query,
+            {"$set": {
+                "status": ImportJobStatus.RUNNING.value, "claimed_by": claimed_by, "lease_expires_at": lease_expires_at, "date_started": datetime.now(),
+            }},
+            sort = [("priority", -1), ("date_created", 1)],
+            return_document = ReturnDocument.AFTER,
+        )
+
+        return parse_obj(ImportJobRecord, document) if document is not None else None
+
+    async def cancel_if_queued(self, job_id: str) -> bool:
+        result = await ImportJobRecord.get_pymongo_collection().update_one(
+            {"job_id": job_id, "status": ImportJobStatus.QUEUED.value},
+            {"$set": {"status": ImportJobStatus.CANCELLED.value, "date_finished": datetime.now()}},
+        )
+
+        return result.modified_count > 0
+
+    async def request_cancel(self, job_id: str) -> bool:
+        result = await ImportJobRecord.get_pymongo_collection().update_one(
+            {"job_id": job_id, "status": ImportJobStatus.RUNNING.value},
+            {"$set": {"cancel_requested": True}},
+        )
+
+        return result.modified_count > 0
+
+    async def update_progress(self, job_id: str, progress: dict[str, Any]) -> bool:
+        """
+        Writes the progress fields of a running job, returns whether it was asked to cancel.
+        """
+        document = await ImportJobRecord.get_pymongo_collection().find_one_and_update(
+            {"job_id": job_id},
+            {"$set": {**progress, "date_updated": datetime.now()}},
+            projection = {"cancel_requested": 1},
+        )
+
+        return document is not None and document.get("cancel_requested", False)
+
+    async def finish(self, job_id: str, status: ImportJobStatus, error: str | None = None, progress: dict[str, Any] = None):
+        now = datetime.now()
+        await ImportJobRecord.get_pymongo_collection().update_one(
+            {"job_id": job_id, "status": ImportJobStatus.RUNNING.value},
+            {"$set": {**(progress or {}), "status": status.value, "error": error, "date_updated": now, "date_finished": now}},
+        )
+
+    async def renew_leases(self, job_ids: list[str], claimed_by: str, lease_expires_at: datetime):
+        if not job_ids:
+            return
+
+        await ImportJobRecord.get_pymongo_collection().update_many(
+            {"job_id": {"$in": job_ids}, "status": ImportJobStatus.RUNNING.value, "claimed_by": claimed_by},
+            {"$set": {"lease_expires_at": lease_expires_at}},
+        )
+
+    async def fail_expired_leases(self, error: str) -> int:
+        """
+        Fails the running jobs whose lease ran out, on any host, returns how many.
+        """
+        now = datetime.now()
+        result = await ImportJobRecord.get_pymongo_collection().update_many(
+            {"status": ImportJobStatus.RUNNING.value, "lease_expires_at": {"$lt": now}},
+            {"$set": {"status": ImportJobStatus.FAILED.value, "error": error, "date_updated": now, "date_finished": now}},
+        )
+
+        return result.modified_count
+
+    async def requeue(self, job_id: str, claimed_by: str) -> bool:
+        result = await ImportJobRecord.get_pymongo_collection().update_one(
+            {"job_id": job_id, "status": ImportJobStatus.RUNNING.value, "claimed_by": claimed_by},
+            {"$set": {"status": ImportJobStatus.QUEUED.value, "claimed_by": None, "lease_expires_at": None, "date_started": None}},
+        )
+
+        return result.modified_count > 0
@@ -0,0 +1,209 @@
+import asyncio
+import logging
+import os
+
+from enum import StrEnum
+from typing import Any, Iterable, Mapping
+
+from beanie import Document
+
+from repositories.exceptions import BadIndexPolicyException, UnindexedQueryException
+from repositories.schemas import QueryShape, UnindexedQueryShape
+
+logger = logging.getLogger(__name__)
+
+_EQUALITY_OPERATORS = {"$eq", "$in"}
+_LOGICAL_OPERATORS = {"$and", "$or", "$nor"}
+
+class UnindexedQueryPolicy(StrEnum):
+    REJECT = "reject" # raise UnindexedQueryException
+    ALLOW_DISK_USE = "allow_disk_use" # run it, let mongo spill in-memory sorts to disk
+    LOG = "log" # run it as is
+
+def _collect_filter_fields(filter_query: Mapping[str, Any], fields: dict[str, bool], top_level: bool = True) -> bool:
+    """
+    Collects filtered field names into `fields` (name -> is equality match) and returns whether the filter has a `$text` clause.
+    Fields nested under `$or`/`$nor` are not collected, they can not use an index on their own.
+    """
+    has_text = False
+    for key, value in filter_query.items():
+        if key == "$text":
+            has_text = True
+        elif key == "$and":
+            for sub_query in value:
+                has_text |= _collect_filter_fields(sub_query, fields, top_level)
+        elif key in _LOGICAL_OPERATORS:
+            for sub_query in value:
+                has_text |= _collect_filter_fields(sub_query, {}, False)
+        elif not key.startswith("$") and top_level:
+            is_operator_expression = isinstance(value, Mapping) and any(k.startswith("$") for k in value)
+            is_equality = not is_operator_expression or all(k in _EQUALITY_OPERATORS for k in value)
+            fields[key] = fields.get(key, True) and is_equality
+
+    return has_text
+
+def get_query_shape(model_type: type[Document], filter_query: Mapping[str, Any], sort: list[tuple[str, int]]) -> QueryShape:
+    fields: dict[str, bool] = {}
+    has_text = _collect_filter_fields(filter_query, fields)
+
+    return QueryShape(
+        model_name = model_type.__name__,
+        equality_fields = sorted(field for field, is_equality in fields.items() if is_equality),
+        range_fields = sorted(field for field, is_equality in fields.items() if not is_equality),
+        sort = [(field, int(direction)) for field, direction in sort],
+        text = has_text,
+    )
+
+def _index_supports_sort(index_keys: list[tuple[str, Any]], equality_fields: set[str], sort: list[tuple[str, int]]) -> bool:
+    i = 0
+    while i < len(index_keys) and index_keys[i][0] in equality_fields:
+        i += 1
+
+    sort_index_keys = index_keys[i:i + len(sort)]
+    if len(sort_index_keys) < len(sort):
+        return False
+
+    # index can be walked forwards or backwards, but not both at once
+    directions = set()
+    for (sort_field, sort_direction), (index_field, index_direction) in zip(sort, sort_index_keys):
+        if sort_field != index_field or not isinstance(index_direction, int):
+            return False
+        directions.add(sort_direction * index_direction)
+
+    return len(directions) == 1
+
+class IndexRegistry:
+    """
+    Keeps the index key patterns of each model, as declared in their `Settings.indexes`/`Indexed` fields
+    and created by beanie, and checks query shapes against them.
+    """
+    ENV_UNINDEXED_QUERY_POLICY_KEY = "UNINDEXED_QUERY_POLICY"
+    _UNINDEXED_QUERY_POLICY: UnindexedQueryPolicy = None
+
+    MAX_TRACKED_SHAPES = 1000
+
+    _INDEXES: dict[str, list[list[tuple[str, Any]]]] = {}
+    _UNINDEXED_SHAPES: dict[str, UnindexedQueryShape] = {}
+
+    _EXPLAIN_TASKS: set[asyncio.Task] = set()
+
+    @classmethod
+    def get_policy(cls) -> UnindexedQueryPolicy:
+        if cls._UNINDEXED_QUERY_POLICY is None:
+            val = os.getenv(cls.ENV_UNINDEXED_QUERY_POLICY_KEY, UnindexedQueryPolicy.ALLOW_DISK_USE)
+            try:
+                cls._UNINDEXED_QUERY_POLICY = UnindexedQueryPolicy(val)
+            except ValueError:
+                raise BadIndexPolicyException(cls.ENV_UNINDEXED_QUERY_POLICY_KEY, val, [policy.value for policy in UnindexedQueryPolicy])
+
+        return cls._UNINDEXED_QUERY_POLICY
+
+    @classmethod
+    async def sync(cls, model_types: Iterable[type[Document]]):
+        for model_type in model_types:
+            index_information = await model_type.get_pymongo_collection().index_information()
+            cls._INDEXES[model_type.__name__] = [list(index["key"]) for index in index_information.values()]
+
+    @classmethod
+    def get_indexes(cls, model_type: type[Document]) -> list[list[tuple[str, Any]]] | None:
+        return cls._INDEXES.get(model_type.__name__)
+
+    @classmethod
+    def is_supported(cls, shape: QueryShape) -> tuple[bool, bool]:
+        """
+        Returns whether the filter can use an index (instead of a collection scan)
+        and whether the sort can be read from an index (instead of an in-memory sort).
+        """
+        indexes = cls._INDEXES.get(shape.model_name)
+        if indexes is None: # not synced, nothing to check against
+            return True, True
+
+        equality_fields = set(shape.equality_fields)
+        sort_supported = not shape.sort or any(_index_supports_sort(index_keys, equality_fields, shape.sort) for index_keys in indexes)
+
+        filter_fields = equality_fields | set(shape.range_fields)
+        filter_supported = (
+            (not filter_fields and not shape.text) # nothing to filter by
+            or shape.text
+            or any(index_keys[0][0] in filter_fields for index_keys in indexes)
+            or (bool(shape.sort) and sort_supported) # walks the sort index
+        )
+
+        return filter_supported, sort_supported
+
+    @classmethod
+    def check(cls, model_type: type[Document], filter_query: Mapping[str, Any], sort: list[tuple[str, int]]) -> bool:
+        """
+        Checks the query shape against the registry and applies the unindexed query policy.
+        Returns True if the query needs `allowDiskUse`.
+        """
+        shape = get_query_shape(model_type, filter_query, sort)
+        filter_supported, sort_supported = cls.is_supported(shape)
+        if filter_supported and sort_supported:
+            return False
+
+        policy = cls.get_policy()
+        if policy == UnindexedQueryPolicy.REJECT:
+            raise UnindexedQueryException(shape)
+
+        cls._record_unindexed_shape(model_type, shape, filter_query, sort)
+        return not sort_supported and policy == UnindexedQueryPolicy.ALLOW_DISK_USE
+
+    @classmethod
+    def _record_unindexed_shape(cls, model_type: type[Document], shape: QueryShape, filter_query: Mapping[str, Any], sort: list[tuple[str, int]]):
+        key = shape.model_dump_json()
+        unindexed_shape = cls._UNINDEXED_SHAPES.get(key)
+        if unindexed_shape is not None:
+            unindexed_shape.occurrences += 1
+            return
+
+        if len(cls._UNINDEXED_SHAPES) >= cls.MAX_TRACKED_SHAPES:
+            return
+
+        unindexed_shape = UnindexedQueryShape(**shape.model_dump(), occurrences = 1)
+        cls._UNINDEXED_SHAPES[key] = unindexed_shape
+
+        try:
+            task = asyncio.get_running_loop().create_task(cls._explain(model_type, unindexed_shape, filter_query, sort))
+        except RuntimeError: # no running loop
+            return
+
+        cls._EXPLAIN_TASKS.add(task)
+        task.add_done_callback(cls._EXPLAIN_TASKS.discard)
+
+    @classmethod
+    def _collect_plan_stages(cls, plan: Mapping[str, Any], stages: list[str]):
+        stages.append(plan.get("stage", "UNKNOWN"))
+        if "inputStage" in plan:
+            cls._collect_plan_stages(plan["inputStage"], stages)
+
+        for input_stage in plan.get("inputStages", []):
+            cls._collect_plan_stages(input_stage, stages)
+
+    @classmethod
+    async def _explain(cls, model_type: type[Document], shape: UnindexedQueryShape, filter_query: Mapping[str, Any], sort: list[tuple[str, int]]):
+        try:
+            cursor = model_type.get_pymongo_collection().find(filter_query, sort = sort or None, limit = 1)
+            explain = await cursor.explain()
+        except Exception as ex:
+            logger.warning(f"Could not explain unindexed {shape.model_name} query: {ex}")
+            return
+
+        stages = []
+        cls._collect_plan_stages(explain.get("queryPlanner", {}).get("winningPlan", {}), stages)
+        shape.plan_stages = stages
+
+        if "COLLSCAN" not in stages and "SORT" not in stages:
+            return # planner found a way after all, e.g. index intersection
+
+        # equality, sort, range order
+        suggested_index = [(field, 1) for field in shape.equality_fields]
+        suggested_index += [(field, direction) for field, direction in shape.sort if field not in shape.equality_fields]
+        suggested_index += [(field, 1) for field in shape.range_fields if field not in dict(suggested_index)]
+        shape.suggested_index = suggested_index
+
+        logger.warning(f"Unindexed {shape.model_name} query (plan: {' <- '.join(stages)}), suggested index: {suggested_index}")
+
+    @classmethod
+    def get_unindexed_shapes(cls) -> list[UnindexedQueryShape]:
+        return sorted(cls._UNINDEXED_SHAPES.values(), key = lambda shape: shape.occurrences, reverse = True)
@@ -3,9 +3,25 @@ from beanie.odm.operators.find.logical import Or
 from motor.motor_asyncio import AsyncIOMotorClient
 
 from repositories.base import BaseRepository
+from repositories.search import SearchIndex
 
 from models.job_listing import JobListing, JobListingData
 
 class JobListingRepository(BaseRepository[JobListing, JobListingData]):
+    # listing detail pages, imports only create listings so entries rarely go stale
+    ENTITY_CACHE_MAX_ENTRIES = 10_000
+    ENTITY_CACHE_TTL_SECONDS = 300
+
+    TRACK_GENERATION = True # listing pages and searches are cached
+    LOG_CHANGES = True # replayed by the search index of every api process
+
     def __init__(self, client: AsyncIOMotorClient):
-        super().__init__(client)
\ No newline at end of file
+        super().__init__(client)
+
+    # in-process full text index, only filled once started (see JobListingService.setup_search)
+    search_index = SearchIndex(
+        JobListing,
+        field_weights = {"title": 3, "expected_skills": 2, "description": 1},
+    )
+
+JobListingRepository.add_write_listener(JobListingRepository.search_index)
@@ -0,0 +1,28 @@
+from typing import Any, Mapping
+
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import UpdateOne
+
+from repositories.base import BaseRepository
+
+from models.listing_facet import ListingFacet, ListingFacetCount, ListingFacetCountData
+
+class ListingFacetCountRepository(BaseRepository[ListingFacetCount, ListingFacetCountData]):
+    def __init__(self, client: AsyncIOMotorClient):
+        super().__init__(client)
+
+    async def increment(self, counts: Mapping[tuple[ListingFacet, Any], int]):
+        if not counts:
+            return
+
+        operations = [
+            UpdateOne({"facet": facet, "value": value}, {"$inc": {"count": count}}, upsert = True)
+            for (facet, value), count in counts.items()
+        ]
+        await self._model_type.get_pymongo_collection().bulk_write(operations, ordered = False)
+
+    async def replace_all(self, counts: Mapping[tuple[ListingFacet, Any], int]):
+        await self._replace_collection([
+            ListingFacetCountData(facet = facet, value = value, count = count).model_dump()
+            for (facet, value), count in counts.items()
+        ])
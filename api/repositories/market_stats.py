@@ -0,0 +1,47 @@
+from typing import Any, Mapping
+
+from beanie.odm.operators.find.comparison import In
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import UpdateOne
+
+from repositories.base import BaseRepository
+
+from models.market_stats import MarketStats, MarketStatsData
+
+class MarketStatsRepository(BaseRepository[MarketStats, MarketStatsData]):
+    def __init__(self, client: AsyncIOMotorClient):
+        super().__init__(client)
+
+    def fetch_by_keys(self, keys: list[str]):
+        return self.find(In(MarketStats.key, keys)).to_list()
+
+    async def increment(self, increments: Mapping[str, tuple[Mapping[str, Any], Mapping[str, int | float]]]):
+        """
+        Applies `$inc` updates per key, `increments` maps key -> (key fields, dotted field path -> increment).
+        """
+        if not increments:
+            return
+
+        operations = [
+            UpdateOne({"key": key}, {"$setOnInsert": {"key": key, **key_fields}, "$inc": inc}, upsert = True)
+            for key, (key_fields, inc) in increments.items()
+        ]
+        await self._model_type.get_pymongo_collection().bulk_write(operations, ordered = False)
+
+    async def replace_all(self, increments: Mapping[str, tuple[Mapping[str, Any], Mapping[str, int | float]]]):
+        """
+        Replaces the collection with the documents the `increments` would create in an empty one.
+        """
+        documents = []
+        for key, (key_fields, inc) in increments.items():
+            document = {"key": key, **key_fields}
+            for field_path, value in inc.items():
+                *parents, field_name = field_path.split(".")
+                parent = document
+                for parent_name in parents:
+                    parent = parent.setdefault(parent_name, {})
+                parent[field_name] = value
+
+            documents.append(MarketStatsData.model_validate(document).model_dump())
+
+        await self._replace_collection(documents)
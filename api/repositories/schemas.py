@@ -1,4 +1,5 @@
-from pydantic import BaseModel, BeforeValidator, IPvAnyAddress
+from beanie import PydanticObjectId
+from pydantic import BaseModel, BeforeValidator, Field, IPvAnyAddress
 from typing import Annotated
 
 IntConvertible = Annotated[int, BeforeValidator(lambda v: int(v) if isinstance(v, str) and v.isdigit() else v)]
@@ -13,4 +14,20 @@ class MongoClientCredentials(BaseModel):
 
 class OrderByField(BaseModel):
     field_name: str
-    ascending: bool
\ No newline at end of file
+    ascending: bool
+
+class DocumentId(BaseModel): # projection of only the id
+    id: PydanticObjectId = Field(alias = "_id")
+
+class QueryShape(BaseModel):
+    model_name: str
+    equality_fields: list[str]
+    range_fields: list[str]
+    sort: list[tuple[str, int]]
+    text: bool
+
+class UnindexedQueryShape(QueryShape):
+    occurrences: int
+    plan_stages: list[str] | None = None
+    suggested_index: list[tuple[str, int]] | None = None
+
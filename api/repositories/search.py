@@ -0,0 +1,403 @@
+import asyncio
+import heapq
+import logging
+import math
+import re
+import sys
+import time
+
+from array import array
+from typing import Any, Hashable, Iterable, Mapping
+
+from beanie import Document, PydanticObjectId
+
+from repositories.base import RepositoryWriteListener
+
+from models.collection_change import CollectionChange
+from models.collection_generation import CollectionGeneration
+
+logger = logging.getLogger(__name__)
+
+_TOKEN_PATTERN = re.compile(r"\w+")
+
+def tokenize(text: str) -> list[str]:
+    return _TOKEN_PATTERN.findall(text.lower())
+
+class InvertedIndex:
+    """
+    BM25 scored inverted index. Each term (interned) has two parallel posting arrays,
+    document numbers and field weighted term frequencies, so a posting costs 8 bytes instead of a few python objects.
+    Adjacent term pairs are indexed as phrase terms ("senior python"), documents containing a pair of the query
+    in that order score higher, weighted by PHRASE_BOOST. They roughly double the postings, `index_phrases` turns them off.
+    Removed documents are tombstoned and dropped from the postings once they outnumber live ones.
+    Not thread safe, one index is used from one thread at a time.
+    """
+    K1 = 1.2
+    B = 0.75
+    PHRASE_BOOST = 1.0
+
+    COMPACT_MIN_REMOVED = 1000
+
+    def __init__(self, field_weights: Mapping[str, float], index_phrases: bool = True):
+        self.field_weights = dict(field_weights)
+        self.index_phrases = index_phrases
+
+        self._term_numbers: dict[str, int] = {}
+        self._posting_doc_numbers: list[array] = [] # term number -> document numbers, ascending
+        self._posting_frequencies: list[array] = [] # term number -> weighted term frequencies
+
+        self._doc_ids: list[Hashable | None] = [] # document number -> id, None if removed
+        self._doc_numbers: dict[Hashable, int] = {}
+        self._doc_lengths = array("f")
+
+        self._total_length = 0.0
+        self._removed_count = 0
+
+    def __len__(self):
+        return len(self._doc_numbers)
+
+    def __contains__(self, doc_id: Hashable):
+        return doc_id in self._doc_numbers
+
+    def _get_term_number(self, term: str) -> int:
+        term_number = self._term_numbers.get(term)
+        if term_number is None:
+            term_number = len(self._posting_doc_numbers)
+            self._term_numbers[sys.intern(term)] = term_number
+            self._posting_doc_numbers.append(array("I"))
+            self._posting_frequencies.append(array("f"))
+
+        return term_number
+
+    def _get_phrase_terms(self, terms: list[str]) -> list[str]:
+        # tokens never contain spaces, phrase terms can not collide with single terms
+        return [f"{first} {second}" for first, second in zip(terms, terms[1:])] if self.index_phrases else []
+
+    def _get_term_frequencies(self, fields: Mapping[str, Any]) -> tuple[dict[str, float], dict[str, float]]:
+        frequencies: dict[str, float] = {}
+        phrase_frequencies: dict[str, float] = {}
+        for field_name, weight in self.field_weights.items():
+            value = fields.get(field_name)
+            if not value:
+                continue
+
+            texts = value if isinstance(value, list) else [value]
+            for text in texts:
+                terms = tokenize(str(text))
+                for term in terms:
+                    frequencies[term] = frequencies.get(term, 0.0) + weight
+
+                for phrase_term in self._get_phrase_terms(terms):
+                    phrase_frequencies[phrase_term] = phrase_frequencies.get(phrase_term, 0.0) + weight
+
+        return frequencies, phrase_frequencies
+
+    def add(self, doc_id: Hashable, fields: Mapping[str, Any]):
+        """
+        Indexes the `field_weights` fields of a document, replacing it if it was indexed before.
+        """
+        self.remove(doc_id)
+
+        doc_number = len(self._doc_ids)
+        self._doc_ids.append(doc_id)
+        self._doc_numbers[doc_id] = doc_number
+
+        frequencies, phrase_frequencies = self._get_term_frequencies(fields)
+        for term_frequencies in (frequencies, phrase_frequencies):
+            for term, frequency in term_frequencies.items():
+                term_number = self._get_term_number(term)
+                self._posting_doc_numbers[term_number].append(doc_number)
+                self._posting_frequencies[term_number].append(frequency)
+
+        doc_length = sum(frequencies.values()) # phrase terms do not count towards the length
+        self._doc_lengths.append(doc_length)
+        self._total_length += doc_length
+
+    def remove(self, doc_id: Hashable) -> bool:
+        doc_number = self._doc_numbers.pop(doc_id, None)
+        if doc_number is None:
+            return False
+
+        self._doc_ids[doc_number] = None
+        self._total_length -= self._doc_lengths[doc_number]
+        self._removed_count += 1
+
+        if self._removed_count >= self.COMPACT_MIN_REMOVED and self._removed_count > len(self._doc_numbers):
+            self._compact()
+
+        return True
+
+    def _compact(self):
+        new_doc_numbers = array("i", [-1]) * len(self._doc_ids)
+        doc_ids = []
+        doc_lengths = array("f")
+        for doc_number, doc_id in enumerate(self._doc_ids):
+            if doc_id is None:
+                continue
+
+            new_doc_numbers[doc_number] = len(doc_ids)
+            doc_ids.append(doc_id)
+            doc_lengths.append(self._doc_lengths[doc_number])
+
+        term_numbers = {}
+        posting_doc_numbers = []
+        posting_frequencies = []
+        for term, term_number in self._term_numbers.items():
+            doc_numbers = array("I")
+            frequencies = array("f")
+            for doc_number, frequency in zip(self._posting_doc_numbers[term_number], self._posting_frequencies[term_number]):
+                new_doc_number = new_doc_numbers[doc_number]
+                if new_doc_number >= 0:
+                    doc_numbers.append(new_doc_number)
+                    frequencies.append(frequency)
+
+            if doc_numbers:
+                term_numbers[term] = len(posting_doc_numbers)
+                posting_doc_numbers.append(doc_numbers)
+                posting_frequencies.append(frequencies)
+
+        self._term_numbers = term_numbers
+        self._posting_doc_numbers = posting_doc_numbers
+        self._posting_frequencies = posting_frequencies
+
+        self._doc_ids = doc_ids
+        self._doc_numbers = {doc_id: doc_number for doc_number, doc_id in enumerate(doc_ids)}
+        self._doc_lengths = doc_lengths
+        self._removed_count = 0
+
+    def search(self, text: str, limit: int) -> list[tuple[Hashable, float]]:
+        """
+        Returns up to `limit` (id, score) pairs of documents matching any term of `text`, best first.
+        """
+        doc_count = len(self._doc_numbers)
+        if doc_count == 0:
+            return []
+
+        average_length = self._total_length / doc_count or 1.0
+
+        terms = tokenize(text)
+        weighted_terms = [(term, 1.0) for term in set(terms)]
+        weighted_terms += [(phrase_term, self.PHRASE_BOOST) for phrase_term in set(self._get_phrase_terms(terms))]
+
+        scores: dict[int, float] = {}
+        for term, boost in weighted_terms:
+            term_number = self._term_numbers.get(term)
+            if term_number is None:
+                continue
+
+            doc_numbers = self._posting_doc_numbers[term_number]
+            # tombstoned postings are counted until compaction, close enough for idf
+            document_frequency = min(len(doc_numbers), doc_count)
+            idf = boost * math.log(1 + (doc_count - document_frequency + 0.5) / (document_frequency + 0.5))
+
+            for doc_number, frequency in zip(doc_numbers, self._posting_frequencies[term_number]):
+                if self._doc_ids[doc_number] is None:
+                    continue
+
+                length_norm = self.K1 * (1 - self.B + self.B * self._doc_lengths[doc_number] / average_length)
+                scores[doc_number] = scores.get(doc_number, 0.0) + idf * frequency * (self.K1 + 1) / (frequency + length_norm)
+
+        top = heapq.nlargest(limit, scores.items(), key = lambda doc_score: doc_score[1])
+        return [(self._doc_ids[doc_number], score) for doc_number, score in top]
+
+class SearchIndex(RepositoryWriteListener):
+    """
+    Keeps an `InvertedIndex` of a collection in memory. Built from a full scan, then kept up to date
+    by repository write hooks (writes of this process) and by replaying the collection's change log
+    (writes of any process, e.g. imports, edits and deletes, see `BaseRepository.LOG_CHANGES`):
+    the documents of each logged generation are read again, indexed if they still exist and removed otherwise.
+    Generations are applied in order. A missing one is waited for up to CHANGE_GAP_SECONDS (its writer may not have
+    logged it yet), then the index is rebuilt.
+    Builds add the scanned batches on a worker thread, into a new index that is swapped in once complete,
+    so a rebuild of a large collection does not block the event loop.
+    """
+    BUILD_BATCH_SIZE = 10_000
+    REFRESH_MAX_CHANGES = 100 # change log entries read per query, each holds the ids of one write
+    CHANGE_GAP_SECONDS = 60
+
+    _INSTANCES: list["SearchIndex"] = []
+
+    def __init__(self, model_type: type[Document], field_weights: Mapping[str, float]):
+        self._INSTANCES.append(self)
+
+        self.model_type = model_type
+        self.field_weights = dict(field_weights)
+
+        self._index: InvertedIndex | None = None
+        self._version = 0 # bumped whenever the indexed documents change, lets caches of search results tell they are stale
+        self._generation = 0 # last change log generation applied
+        self._gap: tuple[int, float] | None = None # (missing generation, monotonic time it was first missed)
+
+        self._refresh_lock = asyncio.Lock()
+        self._refresh_task: asyncio.Task | None = None
+        self._scheduled_refresh_task: asyncio.Task | None = None
+
+    @property
+    def is_ready(self) -> bool:
+        return self._index is not None
+
+    @property
+    def version(self) -> int:
+        return self._version
+
+    @classmethod
+    def release_all(cls):
+        """
+        Drops every index of this process and stops indexing its writes, for forked job workers:
+        they inherit the indexes of the api process but never search them.
+        """
+        for search_index in cls._INSTANCES:
+            search_index._index = None
+
+    def _get_projection(self) -> dict[str, int]:
+        return {field_name: 1 for field_name in self.field_weights}
+
+    def _add_documents(self, index: InvertedIndex, documents: list[Mapping[str, Any]]):
+        for document in documents:
+            index.add(document["_id"], document)
+
+    async def _read_generation(self) -> int:
+        generation = await CollectionGeneration.get_pymongo_collection().find_one(
+            {"collection": self.model_type.get_collection_name()}, {"generation": 1})
+
+        return generation["generation"] if generation is not None else 0
+
+    async def _read_changes(self, after_generation: int) -> list[Mapping[str, Any]]:
+        cursor = CollectionChange.get_pymongo_collection().find(
+            {"collection": self.model_type.get_collection_name(), "generation": {"$gt": after_generation}},
+            {"generation": 1, "ids": 1},
+            sort = [("generation", 1)],
+            limit = self.REFRESH_MAX_CHANGES,
+        )
+
+        return await cursor.to_list(None)
+
+    async def build(self):
+        async with self._refresh_lock:
+            await self._build()
+
+    async def _build(self):
+        # writes during the scan are logged after this generation, the refresh below applies them again
+        generation = await self._read_generation()
+
+        index = InvertedIndex(self.field_weights)
+        cursor = self.model_type.get_pymongo_collection().find({}, self._get_projection(), batch_size = self.BUILD_BATCH_SIZE)
+        while documents := await cursor.to_list(self.BUILD_BATCH_SIZE):
+            await asyncio.to_thread(self._add_documents, index, documents) # not searched yet
+
+        self._index = index
+        self._version += 1
+        self._generation = generation
+        self._gap = None
+        logger.info(f"Built {self.model_type.__name__} search index, {len(index)} documents")
+
+        await self._refresh()
+
+    async def refresh(self):
+        async with self._refresh_lock:
+            if self._index is not None:
+                await self._refresh()
+
+    async def _refresh(self):
+        generation = await self._read_generation()
+        while self._generation < generation:
+            changes = await self._read_changes(self._generation)
+
+            applied_generation = self._generation
+            ids = set()
+            for change in changes:
+                if change["generation"] != applied_generation + 1:
+                    break
+
+                ids.update(change["ids"])
+                applied_generation += 1
+
+            if ids:
+                await self._apply_changes(list(ids))
+
+            if applied_generation > self._generation:
+                self._generation = applied_generation
+                self._gap = None
+
+            more_changes = len(changes) == self.REFRESH_MAX_CHANGES and applied_generation == changes[-1]["generation"]
+            if applied_generation < generation and not more_changes:
+                await self._on_gap()
+                return
+
+    async def _on_gap(self):
+        missing_generation = self._generation + 1
+        now = time.monotonic()
+        if self._gap is None or self._gap[0] != missing_generation:
+            self._gap = (missing_generation, now)
+            return
+
+        if now - self._gap[1] >= self.CHANGE_GAP_SECONDS:
+            # its writer stopped before logging it, or it expired from the log
+            logger.warning(f"Rebuilding {self.model_type.__name__} search index, generation {missing_generation} is missing from the change log")
+            await self._build()
+
+    async def _apply_changes(self, ids: list[PydanticObjectId]):
+        collection = self.model_type.get_pymongo_collection()
+        for start in range(0, len(ids), self.BUILD_BATCH_SIZE):
+            batch_ids = ids[start:start + self.BUILD_BATCH_SIZE]
+            documents = await collection.find({"_id": {"$in": batch_ids}}, self._get_projection()).to_list(None)
+            self._add_documents(self._index, documents)
+
+            found_ids = {document["_id"] for document in documents}
+            for _id in batch_ids:
+                if _id not in found_ids: # deleted
+                    self._index.remove(_id)
+
+            self._version += 1
+
+    def schedule_refresh(self):
+        if self._scheduled_refresh_task is not None and not self._scheduled_refresh_task.done():
+            return
+
+        self._scheduled_refresh_task = asyncio.create_task(self.refresh())
+
+    async def _refresh_periodically(self, interval_seconds: float):
+        while True:
+            await asyncio.sleep(interval_seconds)
+            try:
+                await self.refresh()
+            except Exception:
+                logger.exception(f"Could not refresh {self.model_type.__name__} search index")
+
+    async def start(self, refresh_interval_seconds: float):
+        await self.build()
+        self._refresh_task = asyncio.create_task(self._refresh_periodically(refresh_interval_seconds))
+
+    async def stop(self):
+        for task in (self._refresh_task, self._scheduled_refresh_task):
+            if task is not None:
+                task.cancel()
+
+        self._refresh_task = None
+        self._scheduled_refresh_task = None
+
+    def search(self, text: str, limit: int) -> list[tuple[PydanticObjectId, float]]:
+        return self._index.search(text, limit)
+
+    def _upsert(self, items: Iterable[Document]):
+        if self._index is None: # not built yet, the build (or its refresh) picks the write up from the change log
+            return
+
+        for item in items:
+            self._index.add(item.id, {field_name: getattr(item, field_name, None) for field_name in self.field_weights})
+        self._version += 1
+
+    # Repository write hooks
+    def on_create(self, items: list[Document]):
+        self._upsert(items)
+
+    def on_update(self, items: list[Document], previous_items: list[Document | None]):
+        self._upsert(items)
+
+    def on_delete(self, ids: list[PydanticObjectId], previous_items: list[Document | None] = None):
+        if self._index is None:
+            return
+
+        for _id in ids:
+            self._index.remove(_id)
+        self._version += 1
@@ -0,0 +1,59 @@
+import asyncio
+
+from typing import Any, Awaitable, Callable, Generic, Hashable, TypeVar
+
+TKey = TypeVar("TKey", bound = Hashable)
+TValue = TypeVar("TValue")
+
+class SingleFlight(Generic[TKey, TValue]):
+    """
+    Coalesces identical concurrent calls: while a call for a key is in flight, callers with the same key
+    await its result instead of starting their own. Results are shared objects, callers must not mutate them.
+    The fetch runs in its own task, a cancelled caller does not cancel it for the others.
+    Once `max_keys` calls are in flight, new keys run without coalescing.
+    Not thread safe, meant to be used from the event loop.
+    """
+    def __init__(self, max_keys: int):
+        self.max_keys = max_keys
+
+        self._in_flight: dict[TKey, asyncio.Task[TValue]] = {}
+
+        self.hits = 0 # joined an in-flight call
+        self.misses = 0 # started a call
+        self.overflows = 0 # ran uncoalesced, key table was full
+
+    def __len__(self):
+        return len(self._in_flight)
+
+    async def do(self, key: TKey, fetch: Callable[[], Awaitable[TValue]]) -> TValue:
+        task = self._in_flight.get(key)
+        if task is not None:
+            self.hits += 1
+            return await asyncio.shield(task)
+
+        if len(self._in_flight) >= self.max_keys:
+            self.overflows += 1
+            return await fetch()
+
+        self.misses += 1
+        task = asyncio.ensure_future(fetch())
+        self._in_flight[key] = task
+        task.add_done_callback(lambda task: self._on_done(key, task))
+
+        return await asyncio.shield(task)
+
+    def _on_done(self, key: TKey, task: asyncio.Task[TValue]):
+        if self._in_flight.get(key) is task:
+            del self._in_flight[key]
+
+        if not task.cancelled():
+            task.exception() # retrieved, even if every caller was cancelled
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "in_flight": len(self._in_flight),
+            "max_keys": self.max_keys,
+            "hits": self.hits,
+            "misses": self.misses,
+            "overflows": self.overflows,
+        }
@@ -7,6 +7,10 @@ from repositories.base import BaseRepository
 from models.user import User, UserDataFull
 
 class UserRepository(BaseRepository[User, UserDataFull]):
+    # users of authenticated requests, short lived so changes made by other workers show up soon
+    ENTITY_CACHE_MAX_ENTRIES = 10_000
+    ENTITY_CACHE_TTL_SECONDS = 30
+
     def __init__(self, client: AsyncIOMotorClient):
         super().__init__(client)
 
@@ -0,0 +1,71 @@
+import base64
+import binascii
+import inspect
+
+from datetime import datetime
+from typing import Any
+
+from beanie import SortDirection
+from bson import ObjectId, json_util
+
+from repositories.exceptions import InvalidCursorException
+
+# Keyset pagination
+# values are placed into filters as they are, documents or arrays would be read as query operators ({"$ne": null})
+_CURSOR_VALUE_TYPES = (str, int, float, bool, datetime, ObjectId, type(None))
+
+def encode_cursor(field_names: list[str], values: list[Any]) -> str:
+    payload = json_util.dumps({"f": field_names, "v": values})
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str, field_names: list[str]) -> list[Any]:
+    try:
+        padded_cursor = cursor + "=" * (-len(cursor) % 4)
+        payload = json_util.loads(base64.urlsafe_b64decode(padded_cursor))
+        cursor_field_names, values = payload["f"], payload["v"]
+    except (binascii.Error, ValueError, TypeError, KeyError):
+        raise InvalidCursorException(cursor, "malformed token")
+
+    if not isinstance(values, list) or any(not isinstance(value, _CURSOR_VALUE_TYPES) for value in values):
+        raise InvalidCursorException(cursor, "malformed token")
+
+    if cursor_field_names != field_names or len(values) != len(field_names):
+        raise InvalidCursorException(cursor, f"token was created for sort order {cursor_field_names}, not {field_names}")
+
+    return values
+
+def _build_after_condition(field_name: str, direction: SortDirection, value: Any) -> dict[str, Any] | None:
+    # null sorts before every other value in mongo, comparison operators never match it
+    if direction == SortDirection.ASCENDING:
+        if value is None:
+            return {field_name: {"$ne": None}}
+        return {field_name: {"$gt": value}}
+
+    if value is None:
+        return None # nothing comes after null in descending order
+    return {"$or": [{field_name: {"$lt": value}}, {field_name: None}]}
+
+def build_keyset_filter(sort_expressions: list[tuple[str, SortDirection]], values: list[Any]) -> dict[str, Any]:
+    """
+    Builds a filter matching documents that come strictly after `values` in `sort_expressions` order.
+    Sort expressions must end with a unique field (see BaseRepository._parse_order_by).
+    """
+    branches = []
+    for i, (field_name, direction) in enumerate(sort_expressions):
+        after_condition = _build_after_condition(field_name, direction, values[i])
+        if after_condition is None:
+            continue
+
+        branch = {prev_field_name: prev_value for (prev_field_name, _), prev_value in zip(sort_expressions[:i], values[:i])}
+        branch.update(after_condition)
+        branches.append(branch)
+
+    return {"$or": branches}
+
+# Aggregation
+async def aggregate_to_list(collection, pipeline: list[dict[str, Any]], **kwargs) -> list[dict[str, Any]]:
+    cursor = collection.aggregate(pipeline, **kwargs)
+    if inspect.isawaitable(cursor): # pymongo async collections return a coroutine, motor collections a cursor
+        cursor = await cursor
+
+    return await cursor.to_list(None)
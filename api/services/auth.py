@@ -1,4 +1,6 @@
+import hashlib
 import os
+import time
 
 from typing import Annotated
 from beanie import PydanticObjectId
@@ -12,17 +14,23 @@ from pwdlib.exceptions import UnknownHashError
 import jwt
 import json
 
+from bson.errors import InvalidId
+from pymongo.errors import DuplicateKeyError
+
 from datetime import datetime, timedelta
 
 from apps.auth.requests import LoginRequest
 from apps.auth.responses import LoginResponse
 
+from repositories.cache import TTLCache
 from repositories.factory import RepositoryFactory
 from repositories.user import UserRepository
 
 from models.user import User, UserDataFull
 
-from services.exceptions import BadEnvironmentValueException, EmailExistsException, IncorrectPasswordException, MissingEnvironmentVariableException, UserNotFoundExcepotion, UsernameExistsException
+from services.login_throttle import LoginThrottle
+from services.password_hashing import PasswordHashingPool
+from services.exceptions import AuthServiceException, BadEnvironmentValueException, EmailExistsException, IncorrectPasswordException, MissingEnvironmentVariableException, UserNotFoundExcepotion, UsernameExistsException
 from services.schemas import Token, TokenData
 
 class PydanticObjectIdEncoder(json.JSONEncoder):
@@ -34,6 +42,7 @@ class PydanticObjectIdEncoder(json.JSONEncoder):
 
 class AuthService:
     OAUTH2_SCHEME = OAuth2PasswordBearer(tokenUrl="/auth/login")
+    OPTIONAL_OAUTH2_SCHEME = OAuth2PasswordBearer(tokenUrl="/auth/login", auto_error=False)
 
     ENV_SECRET_KEY = "AUTH_SECRET"
     _SECRET = os.getenv(ENV_SECRET_KEY)
@@ -49,6 +58,24 @@ class AuthService:
 
     _PASSWORD_HASHER = PasswordHash.recommended()
 
+    ENV_HASH_CONCURRENCY_KEY = "AUTH_HASH_CONCURRENCY"
+    ENV_HASH_MAX_QUEUED_KEY = "AUTH_HASH_MAX_QUEUED"
+    _HASHING_POOL: PasswordHashingPool = None
+
+    ENV_LOGIN_THROTTLE_WINDOW_SECONDS_KEY = "AUTH_LOGIN_THROTTLE_WINDOW_SECONDS"
+    ENV_LOGIN_MAX_FAILURES_PER_IDENTIFIER_KEY = "AUTH_LOGIN_MAX_FAILURES_PER_IDENTIFIER"
+    ENV_LOGIN_MAX_ATTEMPTS_PER_IP_KEY = "AUTH_LOGIN_MAX_ATTEMPTS_PER_IP"
+    LOGIN_THROTTLE_MAX_KEYS = 100_000
+    _LOGIN_THROTTLE: LoginThrottle = None
+
+    # comma separated user ids allowed on the /admin endpoints, nobody if empty
+    ENV_ADMIN_USER_IDS_KEY = "AUTH_ADMIN_USER_IDS"
+    _ADMIN_USER_IDS: frozenset[PydanticObjectId] = None
+
+    # verified tokens by digest, each kept until the token expires
+    MAX_VERIFIED_TOKENS = 10_000
+    _VERIFIED_TOKEN_CACHE: TTLCache[bytes, TokenData] = TTLCache(max_entries = MAX_VERIFIED_TOKENS)
+
     @classmethod
     def _get_secret(cls):
         if cls._SECRET is None:
@@ -92,10 +119,69 @@ class AuthService:
         return cls._ACCESS_TOKEN_VALID_TIMEDELTA
 
 
+    @classmethod
+    def _get_int_from_env(cls, env_key: str, default: int) -> int:
+        val = os.getenv(env_key)
+        if val is None:
+            return default
+
+        try:
+            return int(val)
+        except ValueError:
+            raise BadEnvironmentValueException(f"Environment variable {env_key} must be int-convertible")
+
+    @classmethod
+    def get_admin_user_ids(cls) -> frozenset[PydanticObjectId]:
+        if cls._ADMIN_USER_IDS is None:
+            val = os.getenv(cls.ENV_ADMIN_USER_IDS_KEY, "")
+            try:
+                cls._ADMIN_USER_IDS = frozenset(PydanticObjectId(_id.strip()) for _id in val.split(",") if _id.strip())
+            except InvalidId:
+                raise BadEnvironmentValueException(f"Environment variable {cls.ENV_ADMIN_USER_IDS_KEY} must be a comma separated list of user ids")
+
+        return cls._ADMIN_USER_IDS
+
+    @classmethod
+    def is_admin(cls, user: User) -> bool:
+        return user.id in cls.get_admin_user_ids()
+
+    @classmethod
+    def get_hashing_pool(cls) -> PasswordHashingPool:
+        if cls._HASHING_POOL is None:
+            cls._HASHING_POOL = PasswordHashingPool(
+                concurrency = cls._get_int_from_env(cls.ENV_HASH_CONCURRENCY_KEY, os.cpu_count() or 1),
+                max_queued = cls._get_int_from_env(cls.ENV_HASH_MAX_QUEUED_KEY, 32),
+            )
+
+        return cls._HASHING_POOL
+
+    @classmethod
+    def get_login_throttle(cls) -> LoginThrottle:
+        if cls._LOGIN_THROTTLE is None:
+            cls._LOGIN_THROTTLE = LoginThrottle(
+                window_seconds = cls._get_int_from_env(cls.ENV_LOGIN_THROTTLE_WINDOW_SECONDS_KEY, 60),
+                max_failures_per_identifier = cls._get_int_from_env(cls.ENV_LOGIN_MAX_FAILURES_PER_IDENTIFIER_KEY, 10),
+                max_attempts_per_ip = cls._get_int_from_env(cls.ENV_LOGIN_MAX_ATTEMPTS_PER_IP_KEY, 60),
+                max_keys = cls.LOGIN_THROTTLE_MAX_KEYS,
+            )
+
+        return cls._LOGIN_THROTTLE
+
+    @classmethod
+    def teardown(cls):
+        if cls._HASHING_POOL is not None:
+            cls._HASHING_POOL.shutdown()
+            cls._HASHING_POOL = None
+
     @classmethod
     def _hash_password(cls, password: str):
         return cls._PASSWORD_HASHER.hash(password, salt=cls._get_hash_salt())
 
+    @classmethod
+    async def _hash_password_async(cls, password: str):
+        # argon2 takes tens of milliseconds, the event loop must not wait for it
+        return await cls.get_hashing_pool().run(cls._hash_password, password)
+
     @classmethod
     def _get_token_data_from_user(cls, user: User):
         return TokenData(
@@ -111,33 +197,49 @@ class AuthService:
         except UnknownHashError:
             return False
 
+    @classmethod
+    async def verify_password_async(cls, password: str, hashed_password: str):
+        return await cls.get_hashing_pool().run(cls.verify_password, password, hashed_password)
+
     @classmethod
     async def get_user_by_id(cls, _id: PydanticObjectId):
         repo = await RepositoryFactory.get_repository(UserRepository)
         return await repo.get_by_id(_id)
 
     @classmethod
-    async def create_user(cls, data: UserDataFull):
-        repo = await RepositoryFactory.get_repository(UserRepository)
+    def _get_duplicate_user_exception(cls, data: UserDataFull, ex: DuplicateKeyError) -> AuthServiceException:
+        key_pattern = (ex.details or {}).get("keyPattern")
+        if key_pattern is not None:
+            is_email = "email" in key_pattern
+        else: # older servers only name the index in the message
+            is_email = "index: email " in str(ex)
 
-        user_by_username = await repo.fetch_by_username(data.username)
-        if user_by_username is not None:
-            raise UsernameExistsException(data.username)
+        if is_email:
+            return EmailExistsException(data.email)
 
-        user_by_email = await repo.fetch_by_email(data.email)
-        if user_by_email is not None:
-            raise EmailExistsException(data.email)
+        return UsernameExistsException(data.username)
+
+    @classmethod
+    async def create_user(cls, data: UserDataFull):
+        repo = await RepositoryFactory.get_repository(UserRepository)
 
         create_data = data.model_copy()
-        create_data.password = cls._hash_password(create_data.password)
+        create_data.password = await cls._hash_password_async(create_data.password)
 
-        return await repo.create(create_data)
+        try:
+            return await repo.create(create_data)
+        except DuplicateKeyError as ex:
+            raise cls._get_duplicate_user_exception(data, ex)
 
     @classmethod
     async def update_user(cls, _id: PydanticObjectId, data: UserDataFull):
-        data.password = cls._hash_password(data.password)
+        data.password = await cls._hash_password_async(data.password)
         repo = await RepositoryFactory.get_repository(UserRepository)
-        return await repo.update(data, _id)
+
+        try:
+            return await repo.update(data, _id)
+        except DuplicateKeyError as ex:
+            raise cls._get_duplicate_user_exception(data, ex)
 
     @classmethod
     def create_token(cls, user: User, valid_timedelta: timedelta = None):
@@ -162,18 +264,20 @@ class AuthService:
         )
 
     @classmethod
-    async def login(cls, request: LoginRequest):
+    async def login(cls, request: LoginRequest, client_ip: str | None = None):
+        # throttled attempts are rejected before the lookup and the password hash
+        login_throttle = cls.get_login_throttle()
+        login_throttle.check(request.usernameOrEmail, client_ip)
+
         repo = await RepositoryFactory.get_repository(UserRepository)
         user = await repo.fetch_by_email_or_username(request.usernameOrEmail)
-        print("login user", user,"request",request)
-
-        print("email",await repo.fetch_by_email(request.usernameOrEmail))
-        print("username",await repo.fetch_by_username(request.usernameOrEmail))
 
         if user is None:
+            login_throttle.record_failure(request.usernameOrEmail)
             raise UserNotFoundExcepotion(request.usernameOrEmail)
 
-        if not cls.verify_password(request.password, user.password):
+        if not await cls.verify_password_async(request.password, user.password):
+            login_throttle.record_failure(request.usernameOrEmail)
             raise IncorrectPasswordException(user, request.password)
 
         token = cls.create_token(user)
@@ -183,21 +287,51 @@ class AuthService:
         )
 
     @classmethod
-    def decode_token(cls, token: str | Token):
-        if isinstance(token, Token):
-            token = token.token
-
-        token_data_dict = jwt.decode(
+    def _decode_token_dict(cls, token: str):
+        return jwt.decode(
             token,
             cls._get_secret(),
             algorithms=[cls._TOKEN_HASH_ALGORITHM]
         )
+
+    @classmethod
+    def decode_token(cls, token: str | Token):
+        if isinstance(token, Token):
+            token = token.token
+
+        token_data_dict = cls._decode_token_dict(token)
+        token_data = TokenData.model_validate(token_data_dict)
+
+        return token_data
+
+    @classmethod
+    def decode_token_cached(cls, token: str) -> TokenData:
+        """
+        `decode_token` that skips signature verification for tokens verified before, until they expire.
+        """
+        token_digest = hashlib.sha256(token.encode()).digest()
+        token_data = cls._VERIFIED_TOKEN_CACHE.get(token_digest)
+        if token_data is not None:
+            return token_data
+
+        token_data_dict = cls._decode_token_dict(token)
         token_data = TokenData.model_validate(token_data_dict)
 
+        valid_seconds = token_data_dict["exp"] - time.time() if "exp" in token_data_dict else None
+        if valid_seconds is not None and valid_seconds > 0:
+            cls._VERIFIED_TOKEN_CACHE.set(token_digest, token_data, ttl_seconds = valid_seconds)
+
         return token_data
 
     @classmethod
     async def get_user_from_token(cls, token: Annotated[str, Depends(OAUTH2_SCHEME)]):
-        token_data = cls.decode_token(token)
+        token_data = cls.decode_token_cached(token)
         repo = await RepositoryFactory.get_repository(UserRepository)
-        return await repo.get_by_id(token_data.user_id)
\ No newline at end of file
+        return await repo.get_by_id_cached(token_data.user_id) # invalidated by update_user
+
+    @classmethod
+    async def get_optional_user_from_token(cls, token: Annotated[str | None, Depends(OPTIONAL_OAUTH2_SCHEME)]):
+        if token is None:
+            return None
+
+        return await cls.get_user_from_token(token)
@@ -0,0 +1,77 @@
+from abc import ABC, abstractmethod
+
+from beanie.odm.queries.find import FindMany
+from bson import json_util
+
+from repositories.cache import TTLCache
+
+from services.schemas import ElementCount
+
+class CountStrategy(ABC):
+    exact: bool = True # counts returned by this strategy are always exact
+
+    @abstractmethod
+    async def count(self, query: FindMany) -> ElementCount: ...
+
+class ExactCount(CountStrategy):
+    async def count(self, query: FindMany) -> ElementCount:
+        return ElementCount(count = await query.count(), exact = True)
+
+class EstimatedCount(CountStrategy):
+    """
+    Reads collection metadata for unfiltered queries instead of scanning,
+    filtered queries are counted with `filtered_strategy`.
+    """
+    exact = False
+
+    def __init__(self, filtered_strategy: CountStrategy = None):
+        self.filtered_strategy = filtered_strategy if filtered_strategy is not None else ExactCount()
+
+    async def count(self, query: FindMany) -> ElementCount:
+        if query.get_filter_query():
+            return await self.filtered_strategy.count(query)
+
+        collection = query.document_model.get_pymongo_collection()
+        return ElementCount(count = await collection.estimated_document_count(), exact = False)
+
+class CappedCount(CountStrategy):
+    """
+    Stops counting at `cap` documents, larger results are reported as `cap` with `exact = False`.
+    """
+    exact = False
+
+    def __init__(self, cap: int = 10_000):
+        self.cap = cap
+
+    async def count(self, query: FindMany) -> ElementCount:
+        collection = query.document_model.get_pymongo_collection()
+        count = await collection.count_documents(query.get_filter_query(), limit = self.cap + 1)
+
+        if count > self.cap:
+            return ElementCount(count = self.cap, exact = False)
+
+        return ElementCount(count = count, exact = True)
+
+class CachedCount(CountStrategy):
+    """
+    Caches counts of `strategy` per collection and normalized filter for `ttl_seconds`.
+    """
+    exact = False
+
+    def __init__(self, strategy: CountStrategy, ttl_seconds: float = 60, max_entries: int = 1024):
+        self.strategy = strategy
+        self._cache: TTLCache[tuple[str, str], ElementCount] = TTLCache(max_entries, ttl_seconds)
+
+    def _get_cache_key(self, query: FindMany):
+        normalized_filter = json_util.dumps(query.get_filter_query(), sort_keys = True)
+        return query.document_model.get_collection_name(), normalized_filter
+
+    async def count(self, query: FindMany) -> ElementCount:
+        key = self._get_cache_key(query)
+
+        element_count = self._cache.get(key)
+        if element_count is None:
+            element_count = await self.strategy.count(query)
+            self._cache.set(key, element_count)
+
+        return element_count
@@ -0,0 +1,249 @@
+import asyncio
+import csv
+import io
+import json
+import logging
+import os
+import pathlib
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, timedelta
+from typing import Any, Mapping
+
+import aiofiles
+
+from repositories.export_job import ExportJobRepository
+from repositories.factory import RepositoryFactory
+from repositories.schemas import OrderByField
+
+from models.base import TModel, TModelData
+from models.export_job import ExportJobRecord, ExportJobStatus
+
+from repositories.base import TRepo
+
+from services.base import BaseService
+from services.data_import import ImportService
+from services.exceptions import BadEnvironmentValueException, ExportJobNotFinishedException, ExportJobNotFoundException
+from services.schemas import ExportJob
+from services.workers import create_worker_pool, get_process_id, submit_job
+
+logger = logging.getLogger(__name__)
+
+def _to_csv_cell(value: Any) -> Any:
+    # the layout ImportService reads back: empty cells are None, lists are JSON arrays
+    if value is None:
+        return ""
+
+    if isinstance(value, list):
+        return json.dumps(value)
+
+    return value
+
+class ExportService(BaseService):
+    """
+    Writes filtered documents to a CSV file in the import temp folder, on a persistent worker pool (see `setup`).
+    Columns are the fields of the model data type, so exported files can be imported as they are.
+    Unfinished jobs hold a lease renewed by the submitting api process, jobs of a process that stopped fail once it runs out.
+    Export files and records are deleted RETENTION_SECONDS after the job finished.
+    """
+    _JOB_WATCH_TASKS: set[asyncio.Task] = set()
+    _RUNNING_JOB_IDS: set[str] = set()
+    _MAINTENANCE_TASK: asyncio.Task = None
+
+    ENV_EXPORT_WORKERS_KEY = "EXPORT_WORKERS"
+    EXPORT_WORKERS: int = None
+    _WORKER_POOL: ProcessPoolExecutor = None
+
+    PROGRESS_UPDATE_SECONDS = 2 # rows_written is written at most this often
+
+    MAINTENANCE_SECONDS = 10 # lease renewal, expiry and file cleanup
+    LEASE_SECONDS = 60
+    RETENTION_SECONDS = 24*60*60
+    TEARDOWN_WAIT_SECONDS = 1
+    _EXPORT_FILE_PATTERN = "export_*.csv"
+
+    @classmethod
+    def get_worker_count(cls) -> int:
+        if cls.EXPORT_WORKERS is None:
+            val = os.getenv(cls.ENV_EXPORT_WORKERS_KEY, "1")
+            try:
+                cls.EXPORT_WORKERS = max(1, int(val))
+            except ValueError:
+                raise BadEnvironmentValueException(f"Environment variable {cls.ENV_EXPORT_WORKERS_KEY} must be int-convertible")
+
+        return cls.EXPORT_WORKERS
+
+    @classmethod
+    async def setup(cls):
+        cls._WORKER_POOL = create_worker_pool(cls.get_worker_count())
+        cls._MAINTENANCE_TASK = asyncio.create_task(cls._maintain_periodically())
+
+    @classmethod
+    async def teardown(cls):
+        if cls._MAINTENANCE_TASK is not None:
+            cls._MAINTENANCE_TASK.cancel()
+            cls._MAINTENANCE_TASK = None
+
+        if cls._WORKER_POOL is not None:
+            cls._WORKER_POOL.shutdown(wait = False, cancel_futures = True)
+            cls._WORKER_POOL = None
+
+        # lets the watchers of the cancelled (not yet started) jobs fail them, jobs still running time out and their lease runs out
+        if cls._JOB_WATCH_TASKS:
+            await asyncio.wait(cls._JOB_WATCH_TASKS, timeout = cls.TEARDOWN_WAIT_SECONDS)
+
+    @classmethod
+    def _get_lease_expiry(cls) -> datetime:
+        return datetime.now() + timedelta(seconds = cls.LEASE_SECONDS)
+
+    @classmethod
+    async def _maintain_periodically(cls):
+        while True:
+            try:
+                await cls()._maintain()
+            except Exception:
+                logger.exception("Could not maintain export jobs")
+
+            await asyncio.sleep(cls.MAINTENANCE_SECONDS)
+
+    async def _maintain(self):
+        record_repo = await RepositoryFactory.get_repository(ExportJobRepository)
+        await record_repo.renew_leases(list(self._RUNNING_JOB_IDS), get_process_id(), self._get_lease_expiry())
+
+        failed_count = await record_repo.fail_expired_leases("Interrupted, the api process running the job stopped renewing its lease")
+        if failed_count:
+            logger.warning("Failed %d export jobs with an expired lease", failed_count)
+
+        # files by age, every host cleans its own export folder, also of jobs whose record is gone
+        cutoff = time.time() - self.RETENTION_SECONDS
+        for file_path in self._get_export_path().glob(self._EXPORT_FILE_PATTERN):
+            if file_path.stat().st_mtime < cutoff:
+                file_path.unlink(missing_ok = True)
+
+        await record_repo.delete_finished_before(datetime.now() - timedelta(seconds = self.RETENTION_SECONDS))
+
+    def _get_export_path(self) -> pathlib.Path:
+        return ImportService()._get_import_temp_path()
+
+    def _create_export_job_id(self):
+        return uuid.uuid4().hex
+
+    async def _write_csv(self, job: ExportJob, record_repo: ExportJobRepository):
+        repo = await RepositoryFactory.get_repository(job.repo_type)
+        query = repo.find(job.filter_query, order_by = job.order_by)
+
+        columns = list(job.model_data_type.model_fields)
+        buffer = io.StringIO()
+        writer = csv.writer(buffer, lineterminator = "\n")
+
+        rows_written = 0
+        next_update_at = time.monotonic() + self.PROGRESS_UPDATE_SECONDS
+
+        async with aiofiles.open(job.file_path, "w", newline = "") as f:
+            writer.writerow(columns)
+            async for batch in repo.iter_batches(query, job.batch_size):
+                for item in batch:
+                    item_data = item.model_dump(mode = "json", include = set(columns))
+                    writer.writerow([_to_csv_cell(item_data.get(column)) for column in columns])
+
+                await f.write(buffer.getvalue())
+                buffer.seek(0)
+                buffer.truncate()
+
+                rows_written += len(batch)
+                if time.monotonic() >= next_update_at:
+                    await record_repo.set_fields(job.id, rows_written = rows_written)
+                    next_update_at = time.monotonic() + self.PROGRESS_UPDATE_SECONDS
+
+        return rows_written
+
+    async def _run_export_job(self, job: ExportJob):
+        # runs in a worker process
+        record_repo = await RepositoryFactory.get_repository(ExportJobRepository)
+        await record_repo.set_fields(job.id, status = ExportJobStatus.RUNNING)
+
+        try:
+            rows_written = await self._write_csv(job, record_repo)
+        except Exception as ex:
+            await record_repo.set_fields(job.id, status = ExportJobStatus.FAILED, error = str(ex), date_finished = datetime.now())
+        else:
+            await record_repo.set_fields(job.id, status = ExportJobStatus.FINISHED, rows_written = rows_written, date_finished = datetime.now())
+
+    async def _watch_job(self, job: ExportJob, pool: ProcessPoolExecutor, future: asyncio.Future):
+        await asyncio.wait([future])
+        try:
+            if future.cancelled(): # the pool was shut down before the job ran
+                error = "Export job was cancelled, the worker pool was shut down"
+            elif future.exception() is not None: # the worker died before it could record the failure
+                error = f"Export worker failed: {future.exception()!r}"
+            else:
+                return
+
+            record_repo = await RepositoryFactory.get_repository(ExportJobRepository)
+            await record_repo.fail_if_unfinished(job.id, error)
+
+            # every job of a broken pool fails, only the first of their watchers replaces it
+            cls = type(self)
+            if not future.cancelled() and isinstance(future.exception(), BrokenProcessPool) and cls._WORKER_POOL is pool:
+                pool.shutdown(wait = False)
+                cls._WORKER_POOL = create_worker_pool(cls.get_worker_count())
+        finally:
+            self._RUNNING_JOB_IDS.discard(job.id)
+
+    async def export_csv(self, *filter_mappings: Mapping[Any, Any], order_by: list[OrderByField],
+                         model_type: TModel, model_data_type: TModelData, repo_type: TRepo) -> ExportJobRecord:
+        export_job_id = self._create_export_job_id()
+
+        repo = await RepositoryFactory.get_repository(repo_type)
+        query = repo.find(*filter_mappings, order_by = order_by) # fails early on unknown order fields
+
+        job = ExportJob(
+            id = export_job_id,
+            file_path = self._get_export_path().joinpath(f"export_{export_job_id}.csv"),
+            filter_query = query.get_filter_query(),
+            order_by = order_by,
+
+            repo_type = repo_type,
+            model_type = model_type,
+            model_data_type = model_data_type,
+        )
+
+        record_repo = await RepositoryFactory.get_repository(ExportJobRepository)
+        record = await record_repo.create(ExportJobRecord(
+            job_id = job.id,
+            file_name = job.file_path.name,
+            claimed_by = get_process_id(),
+            lease_expires_at = self._get_lease_expiry(),
+            date_created = datetime.now(),
+        ))
+
+        pool = self._WORKER_POOL
+        future = submit_job(pool, self._run_export_job, job)
+        self._RUNNING_JOB_IDS.add(job.id)
+
+        watch_task = asyncio.create_task(self._watch_job(job, pool, future))
+        self._JOB_WATCH_TASKS.add(watch_task)
+        watch_task.add_done_callback(self._JOB_WATCH_TASKS.discard)
+
+        return record
+
+    async def get_job(self, job_id: str) -> ExportJobRecord:
+        record_repo = await RepositoryFactory.get_repository(ExportJobRepository)
+        record = await record_repo.fetch_by_job_id(job_id)
+        if record is None:
+            raise ExportJobNotFoundException(job_id)
+
+        return record
+
+    async def get_export_file_path(self, job_id: str) -> pathlib.Path:
+        record = await self.get_job(job_id)
+        if record.status != ExportJobStatus.FINISHED:
+            raise ExportJobNotFinishedException(job_id, record.status)
+
+        file_path = self._get_export_path().joinpath(record.file_name)
+        if not file_path.exists(): # deleted after RETENTION_SECONDS, its record is about to be
+            raise ExportJobNotFoundException(job_id)
+
+        return file_path
@@ -1,45 +1,163 @@
 import asyncio
+import csv
+import itertools
 from typing import Any, AsyncGenerator, Awaitable, Callable, Generic, get_args, get_origin
 
+import importlib
+import logging
 import os
 import pathlib
+import time
 
-from beanie import Document
+from beanie import Document, PydanticObjectId
 from fastapi import UploadFile
 import aiofiles
 
-import aiocsv
-
 import uuid
 
-from multiprocessing import Process
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, timedelta
 
 from pydantic import ValidationError
 
 from repositories.factory import RepositoryFactory
+from repositories.import_job import ImportJobRepository
 from services.base import BaseService
-from services.exceptions import BadEnvironmentValueException, FileTypeNotProvidedException, UnknownFileContentTypeException, UnknownFileExtensionException
+from services.exceptions import (BadEnvironmentValueException, FileTypeNotProvidedException, ImportJobCancelledException, ImportJobNoRejectedRowsException,
+                                 ImportJobNotCancellableException, ImportJobNotFinishedException, ImportJobNotFoundException,
+                                 UnknownFileContentTypeException, UnknownFileExtensionException)
+from services.import_rejects import RejectedRowSink
+from services.workers import create_worker_pool, get_process_id, submit_job
 from services.schemas import ImportJob
 
+from models.import_job import ImportJobRecord, ImportJobStatus, ImportPriority
+
 from models.base import TModel, TModelData
 
 from repositories.base import TRepo
 
 # TODO: Write tests
 
-async def _read_csv(file_path: pathlib.Path, delimiter: str = ",", line_terminator: str = "/n"):
-    async with aiofiles.open(file_path, "r") as f:
-        reader = aiocsv.AsyncReader(f, delimiter=delimiter, lineterminator=line_terminator)
-        headers = await anext(reader)
-        async for row in reader:
-            yield {k:v for k,v in zip(headers, row)}
+logger = logging.getLogger(__name__)
+
+class ImportProgress:
+    """
+    Counters of a running import job, bumped by the job and the file reader as plain ints.
+    Written to the job record at most every `update_interval_seconds`, see `ImportService._create_and_run_import_job`.
+    """
+    __slots__ = ("rows_read", "rows_validated", "rows_inserted", "rows_rejected", "bytes_processed",
+                 "cancel_requested", "_started_at", "_update_interval_seconds", "_next_update_at")
+
+    def __init__(self, update_interval_seconds: float):
+        self.rows_read = 0
+        self.rows_validated = 0
+        self.rows_inserted = 0
+        self.rows_rejected = 0
+        self.bytes_processed = 0
+
+        self.cancel_requested = False
+
+        self._started_at = time.monotonic()
+        self._update_interval_seconds = update_interval_seconds
+        self._next_update_at = self._started_at + update_interval_seconds
+
+    def is_update_due(self) -> bool:
+        return time.monotonic() >= self._next_update_at
+
+    def to_update(self) -> dict[str, Any]:
+        now = time.monotonic()
+        self._next_update_at = now + self._update_interval_seconds
+
+        elapsed = now - self._started_at
+        return {
+            "rows_read": self.rows_read,
+            "rows_validated": self.rows_validated,
+            "rows_inserted": self.rows_inserted,
+            "rows_rejected": self.rows_rejected,
+            "bytes_processed": self.bytes_processed,
+            "rows_per_second": self.rows_read / elapsed if elapsed > 0 else 0.0,
+        }
+
+# Csv reader, yields (headers, rows) blocks of up to `block_rows` rows
+CSV_BLOCK_ROWS = 10_000
+
+def _normalize_rows(rows: list[list[str]], width: int) -> list[list[str]]:
+    if set(map(len, rows)) != {width}:
+        # slow path, only for blocks with malformed rows: blank lines are dropped,
+        # short rows are padded with empty values, extra values are cut off
+        rows = [(row + [""] * (width - len(row)))[:width] for row in rows if row]
+
+    return rows
+
+class _CsvBlockReader:
+    """
+    Parses a csv file with the C csv module, a block of rows per call.
+    Runs in a worker thread, one call at a time.
+    """
+    def __init__(self, file_path: pathlib.Path, delimiter: str, block_rows: int):
+        self._f = open(file_path, "r", newline = "")
+        self._reader = csv.reader(self._f, delimiter = delimiter)
+        self._block_rows = block_rows
+
+    def read_headers(self) -> list[str] | None:
+        return next(self._reader, None)
+
+    def read_rows(self, width: int) -> tuple[list[list[str]] | None, int]:
+        """
+        Returns the rows of the next block (None once the file is read) and the bytes read so far.
+        """
+        rows = list(itertools.islice(self._reader, self._block_rows))
+
+        return _normalize_rows(rows, width) if rows else None, self._f.buffer.tell()
+
+    def close(self):
+        self._f.close()
+
+async def _read_csv(file_path: pathlib.Path, progress: ImportProgress = None, delimiter: str = ",", block_rows: int = CSV_BLOCK_ROWS):
+    reader = _CsvBlockReader(file_path, delimiter, block_rows)
+    next_block: asyncio.Future = None
+    try:
+        headers = await asyncio.to_thread(reader.read_headers)
+        if headers is None:
+            return
+
+        next_block = asyncio.ensure_future(asyncio.to_thread(reader.read_rows, len(headers)))
+        while True:
+            rows, bytes_read = await next_block
+            if rows is None:
+                return
+
+            # the thread parses the next block while this one is validated and inserted
+            next_block = asyncio.ensure_future(asyncio.to_thread(reader.read_rows, len(headers)))
+            if progress is not None:
+                progress.bytes_processed = bytes_read
+
+            yield headers, rows
+    finally:
+        if next_block is not None and not next_block.done():
+            next_block.add_done_callback(lambda _: reader.close()) # the thread still reads from the file
+        else:
+            reader.close()
+
+def _get_type_path(type_: type) -> str:
+    return f"{type_.__module__}:{type_.__qualname__}"
+
+def _resolve_type_path(type_path: str) -> type:
+    module_name, qualname = type_path.split(":")
+    obj = importlib.import_module(module_name)
+    for name in qualname.split("."):
+        obj = getattr(obj, name)
+
+    return obj
 
 
 class ImportService(BaseService, Generic[TRepo, TModel, TModelData]):
-    _EXTENSION_READ_METHODS: dict[str, Callable[[pathlib.Path], AsyncGenerator[dict[str, Any]]]] = {
+    # readers yield (headers, rows) blocks
+    _EXTENSION_READ_METHODS: dict[str, Callable[[pathlib.Path, ImportProgress | None], AsyncGenerator[tuple[list[str], list[list[str]]]]]] = {
         ".csv": _read_csv,
     }
-    _CONTENT_TYPE_READ_METHODS: dict[str, Callable[[pathlib.Path], AsyncGenerator[dict[str, Any]]]] = {
+    _CONTENT_TYPE_READ_METHODS: dict[str, Callable[[pathlib.Path, ImportProgress | None], AsyncGenerator[tuple[list[str], list[list[str]]]]]] = {
         "text/csv": _read_csv,
     }
     _CONTENT_TYPE_EXTENSION_MAP: dict[str, str] = {
@@ -51,6 +169,168 @@ class ImportService(BaseService, Generic[TRepo, TModel, TModelData]):
 
     _IMPORT_TEMP_SAVE_CHUNK_SIZE = 1024*1024 # 1 mb
 
+    _EMPTY_STR_TO_NONE = {"": None}
+
+    # called in the api process once a job process exits, e.g. to drop caches of the imported model
+    _IMPORT_FINISHED_CALLBACKS: list[Callable[[ImportJob], Any]] = []
+    _JOB_WATCH_TASKS: set[asyncio.Task] = set()
+
+    # worker pool, started by `setup`, each worker process initializes its db client once
+    ENV_IMPORT_WORKERS_KEY = "IMPORT_WORKERS"
+    ENV_IMPORT_MAX_JOBS_PER_USER_KEY = "IMPORT_MAX_JOBS_PER_USER"
+    IMPORT_WORKERS: int = None
+    IMPORT_MAX_JOBS_PER_USER: int = None
+
+    DISPATCH_POLL_SECONDS = 5 # also picks up jobs queued by other api processes
+    LEASE_SECONDS = 60 # renewed every dispatch poll, running jobs of an api process that stopped fail once it runs out
+    TEARDOWN_REQUEUE_SECONDS = 1
+
+    # a running job writes its progress (and reads its cancel flag) at most this often, checked once per read block
+    PROGRESS_UPDATE_SECONDS = 2
+
+    REJECTED_FILE_SUFFIX = ".rejected.jsonl"
+    REJECTED_MAX_ERROR_TYPES = 100
+    REJECTED_TOP_ERROR_TYPES = 10
+
+    _WORKER_POOL: ProcessPoolExecutor = None
+    _DISPATCHER_TASK: asyncio.Task = None
+    _DISPATCH_EVENT: asyncio.Event = None
+    _RUNNING_JOB_IDS: set[str] = set()
+
+    @classmethod
+    def add_import_finished_callback(cls, callback: Callable[[ImportJob], Any]):
+        cls._IMPORT_FINISHED_CALLBACKS.append(callback)
+
+    @classmethod
+    def _get_int_from_env(cls, env_key: str, default: int) -> int:
+        val = os.getenv(env_key)
+        if val is None:
+            return default
+
+        try:
+            return int(val)
+        except ValueError:
+            raise BadEnvironmentValueException(f"Environment variable {env_key} must be int-convertible")
+
+    @classmethod
+    def get_worker_count(cls) -> int:
+        if cls.IMPORT_WORKERS is None:
+            cls.IMPORT_WORKERS = max(1, cls._get_int_from_env(cls.ENV_IMPORT_WORKERS_KEY, 2))
+
+        return cls.IMPORT_WORKERS
+
+    @classmethod
+    def get_max_jobs_per_user(cls) -> int:
+        if cls.IMPORT_MAX_JOBS_PER_USER is None:
+            cls.IMPORT_MAX_JOBS_PER_USER = max(1, cls._get_int_from_env(cls.ENV_IMPORT_MAX_JOBS_PER_USER_KEY, 1))
+
+        return cls.IMPORT_MAX_JOBS_PER_USER
+
+    @classmethod
+    async def setup(cls):
+        cls._WORKER_POOL = create_worker_pool(cls.get_worker_count())
+        cls._DISPATCH_EVENT = asyncio.Event()
+        cls._DISPATCHER_TASK = asyncio.create_task(cls._dispatch_periodically())
+
+    @classmethod
+    async def teardown(cls):
+        if cls._DISPATCHER_TASK is not None:
+            cls._DISPATCHER_TASK.cancel()
+            cls._DISPATCHER_TASK = None
+
+        if cls._WORKER_POOL is not None:
+            cls._WORKER_POOL.shutdown(wait = False, cancel_futures = True)
+            cls._WORKER_POOL = None
+
+        # lets the watchers of the cancelled (not yet started) jobs requeue them, jobs still running time out and their lease runs out
+        if cls._JOB_WATCH_TASKS:
+            await asyncio.wait(cls._JOB_WATCH_TASKS, timeout = cls.TEARDOWN_REQUEUE_SECONDS)
+
+    @classmethod
+    def _get_lease_expiry(cls) -> datetime:
+        return datetime.now() + timedelta(seconds = cls.LEASE_SECONDS)
+
+    @classmethod
+    async def _maintain_leases(cls):
+        repo = await RepositoryFactory.get_repository(ImportJobRepository)
+        await repo.renew_leases(list(cls._RUNNING_JOB_IDS), get_process_id(), cls._get_lease_expiry())
+
+        # jobs of api processes that stopped (or lost the database) on any host, rows might be partially imported so they are not requeued
+        failed_count = await repo.fail_expired_leases("Interrupted, the api process running the job stopped renewing its lease")
+        if failed_count:
+            logger.warning("Failed %d import jobs with an expired lease", failed_count)
+
+    @classmethod
+    def _wake_dispatcher(cls):
+        if cls._DISPATCH_EVENT is not None:
+            cls._DISPATCH_EVENT.set()
+
+    @classmethod
+    async def _dispatch_periodically(cls):
+        while True:
+            cls._DISPATCH_EVENT.clear()
+            try:
+                await cls._maintain_leases()
+            except Exception:
+                logger.exception("Could not renew the import job leases")
+
+            try:
+                await cls._dispatch_queued_jobs()
+            except Exception:
+                logger.exception("Could not dispatch queued import jobs")
+
+            try:
+                await asyncio.wait_for(cls._DISPATCH_EVENT.wait(), cls.DISPATCH_POLL_SECONDS)
+            except TimeoutError:
+                pass
+
+    @classmethod
+    async def _dispatch_queued_jobs(cls):
+        repo = await RepositoryFactory.get_repository(ImportJobRepository)
+
+        while len(cls._RUNNING_JOB_IDS) < cls.get_worker_count():
+            running_by_user = await repo.count_running_by_user()
+            excluded_user_ids = [user_id for user_id, count in running_by_user.items() if count >= cls.get_max_jobs_per_user()]
+
+            record = await repo.claim_next(excluded_user_ids, get_process_id(), cls._get_lease_expiry())
+            if record is None:
+                return
+
+            try:
+                job = cls()._create_job_from_record(record)
+            except Exception as ex: # e.g. the import file is gone
+                await repo.finish(record.job_id, ImportJobStatus.FAILED, str(ex))
+                continue
+
+            pool = cls._WORKER_POOL
+            future = submit_job(pool, cls()._run_import_job, job)
+            cls._RUNNING_JOB_IDS.add(job.id)
+
+            watch_task = asyncio.create_task(cls._watch_job(job, pool, future))
+            cls._JOB_WATCH_TASKS.add(watch_task)
+            watch_task.add_done_callback(cls._JOB_WATCH_TASKS.discard)
+
+    @classmethod
+    async def _watch_job(cls, job: ImportJob, pool: ProcessPoolExecutor, future: asyncio.Future):
+        await asyncio.wait([future])
+        try:
+            repo = await RepositoryFactory.get_repository(ImportJobRepository)
+            if future.cancelled(): # the pool was shut down before the job started, nothing was imported
+                await repo.requeue(job.id, get_process_id())
+            elif future.exception() is not None: # the worker died before it could record the failure
+                await repo.finish(job.id, ImportJobStatus.FAILED, f"Import worker failed: {future.exception()!r}")
+
+                # every job of a broken pool fails, only the first of their watchers replaces it
+                if isinstance(future.exception(), BrokenProcessPool) and cls._WORKER_POOL is pool:
+                    pool.shutdown(wait = False)
+                    cls._WORKER_POOL = create_worker_pool(cls.get_worker_count())
+        finally:
+            cls._RUNNING_JOB_IDS.discard(job.id)
+            cls._wake_dispatcher()
+
+        for callback in cls._IMPORT_FINISHED_CALLBACKS:
+            callback(job)
+
     def _read_import_temp_path_from_env(self, create_if_not_exists: bool = True):
         import_temp_path = os.getenv(self.ENV_IMPORT_TEMP_FOLDER_PATH_KEY)
         if import_temp_path is None:
@@ -74,7 +354,8 @@ class ImportService(BaseService, Generic[TRepo, TModel, TModelData]):
     def _create_import_job_id(self):
         return uuid.uuid4().hex
 
-    async def _read_file(self, file_path: pathlib.Path, content_type: str = None, file_extension: str = None, empty_str_is_none: bool = True, **kwargs):
+    async def _read_file(self, file_path: pathlib.Path, content_type: str = None, file_extension: str = None, empty_str_is_none: bool = True,
+                         progress: ImportProgress = None, **kwargs):
         if not content_type:
             if not file_extension:
                 raise FileTypeNotProvidedException()
@@ -89,49 +370,108 @@ class ImportService(BaseService, Generic[TRepo, TModel, TModelData]):
 
             reader_method = self._CONTENT_TYPE_READ_METHODS[content_type]
 
-        async for row_data in reader_method(file_path, **kwargs):
+        async for headers, rows in reader_method(file_path, progress, **kwargs):
             if empty_str_is_none:
-                for k,v in row_data.items():
-                    if v == "":
-                        row_data[k] = None
-            yield row_data
+                # `get(v, v)` maps "" to None and keeps anything else, without a python level branch per value
+                empty_str_to_none = self._EMPTY_STR_TO_NONE.get
+                yield [dict(zip(headers, map(empty_str_to_none, row, row))) for row in rows]
+            else:
+                yield [dict(zip(headers, row)) for row in rows]
 
-    async def _create_and_run_import_job(self, job: ImportJob):
+    async def _create_and_run_import_job(self, job: ImportJob, progress: ImportProgress, rejected_rows: RejectedRowSink):
         repo = await RepositoryFactory.get_repository(job.repo_type)
+        job_repo = await RepositoryFactory.get_repository(ImportJobRepository)
 
         import_data = []
         last_import_coroutine: Awaitable = None
+        last_import_size = 0
 
         current_batch_size = 0
-        async for item in self._read_file(job.file_path,
-                                          job.file_content_type,
-                                          job.file_extension):
-            try:
-                validated_item = job.model_data_type.model_validate(item)
-            except ValidationError as ex:
-                continue # TODO: Return validation errors
-
-            import_data.append(validated_item)
-            current_batch_size += 1
-            if current_batch_size >= job.batch_size:
-                if last_import_coroutine is not None:
-                    await last_import_coroutine
-
-                last_import_coroutine = repo.create_many(import_data)
-
-                current_batch_size = 0
-                import_data = []
+        async for items in self._read_file(job.file_path,
+                                           job.file_content_type,
+                                           job.file_extension,
+                                           progress = progress,
+                                           **job.reader_kwargs):
+            first_row = progress.rows_read + 1 # data rows, the header is not counted
+            progress.rows_read += len(items)
+
+            for index, item in enumerate(items):
+                try:
+                    validated_item = job.model_data_type.model_validate(item)
+                except ValidationError as ex:
+                    progress.rows_rejected += 1
+                    rejected_rows.add(first_row + index, item, ex)
+                    continue
+
+                import_data.append(validated_item)
+                current_batch_size += 1
+                if current_batch_size >= job.batch_size:
+                    if last_import_coroutine is not None:
+                        await last_import_coroutine
+                        progress.rows_inserted += last_import_size
+
+                    if progress.cancel_requested:
+                        raise ImportJobCancelledException(job.id)
+
+                    last_import_coroutine = repo.create_many(import_data)
+                    last_import_size = len(import_data)
+
+                    current_batch_size = 0
+                    import_data = []
+
+            progress.rows_validated = progress.rows_read - progress.rows_rejected
+            if progress.is_update_due():
+                progress.cancel_requested = await job_repo.update_progress(job.id, progress.to_update() | rejected_rows.to_update())
 
         # Import last batch
-        await last_import_coroutine
-        await repo.create_many(import_data)
-
-    def _start_job_process(self, job):
-        asyncio.run(self._create_and_run_import_job(job))
+        if last_import_coroutine is not None:
+            await last_import_coroutine
+            progress.rows_inserted += last_import_size
+
+        if import_data:
+            await repo.create_many(import_data)
+            progress.rows_inserted += len(import_data)
+
+    async def _run_import_job(self, job: ImportJob):
+        # runs in a worker process, the job is already claimed (status running)
+        job_repo = await RepositoryFactory.get_repository(ImportJobRepository)
+        progress = ImportProgress(self.PROGRESS_UPDATE_SECONDS)
+        rejected_rows = RejectedRowSink(job.file_path.with_name(f"{job.id}{self.REJECTED_FILE_SUFFIX}"),
+                                        max_error_types = self.REJECTED_MAX_ERROR_TYPES,
+                                        top_error_types = self.REJECTED_TOP_ERROR_TYPES)
+
+        status, error = ImportJobStatus.FINISHED, None
+        try:
+            await self._create_and_run_import_job(job, progress, rejected_rows)
+        except ImportJobCancelledException:
+            status = ImportJobStatus.CANCELLED
+        except Exception as ex:
+            status, error = ImportJobStatus.FAILED, str(ex)
+        finally:
+            rejected_rows.close()
+
+        await job_repo.finish(job.id, status, error, progress = progress.to_update() | rejected_rows.to_update())
+
+    def _create_job_from_record(self, record: ImportJobRecord) -> ImportJob:
+        return ImportJob(
+            id = record.job_id,
+            file_path = self._get_import_temp_path().joinpath(record.file_name),
+            file_content_type = record.file_content_type,
+            file_extension = record.file_extension,
+            reader_kwargs = record.reader_kwargs,
+
+            repo_type = _resolve_type_path(record.repo_type),
+            model_type = _resolve_type_path(record.model_type),
+            model_data_type = _resolve_type_path(record.model_data_type),
+        )
 
     async def import_file(self, file: UploadFile,
                           model_type: TModel, model_data_type: TModelData, repo_type: TRepo,
-                          **kwargs):
+                          user_id: PydanticObjectId | None = None, priority: ImportPriority = ImportPriority.NORMAL,
+                          **kwargs) -> ImportJobRecord:
+        """
+        Saves the file and queues an import job, the worker pool picks it up (see `setup`).
+        """
         # TODO: Accept zipped file, extract extension and content type from file after opening zip
         import_job_id = self._create_import_job_id()
 
@@ -150,22 +490,70 @@ class ImportService(BaseService, Generic[TRepo, TModel, TModelData]):
         import_temp_path = self._get_import_temp_path()
         import_file_path = import_temp_path.joinpath(f"{import_job_id}{file_extension}")
 
+        bytes_total = 0
         async with aiofiles.open(import_file_path, "wb") as f:
             while chunk := await file.read(self._IMPORT_TEMP_SAVE_CHUNK_SIZE):
                 await f.write(chunk)
+                bytes_total += len(chunk)
+
+        job_repo = await RepositoryFactory.get_repository(ImportJobRepository)
+        record = await job_repo.create(ImportJobRecord(
+            job_id = import_job_id,
+            user_id = user_id,
+            priority = priority,
 
-        job = ImportJob(
-            id = import_job_id,
-            file_path = import_file_path,
+            file_name = import_file_path.name,
             file_content_type = content_type,
             file_extension = file_extension,
             reader_kwargs = kwargs,
-
-            repo_type = repo_type,
-            model_type = model_type,
-            model_data_type = model_data_type,
-        )
-        job_process = Process(target = self._start_job_process, args=(job,)) # copies self(service obj) into process
-        job_process.start()
-
-        return job
\ No newline at end of file
+            bytes_total = bytes_total,
+
+            repo_type = _get_type_path(repo_type),
+            model_type = _get_type_path(model_type),
+            model_data_type = _get_type_path(model_data_type),
+
+            date_created = datetime.now(),
+        ))
+        self._wake_dispatcher()
+
+        return record
+
+    async def get_job(self, job_id: str, user_id: PydanticObjectId) -> ImportJobRecord:
+        """
+        Jobs of other users (and anonymous ones) are not found, their ids are not confirmed to exist.
+        """
+        job_repo = await RepositoryFactory.get_repository(ImportJobRepository)
+        record = await job_repo.fetch_by_job_id(job_id)
+        if record is None or record.user_id != user_id:
+            raise ImportJobNotFoundException(job_id)
+
+        return record
+
+    async def get_rejected_file_path(self, job_id: str, user_id: PydanticObjectId) -> pathlib.Path:
+        """
+        Json lines file of the rows the job rejected, one `{"row", "errors", "data"}` object per row.
+        """
+        record = await self.get_job(job_id, user_id)
+        if record.status in (ImportJobStatus.QUEUED, ImportJobStatus.RUNNING):
+            raise ImportJobNotFinishedException(job_id, record.status)
+
+        if record.rejected_file_name is None:
+            raise ImportJobNoRejectedRowsException(job_id)
+
+        return self._get_import_temp_path().joinpath(record.rejected_file_name)
+
+    async def cancel_job(self, job_id: str, user_id: PydanticObjectId) -> ImportJobRecord:
+        """
+        Queued jobs are cancelled right away, running ones see the request with their next progress update
+        and stop before their next batch is inserted.
+        """
+        record = await self.get_job(job_id, user_id)
+        job_repo = await RepositoryFactory.get_repository(ImportJobRepository)
+
+        if await job_repo.cancel_if_queued(job_id):
+            self._get_import_temp_path().joinpath(record.file_name).unlink(missing_ok = True)
+        elif not await job_repo.request_cancel(job_id):
+            record = await self.get_job(job_id, user_id)
+            raise ImportJobNotCancellableException(job_id, record.status)
+
+        return await self.get_job(job_id, user_id)
@@ -1,16 +1,26 @@
+import asyncio
 import os
-from typing import Any, Generic, Mapping, get_args, get_origin
+from typing import Any, AsyncGenerator, Generic, Mapping, get_args, get_origin
 
 from beanie import Document, PydanticObjectId
+from beanie.odm.queries.find import FindMany
+from bson import json_util
+from pydantic import BaseModel
+from pymongo.errors import OperationFailure
 
 from services.base import BaseService
+from services.count import CountStrategy, ExactCount
 from services.exceptions import BadEnvironmentValueException, DocumentNotFoundByIdException, MissingEnvironmentVariableException
+from services.schemas import ElementCount, PageExecution
+from services.serialization import ResponseSerializer
 
 from apps.schemas import PaginatedResponse
 
 from models.base import TModel, TModelData
 
 from repositories.base import BaseRepository, TRepo
+from repositories.cache import BytesLRUCache
+from repositories.exceptions import OrderFieldNotExistsException
 from repositories.factory import RepositoryFactory
 from repositories.schemas import OrderByField
 
@@ -18,7 +28,13 @@ class DocumentService(BaseService, Generic[TRepo, TModel, TModelData]):
     ENV_MAX_PER_PAGE_KEY = "MAX_PER_PAGE"
     MAX_PER_PAGE: int = None
 
+    ENV_PAGE_CACHE_MAX_MB_KEY = "PAGE_CACHE_MAX_MB"
+    _PAGE_CACHE: BytesLRUCache = None # shared by all services, 0 MB disables it
+
     default_order_by: list[OrderByField] = []
+    count_strategy: CountStrategy = ExactCount()
+    page_execution: PageExecution = PageExecution.GATHER # count_documents can use an index, opt into FACET per service after benchmarking
+
     def __init_subclass__(self):
         super().__init_subclass__()
 
@@ -40,12 +56,18 @@ class DocumentService(BaseService, Generic[TRepo, TModel, TModelData]):
         return self._repo
 
     async def get_by_id(self, _id: PydanticObjectId):
-        item = await self._repo.get_by_id(_id)
+        repo = await self._get_repo()
+        item = await repo.get_by_id_cached(_id)
         if item is None:
             raise DocumentNotFoundByIdException(self._model_type, _id)
 
         return item
 
+    async def get_many(self, ids: list[PydanticObjectId], projection_model: type[BaseModel] = None) -> tuple[list[TModel], list[PydanticObjectId]]:
+        repo = await self._get_repo()
+
+        return await repo.get_many(ids, projection_model = projection_model)
+
     @property
     def max_per_page(self):
         if self.MAX_PER_PAGE is None:
@@ -61,33 +83,156 @@ class DocumentService(BaseService, Generic[TRepo, TModel, TModelData]):
 
         return self.MAX_PER_PAGE
 
+    @classmethod
+    def get_page_cache(cls) -> BytesLRUCache:
+        if DocumentService._PAGE_CACHE is None:
+            val = os.getenv(cls.ENV_PAGE_CACHE_MAX_MB_KEY, "0")
+            try:
+                max_bytes = int(float(val) * 1024 * 1024)
+            except ValueError:
+                raise BadEnvironmentValueException(f"Environment variable {cls.ENV_PAGE_CACHE_MAX_MB_KEY} must be float-convertible")
+
+            DocumentService._PAGE_CACHE = BytesLRUCache(max_bytes)
+
+        return DocumentService._PAGE_CACHE
+
+    def _normalize_page(self, page: int, size: int) -> tuple[int, int]:
+        if page < 1:
+            page = 1
+
+        if size <= 0:
+            size = 1
+        elif size > self.max_per_page:
+            size = self.max_per_page
+
+        return page, size
+
+    def export_ndjson(self, *filter_mappings: tuple[Mapping[Any, Any]], batch_size: int = None) -> AsyncGenerator[bytes]:
+        """
+        Streams matching documents as newline delimited JSON, holding one batch in memory at a time.
+        """
+        async def iter_batches():
+            repo = await self._get_repo()
+            async for batch in repo.iter_batches(repo.find(*filter_mappings), batch_size):
+                yield batch
+
+        return ResponseSerializer.iter_ndjson(iter_batches())
+
     async def element_count(self, *filter_mappings: tuple[Mapping[Any, Any]]):
         repo = await self._get_repo()
 
         return await repo.find(*filter_mappings).count()
 
-    async def get_page(self, page: int, size: int, *filter_mappings: tuple[Mapping[Any, Any]], order_by: list[OrderByField] = None):
+    async def _fetch_page(self, repo: BaseRepository[TModel, TModelData], query: FindMany[TModel], count_query: FindMany[TModel],
+                          skip: int, size: int, count_strategy: CountStrategy, execution: PageExecution) -> tuple[list[TModel], ElementCount]:
+        if execution == PageExecution.FACET:
+            # facet total is always an exact count, only worth it if the strategy would count exactly anyway
+            if count_strategy.exact:
+                try:
+                    items, total = await repo.find_page_with_total(query, skip, size)
+                    return items, ElementCount(count = total, exact = True)
+                except OperationFailure: # e.g. facet result exceeds the 16MB document limit
+                    pass
+
+            execution = PageExecution.GATHER
+
+        items_query = query.skip(skip).limit(size)
+        if execution == PageExecution.GATHER:
+            element_count, items = await asyncio.gather(count_strategy.count(count_query), items_query.to_list())
+        else:
+            element_count = await count_strategy.count(count_query)
+            items = await items_query.to_list()
+
+        return items, element_count
+
+    async def get_page(self, page: int, size: int, *filter_mappings: tuple[Mapping[Any, Any]], order_by: list[OrderByField] = None, after: str = None,
+                       count_strategy: CountStrategy = None, execution: PageExecution = None, projection_model: type[BaseModel] = None):
+        """
+        Returns a page of documents. When `after` (a `next_cursor` from a previous page) is given,
+        the page starts right after that cursor instead of skipping `(page - 1) * size` documents,
+        so deep pages cost the same as the first one.
+        `count_strategy` and `execution` override the service's `count_strategy` and `page_execution` for this call.
+        Items are `projection_model` instances if given, `next_cursor` is only set if the projection includes the sort fields.
+        """
         repo = await self._get_repo()
 
         if not order_by:
             order_by = self.default_order_by.copy()
 
-        if page < 1:
-            page = 1
+        page, size = self._normalize_page(page, size)
 
-        if size <= 0:
-            size = 1
-        elif size > self.max_per_page:
-            size = self.max_per_page
+        if count_strategy is None:
+            count_strategy = self.count_strategy
+
+        if execution is None:
+            execution = self.page_execution
 
-        query = repo.find(*filter_mappings, order_by = order_by)
+        count_query = repo.find(*filter_mappings)
+        if after is None:
+            query = repo.find(*filter_mappings, order_by = order_by, projection_model = projection_model)
+            skip = (page - 1) * size
+        else:
+            query = repo.find(*filter_mappings, order_by = order_by, after = after, projection_model = projection_model)
+            skip = 0
 
-        element_count = await query.count()
-        items = await query.skip((page - 1) * size).limit(size).to_list()
+            if execution == PageExecution.FACET: # facet total would only count documents after the cursor
+                execution = PageExecution.GATHER
 
-        return PaginatedResponse(
+        items, element_count = await self._fetch_page(repo, query, count_query, skip, size, count_strategy, execution)
+
+        next_cursor = None
+        if len(items) == size:
+            try:
+                next_cursor = repo.get_cursor(items[-1], order_by)
+            except OrderFieldNotExistsException: # projected out
+                pass
+
+        # items are already validated by the database parse, nothing else here needs validation
+        item_type = projection_model if projection_model is not None else self._model_type
+        return PaginatedResponse[item_type].model_construct(
             page = page,
             size = size,
-            element_count = element_count,
-            items = items
-        )
\ No newline at end of file
+            element_count = element_count.count,
+            element_count_exact = element_count.exact,
+            items = items,
+            next_cursor = next_cursor,
+        )
+
+    async def get_page_json(self, page: int, size: int, *filter_mappings: tuple[Mapping[Any, Any]], order_by: list[OrderByField] = None, after: str = None,
+                            projection_model: type[BaseModel] = None) -> bytes:
+        """
+        `get_page` serialized straight to JSON bytes by a precompiled serializer, skipping FastAPI's `response_model` validation.
+        Served from the page cache while the collection's write generation is unchanged,
+        only for repositories that track it.
+        """
+        page_cache = self.get_page_cache()
+        repo = await self._get_repo()
+        if page_cache.max_bytes <= 0 or not repo.TRACK_GENERATION:
+            response = await self.get_page(page, size, *filter_mappings, order_by = order_by, after = after, projection_model = projection_model)
+            return ResponseSerializer.dump_json(response)
+
+        generation = await repo.get_generation() # read before the page, a write in between only makes the entry unreachable
+
+        page, size = self._normalize_page(page, size)
+        cache_key = (
+            type(self).__name__,
+            json_util.dumps(self._model_type.find(*filter_mappings).get_filter_query(), sort_keys = True),
+            tuple((order_by_field.field_name, order_by_field.ascending) for order_by_field in order_by or []),
+            page,
+            size,
+            after,
+            projection_model.__name__ if projection_model is not None else None,
+            generation,
+        )
+
+        content = page_cache.get(cache_key)
+        if content is None:
+            async def fetch():
+                response = await self.get_page(page, size, *filter_mappings, order_by = order_by, after = after, projection_model = projection_model)
+                return ResponseSerializer.dump_json(response)
+
+            # concurrent misses of the same page build it once
+            content = await repo.single_flight(("page_json", *cache_key), fetch)
+            page_cache.set(cache_key, content)
+
+        return content
@@ -49,6 +49,20 @@ class EmailExistsException(AuthServiceException):
         message = f"Email '{email}' is used by another user"
         super().__init__(message)
 
+class PasswordHashingSaturatedException(AuthServiceException):
+    def __init__(self, pending: int):
+        self.pending = pending
+
+        message = f"Password hashing is saturated, {pending} calls pending"
+        super().__init__(message)
+
+class LoginThrottledException(AuthServiceException):
+    def __init__(self, retry_after_seconds: int):
+        self.retry_after_seconds = retry_after_seconds
+
+        message = f"Too many login attempts, retry after {retry_after_seconds} seconds"
+        super().__init__(message)
+
 # ImportService
 class ImportServiceException(BaseServiceException):
     def __init__(self, *args):
@@ -76,6 +90,63 @@ class UnknownFileContentTypeException(ImportServiceException):
         message = f"Unknown content type '{content_type}', file name '{file_name}'"
         super().__init__(message)
 
+class ImportJobNotFoundException(ImportServiceException):
+    def __init__(self, job_id: str):
+        self.job_id = job_id
+
+        message = f"Could not find import job '{job_id}'"
+        super().__init__(message)
+
+class ImportJobNotCancellableException(ImportServiceException):
+    def __init__(self, job_id: str, status: str):
+        self.job_id = job_id
+        self.status = status
+
+        message = f"Import job '{job_id}' can not be cancelled, status: {status}"
+        super().__init__(message)
+
+class ImportJobCancelledException(ImportServiceException):
+    def __init__(self, job_id: str):
+        self.job_id = job_id
+
+        message = f"Import job '{job_id}' was cancelled"
+        super().__init__(message)
+
+class ImportJobNotFinishedException(ImportServiceException):
+    def __init__(self, job_id: str, status: str):
+        self.job_id = job_id
+        self.status = status
+
+        message = f"Import job '{job_id}' is not finished, status: {status}"
+        super().__init__(message)
+
+class ImportJobNoRejectedRowsException(ImportServiceException):
+    def __init__(self, job_id: str):
+        self.job_id = job_id
+
+        message = f"Import job '{job_id}' did not reject any rows"
+        super().__init__(message)
+
+# ExportService
+class ExportServiceException(BaseServiceException):
+    def __init__(self, *args):
+        super().__init__(*args)
+
+class ExportJobNotFoundException(ExportServiceException):
+    def __init__(self, job_id: str):
+        self.job_id = job_id
+
+        message = f"Could not find export job '{job_id}'"
+        super().__init__(message)
+
+class ExportJobNotFinishedException(ExportServiceException):
+    def __init__(self, job_id: str, status: str):
+        self.job_id = job_id
+        self.status = status
+
+        message = f"Export job '{job_id}' is not finished, status: {status}"
+        super().__init__(message)
+
 # DocumentService
 class DocumentServiceException(BaseServiceException):
     def __init__(self, *args):
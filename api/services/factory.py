@@ -2,8 +2,11 @@ from typing import Type, TypeVar
 
 from services.base import BaseService
 
+from services.data_export import ExportService
 from services.data_import import ImportService
 from services.job_listing import JobListingService
+from services.listing_facet import ListingFacetService
+from services.market_stats import MarketStatsService
 
 _SERVICE_TYPE = TypeVar("_SERVICE_TYPE", bound=BaseService)
 
@@ -18,4 +21,16 @@ class ServiceFactory:
 
     @classmethod
     def get_import_service(cls):
-        return cls.get_service(ImportService)
\ No newline at end of file
+        return cls.get_service(ImportService)
+
+    @classmethod
+    def get_listing_facet_service(cls):
+        return cls.get_service(ListingFacetService)
+
+    @classmethod
+    def get_market_stats_service(cls):
+        return cls.get_service(MarketStatsService)
+
+    @classmethod
+    def get_export_service(cls):
+        return cls.get_service(ExportService)
@@ -0,0 +1,68 @@
+import json
+import pathlib
+
+from collections import Counter
+from typing import Any, TextIO
+
+from pydantic import ValidationError
+
+class RejectedRowSink:
+    """
+    Streams the rows an import job rejects to a json lines file, one `{"row", "errors", "data"}` object per row,
+    `row` being the 1-based data row number (the header is not counted, unlike a file line it is not shifted by quoted line breaks).
+    Also counts their error types ("field: type"). The file is only created by the first rejected row.
+    At most `max_error_types` distinct error types are counted, further ones add up under OTHER_ERROR_TYPE.
+    Only called for rejected rows, valid rows never touch it.
+    """
+    OTHER_ERROR_TYPE = "other"
+    _BUFFER_SIZE = 256*1024
+
+    def __init__(self, file_path: pathlib.Path, max_error_types: int = 100, top_error_types: int = 10):
+        self.file_path = file_path
+        self.max_error_types = max_error_types
+        self.top_error_types = top_error_types
+
+        self._file: TextIO | None = None
+        self._error_type_counts: Counter[str] = Counter()
+
+        self.rows = 0
+
+    def _get_file(self) -> TextIO:
+        if self._file is None:
+            # plain buffered writes, they only reach the disk once the buffer is full
+            self._file = open(self.file_path, "w", encoding = "utf-8", buffering = self._BUFFER_SIZE)
+
+        return self._file
+
+    def _count_error_type(self, error_type: str):
+        if error_type not in self._error_type_counts and len(self._error_type_counts) >= self.max_error_types:
+            error_type = self.OTHER_ERROR_TYPE
+
+        self._error_type_counts[error_type] += 1
+
+    def add(self, row: int, data: dict[str, Any], ex: ValidationError):
+        errors = []
+        for error in ex.errors(include_url = False, include_context = False, include_input = False):
+            field = ".".join(str(part) for part in error["loc"])
+            errors.append(f"{field}: {error['msg']}" if field else error["msg"])
+
+            # list indices are dropped, "skills.3" and "skills.7" are the same error type
+            field_name = ".".join(part for part in error["loc"] if isinstance(part, str))
+            self._count_error_type(f"{field_name}: {error['type']}" if field_name else error["type"])
+
+        self._get_file().write(json.dumps({"row": row, "errors": errors, "data": data}, ensure_ascii = False) + "\n")
+        self.rows += 1
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def to_update(self) -> dict[str, Any]:
+        return {
+            "rejected_file_name": self.file_path.name if self.rows else None,
+            "rejected_error_types": [
+                {"error_type": error_type, "count": count}
+                for error_type, count in self._error_type_counts.most_common(self.top_error_types)
+            ],
+        }
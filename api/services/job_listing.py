@@ -1,18 +1,183 @@
-from typing import overload
+import asyncio
+import os
+from typing import Any, Mapping, overload
 from beanie import PydanticObjectId
+from beanie.odm.operators.find.array import All
+from beanie.odm.operators.find.comparison import In
+from beanie.odm.operators.find.evaluation import Text
+from beanie.odm.queries.find import FindMany
+from bson import json_util
+from pydantic import BaseModel
+
+from apps.job_listing.requests import ListingFilterRequest
+from apps.schemas import PaginatedResponse, ScoredItem
 from models.listing_shortlist import ShortlistedListing
 from models.user import User
 from repositories.schemas import OrderByField
 from repositories.job_listing import JobListingRepository
 
-from models.job_listing import JobListing, JobListingData
+from models.job_listing import JobListing, JobListingData, JobListingSummary
+
+from repositories.cache import TTLCache
+from repositories.schemas import DocumentId
 
+from services.count import CachedCount, CappedCount, EstimatedCount
+from services.data_import import ImportService
 from services.document import DocumentService
+from services.exceptions import BadEnvironmentValueException
+from services.schemas import ElementCount, ImportJob, SearchEngine
+from services.serialization import ResponseSerializer
 
 class JobListingService(DocumentService[JobListingRepository, JobListing, JobListingData]):
-    default_sort_column = [
+    default_order_by = [
         OrderByField(field_name="date_created", ascending=False)
     ]
+    count_strategy = EstimatedCount(CachedCount(CappedCount(10_000), ttl_seconds = 60))
+
+    # first pages of popular searches, keyed by the collection's write generation so writes of any process make them stale,
+    # and by the in-memory index version, it applies writes of other processes later than the generation shows them
+    SEARCH_CACHE_MAX_PAGE = 3
+    _SEARCH_CACHE: TTLCache[tuple[str, int, int | None], PaginatedResponse] = TTLCache(max_entries = 1024, ttl_seconds = 300)
+
+    ENV_SEARCH_ENGINE_KEY = "LISTING_SEARCH_ENGINE"
+    _SEARCH_ENGINE: SearchEngine = None
+
+    SEARCH_INDEX_REFRESH_SECONDS = 30
+    SEARCH_MAX_CANDIDATES = 1000 # in-memory search only ranks this many matches
+
+    @classmethod
+    def get_search_engine(cls) -> SearchEngine:
+        if cls._SEARCH_ENGINE is None:
+            val = os.getenv(cls.ENV_SEARCH_ENGINE_KEY, SearchEngine.TEXT_INDEX)
+            try:
+                cls._SEARCH_ENGINE = SearchEngine(val)
+            except ValueError:
+                raise BadEnvironmentValueException(f"Environment variable {cls.ENV_SEARCH_ENGINE_KEY} must be one of {[engine.value for engine in SearchEngine]}")
+
+        return cls._SEARCH_ENGINE
+
+    @classmethod
+    async def setup_search(cls):
+        if cls.get_search_engine() == SearchEngine.IN_MEMORY:
+            await JobListingRepository.search_index.start(cls.SEARCH_INDEX_REFRESH_SECONDS)
+
+    @classmethod
+    async def teardown_search(cls):
+        await JobListingRepository.search_index.stop()
+
+    @classmethod
+    def on_import_finished(cls, job: ImportJob):
+        if issubclass(job.model_type, JobListing):
+            # the import's change log entries, other api processes apply them with their next periodic refresh
+            if JobListingRepository.search_index.is_ready:
+                JobListingRepository.search_index.schedule_refresh()
+
+    def get_filter_mappings(self, filters: ListingFilterRequest) -> list[Mapping[Any, Any]]:
+        filter_mappings = []
+
+        if filters.currency is not None:
+            filter_mappings.append(JobListing.salary_currency == filters.currency)
+
+        if filters.min_salary is not None:
+            filter_mappings.append(JobListing.max_salary_monthly >= filters.min_salary)
+
+        if filters.max_salary is not None:
+            filter_mappings.append(JobListing.min_salary_monthly <= filters.max_salary)
+
+        if filters.workplace_type:
+            filter_mappings.append(In(JobListing.workplace_type, filters.workplace_type))
+
+        if filters.experience:
+            filter_mappings.append(In(JobListing.expected_experience, filters.experience))
+
+        if filters.skills_any:
+            filter_mappings.append(In(JobListing.expected_skills, filters.skills_any))
+
+        if filters.skills_all:
+            filter_mappings.append(All(JobListing.expected_skills, filters.skills_all))
+
+        if filters.company is not None:
+            filter_mappings.append(JobListing.company == filters.company)
+
+        if filters.location is not None:
+            filter_mappings.append(JobListing.location == filters.location)
+
+        if filters.posted_after is not None:
+            filter_mappings.append(JobListing.date_posted >= filters.posted_after)
+
+        if filters.posted_before is not None:
+            filter_mappings.append(JobListing.date_posted <= filters.posted_before)
+
+        return filter_mappings
+
+    async def search(self, text: str, page: int, size: int, *filter_mappings: Mapping[Any, Any],
+                     projection_model: type[BaseModel] = None) -> PaginatedResponse[ScoredItem]:
+        """
+        Full text search over title, skills, company and description, ordered by relevance.
+        """
+        text = " ".join(text.lower().split()) # search is case insensitive, so is the cache key
+        page, size = self._normalize_page(page, size)
+
+        repo = await self._get_repo()
+        count_query = repo.find(Text(text), *filter_mappings)
+
+        projection_name = projection_model.__name__ if projection_model is not None else None
+        query_key = json_util.dumps([count_query.get_filter_query(), page, size, projection_name], sort_keys = True)
+
+        cacheable = page <= self.SEARCH_CACHE_MAX_PAGE
+        if cacheable:
+            index_version = repo.search_index.version if self.get_search_engine() == SearchEngine.IN_MEMORY else None
+            cache_key = (query_key, await repo.get_generation(), index_version) # read before the search, see get_page_json
+            response = self._SEARCH_CACHE.get(cache_key)
+            if response is not None:
+                return response
+
+        response = await repo.single_flight(("search", query_key),
+            lambda: self._search(repo, text, page, size, count_query, *filter_mappings, projection_model = projection_model))
+
+        if cacheable:
+            self._SEARCH_CACHE.set(cache_key, response)
+
+        return response
+
+    async def _search(self, repo: JobListingRepository, text: str, page: int, size: int, count_query: FindMany[JobListing], *filter_mappings: Mapping[Any, Any],
+                      projection_model: type[BaseModel] = None) -> PaginatedResponse[ScoredItem]:
+        if self.get_search_engine() == SearchEngine.IN_MEMORY and repo.search_index.is_ready:
+            element_count, scored_items = await self._search_in_memory(repo, text, page, size, *filter_mappings, projection_model = projection_model)
+        else:
+            query = repo.find(Text(text), *filter_mappings, projection_model = projection_model)
+            element_count, scored_items = await asyncio.gather(
+                self.count_strategy.count(count_query),
+                repo.find_text_scored(query, (page - 1) * size, size),
+            )
+
+        return PaginatedResponse[ScoredItem](
+            page = page,
+            size = size,
+            element_count = element_count.count,
+            element_count_exact = element_count.exact,
+            items = [ScoredItem(score = score, item = item) for item, score in scored_items],
+        )
+
+    async def _search_in_memory(self, repo: JobListingRepository, text: str, page: int, size: int, *filter_mappings: Mapping[Any, Any],
+                                projection_model: type[BaseModel] = None) -> tuple[ElementCount, list[tuple[BaseModel, float]]]:
+        scored_ids = repo.search_index.search(text, self.SEARCH_MAX_CANDIDATES)
+        exact = len(scored_ids) < self.SEARCH_MAX_CANDIDATES
+
+        if filter_mappings and scored_ids:
+            matching_ids_query = repo.find(In(JobListing.id, [_id for _id, _ in scored_ids]), *filter_mappings, projection_model = DocumentId)
+            matching_ids = {item.id for item in await matching_ids_query.to_list()}
+            scored_ids = [(_id, score) for _id, score in scored_ids if _id in matching_ids]
+
+        page_scored_ids = scored_ids[(page - 1) * size:page * size]
+
+        items = {}
+        if page_scored_ids:
+            items_query = repo.find(In(JobListing.id, [_id for _id, _ in page_scored_ids]), projection_model = projection_model)
+            items = {item.id: item for item in await items_query.to_list()}
+
+        scored_items = [(items[_id], score) for _id, score in page_scored_ids if _id in items]
+        return ElementCount(count = len(scored_ids), exact = exact), scored_items
 
     @overload
     async def shortlist_listing(self, user: User, listing: JobListing): ...
@@ -28,3 +193,6 @@ class JobListingService(DocumentService[JobListingRepository, JobListing, JobLis
         await shortlist_item.create()
 
         return shortlist_item()
+
+ImportService.add_import_finished_callback(JobListingService.on_import_finished)
+ResponseSerializer.precompile(PaginatedResponse[JobListing], PaginatedResponse[JobListingSummary])
@@ -0,0 +1,135 @@
+import logging
+from collections import Counter
+from typing import Any, Mapping
+
+from beanie import PydanticObjectId
+
+from apps.job_listing.responses import FacetValueCount, ListingFacetsResponse
+
+from models.job_listing import JobListing
+from models.listing_facet import ListingFacet
+
+from repositories.base import RepositoryWriteListener
+from repositories.cache import TTLCache
+from repositories.factory import RepositoryFactory
+from repositories.job_listing import JobListingRepository
+from repositories.listing_facet import ListingFacetCountRepository
+
+from services.base import BaseService
+from services.data_import import ImportService
+from services.schemas import ImportJob
+
+logger = logging.getLogger(__name__)
+
+_FACET_RESPONSE_FIELDS = {
+    ListingFacet.SKILL: "skills",
+    ListingFacet.WORKPLACE_TYPE: "workplace_type",
+    ListingFacet.CURRENCY: "currency",
+    ListingFacet.EXPERIENCE: "experience",
+}
+
+class ListingFacetService(BaseService, RepositoryWriteListener):
+    """
+    Listing counts per facet value. Unfiltered counts are read from a materialized collection,
+    incremented on every listing insert (so after each import batch), and adjusted by the difference
+    between the previous and the written listing on updates and deletes. It is only rebuilt when empty.
+    Filtered counts are computed with a single `$facet` aggregation.
+    """
+    MAX_SKILL_VALUES = 50
+
+    _UNFILTERED_CACHE: TTLCache[str, ListingFacetsResponse] = TTLCache(max_entries = 1, ttl_seconds = 30)
+    _UNFILTERED_CACHE_KEY = "unfiltered"
+
+    def _get_response(self, counts: Mapping[tuple[ListingFacet, Any], int]) -> ListingFacetsResponse:
+        value_counts = {facet: [] for facet in ListingFacet}
+        for (facet, value), count in counts.items():
+            if count > 0:
+                value_counts[facet].append(FacetValueCount(value = value, count = count))
+
+        for facet_value_counts in value_counts.values():
+            facet_value_counts.sort(key = lambda value_count: value_count.count, reverse = True)
+        del value_counts[ListingFacet.SKILL][self.MAX_SKILL_VALUES:]
+
+        return ListingFacetsResponse(**{_FACET_RESPONSE_FIELDS[facet]: facet_value_counts for facet, facet_value_counts in value_counts.items()})
+
+    async def _count_listings(self, *filter_mappings: Mapping[Any, Any]) -> dict[tuple[ListingFacet, Any], int]:
+        listing_repo = await RepositoryFactory.get_repository(JobListingRepository)
+        value_counts = await listing_repo.count_values(listing_repo.find(*filter_mappings), [facet.value for facet in ListingFacet])
+
+        return {
+            (ListingFacet(field_name), value): count
+            for field_name, field_value_counts in value_counts.items()
+            for value, count in field_value_counts.items()
+        }
+
+    async def rebuild(self):
+        facet_repo = await RepositoryFactory.get_repository(ListingFacetCountRepository)
+        await facet_repo.replace_all(await self._count_listings())
+
+        self._UNFILTERED_CACHE.clear()
+
+    @classmethod
+    async def setup(cls):
+        # increments need a materialized starting point
+        facet_repo = await RepositoryFactory.get_repository(ListingFacetCountRepository)
+        if await facet_repo.get_all().count() == 0:
+            await cls().rebuild()
+
+    async def _get_unfiltered_facets(self) -> ListingFacetsResponse:
+        response = self._UNFILTERED_CACHE.get(self._UNFILTERED_CACHE_KEY)
+        if response is not None:
+            return response
+
+        facet_repo = await RepositoryFactory.get_repository(ListingFacetCountRepository)
+        facet_counts = await facet_repo.get_all().to_list()
+
+        response = self._get_response({(facet_count.facet, facet_count.value): facet_count.count for facet_count in facet_counts})
+        self._UNFILTERED_CACHE.set(self._UNFILTERED_CACHE_KEY, response)
+
+        return response
+
+    async def get_facets(self, *filter_mappings: Mapping[Any, Any]) -> ListingFacetsResponse:
+        if not filter_mappings:
+            return await self._get_unfiltered_facets()
+
+        return self._get_response(await self._count_listings(*filter_mappings))
+
+    @classmethod
+    def count_facet_values(cls, listings: list[JobListing]) -> Counter[tuple[ListingFacet, Any]]:
+        counts = Counter()
+        for listing in listings:
+            for skill in listing.expected_skills or []:
+                counts[(ListingFacet.SKILL, skill)] += 1
+
+            for facet in (ListingFacet.WORKPLACE_TYPE, ListingFacet.CURRENCY, ListingFacet.EXPERIENCE):
+                value = getattr(listing, facet.value)
+                if value is not None:
+                    counts[(facet, value.value)] += 1
+
+        return counts
+
+    # JobListingRepository write hooks
+    async def on_create(self, items: list[JobListing]):
+        facet_repo = await RepositoryFactory.get_repository(ListingFacetCountRepository)
+        await facet_repo.increment(self.count_facet_values(items))
+
+    async def on_update(self, items: list[JobListing], previous_items: list[JobListing | None]):
+        counts = self.count_facet_values(items)
+        counts.subtract(self.count_facet_values([item for item in previous_items if item is not None]))
+
+        facet_repo = await RepositoryFactory.get_repository(ListingFacetCountRepository)
+        await facet_repo.increment({key: count for key, count in counts.items() if count != 0})
+
+    async def on_delete(self, ids: list[PydanticObjectId], previous_items: list[JobListing | None]):
+        counts = self.count_facet_values([item for item in previous_items if item is not None])
+
+        facet_repo = await RepositoryFactory.get_repository(ListingFacetCountRepository)
+        await facet_repo.increment({key: -count for key, count in counts.items()})
+
+    @classmethod
+    def on_import_finished(cls, job: ImportJob):
+        if issubclass(job.model_type, JobListing):
+            cls._UNFILTERED_CACHE.clear()
+
+JobListingRepository.add_write_listener(ListingFacetService())
+ImportService.add_import_finished_callback(ListingFacetService.on_import_finished)
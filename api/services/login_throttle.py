@@ -0,0 +1,126 @@
+import math
+import time
+
+from collections import OrderedDict
+from typing import Any, Hashable
+
+from services.exceptions import LoginThrottledException
+
+class SlidingWindowCounter:
+    """
+    Approximate sliding window event counts per key: the count of the current fixed window plus the count of the
+    previous one, weighted by how much of it the sliding window still covers. Keeps three ints per key (keys are hashed),
+    at most `max_keys` of them, least recently used keys are dropped first.
+    Not thread safe, meant to be used from the event loop.
+    """
+    def __init__(self, window_seconds: float, max_keys: int):
+        self.window_seconds = window_seconds
+        self.max_keys = max_keys
+
+        self._windows: OrderedDict[int, list[int]] = OrderedDict() # key hash -> [window number, previous count, current count]
+
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._windows)
+
+    def _get_window(self, key: Hashable, now: float) -> tuple[list[int] | None, float]:
+        window_number, elapsed = divmod(now, self.window_seconds)
+        window = self._windows.get(hash(key))
+        if window is None:
+            return None, elapsed
+
+        if window[0] != window_number: # roll over, the current window becomes the previous one if adjacent
+            window[1] = window[2] if window[0] == window_number - 1 else 0
+            window[2] = 0
+            window[0] = int(window_number)
+
+        return window, elapsed
+
+    def count(self, key: Hashable, now: float = None) -> float:
+        if now is None:
+            now = time.monotonic()
+
+        window, elapsed = self._get_window(key, now)
+        if window is None:
+            return 0.0
+
+        return window[1] * (1 - elapsed / self.window_seconds) + window[2]
+
+    def add(self, key: Hashable, now: float = None):
+        if now is None:
+            now = time.monotonic()
+
+        window, _ = self._get_window(key, now)
+        if window is None:
+            window = [int(now // self.window_seconds), 0, 0]
+            self._windows[hash(key)] = window
+
+            while len(self._windows) > self.max_keys:
+                self._windows.popitem(last = False)
+                self.evictions += 1
+        else:
+            self._windows.move_to_end(hash(key))
+
+        window[2] += 1
+
+    def get_retry_after(self, now: float = None) -> int:
+        # a hint, counts keep falling while the window slides
+        if now is None:
+            now = time.monotonic()
+
+        return max(1, math.ceil(self.window_seconds - now % self.window_seconds))
+
+class LoginThrottle:
+    """
+    Rejects login attempts before any user lookup or password verification once a client IP made `max_attempts_per_ip`
+    attempts, or an identifier (username or email) had `max_failures_per_identifier` failed attempts, within the window.
+    Every rejection is an avoided password hash.
+    """
+    def __init__(self, window_seconds: float, max_failures_per_identifier: int, max_attempts_per_ip: int, max_keys: int):
+        self.max_failures_per_identifier = max_failures_per_identifier
+        self.max_attempts_per_ip = max_attempts_per_ip
+
+        self._identifier_failures = SlidingWindowCounter(window_seconds, max_keys)
+        self._ip_attempts = SlidingWindowCounter(window_seconds, max_keys)
+
+        self.allowed = 0
+        self.rejected_by_identifier = 0
+        self.rejected_by_ip = 0
+
+    def _normalize_identifier(self, identifier: str) -> str:
+        return identifier.strip().lower()
+
+    def check(self, identifier: str, ip: str | None):
+        """
+        Counts an attempt of `ip`, raises LoginThrottledException if the attempt must not be processed.
+        """
+        now = time.monotonic()
+        identifier = self._normalize_identifier(identifier)
+
+        if ip is not None:
+            if self._ip_attempts.count(ip, now) >= self.max_attempts_per_ip:
+                self.rejected_by_ip += 1
+                raise LoginThrottledException(self._ip_attempts.get_retry_after(now))
+
+            self._ip_attempts.add(ip, now)
+
+        if self._identifier_failures.count(identifier, now) >= self.max_failures_per_identifier:
+            self.rejected_by_identifier += 1
+            raise LoginThrottledException(self._identifier_failures.get_retry_after(now))
+
+        self.allowed += 1
+
+    def record_failure(self, identifier: str):
+        self._identifier_failures.add(self._normalize_identifier(identifier))
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "allowed": self.allowed,
+            "rejected_by_identifier": self.rejected_by_identifier,
+            "rejected_by_ip": self.rejected_by_ip,
+            "hashes_avoided": self.rejected_by_identifier + self.rejected_by_ip,
+            "tracked_identifiers": len(self._identifier_failures),
+            "tracked_ips": len(self._ip_attempts),
+            "evictions": self._identifier_failures.evictions + self._ip_attempts.evictions,
+        }
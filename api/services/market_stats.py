@@ -0,0 +1,188 @@
+import itertools
+import json
+import math
+from typing import Iterable
+
+from beanie import PydanticObjectId
+
+from apps.job_listing.responses import MarketStatsResponse, SalaryStats
+
+from models.job_listing import Currency, ExperienceLevel, JobListing, WorkplaceType
+from models.market_stats import MarketStats, SalarySketch
+
+from repositories.base import RepositoryWriteListener
+from repositories.factory import RepositoryFactory
+from repositories.job_listing import JobListingRepository
+from repositories.market_stats import MarketStatsRepository
+
+from services.base import BaseService
+
+ANY = "*"
+
+_SALARY_FIELDS = {
+    "min_salary": "min_salary_monthly",
+    "max_salary": "max_salary_monthly",
+}
+
+class MarketStatsService(BaseService, RepositoryWriteListener):
+    """
+    Listing statistics per (skill, workplace type, experience, currency), materialized in the market_stats collection.
+    Every listing is counted under each combination of its values and ANY (except currency, salaries of different currencies
+    do not mix), so any question is a single key lookup. Salary quantiles come from log bucket histograms,
+    values within a bucket are at most SKETCH_RELATIVE_ERROR apart from the bucket's representative value.
+
+    Writes are applied with `$inc` updates, updates and deletes subtract the previous version of the listing.
+    `rebuild` recomputes the collection from all listings (see scripts/rebuild_market_stats.py).
+    """
+    SKETCH_RELATIVE_ERROR = 0.01
+    _GAMMA = (1 + SKETCH_RELATIVE_ERROR) / (1 - SKETCH_RELATIVE_ERROR)
+
+    QUANTILES = (0.25, 0.5, 0.75, 0.9)
+
+    @classmethod
+    def get_bucket(cls, value: float) -> int:
+        return math.ceil(math.log(value, cls._GAMMA))
+
+    @classmethod
+    def get_bucket_value(cls, bucket: int) -> float:
+        return 2 * cls._GAMMA ** bucket / (cls._GAMMA + 1)
+
+    @classmethod
+    def get_key(cls, skill: str, workplace_type: str, experience: str, currency: str) -> str:
+        return json.dumps([skill, workplace_type, experience, currency])
+
+    @classmethod
+    def _get_key_fields(cls, listing: JobListing) -> list[dict[str, str]]:
+        skills = [ANY, *dict.fromkeys(listing.expected_skills or [])]
+        workplace_types = [ANY, str(listing.workplace_type.value)]
+        experiences = [ANY]
+        if listing.expected_experience is not None:
+            experiences.append(str(listing.expected_experience.value))
+
+        return [
+            {"skill": skill, "workplace_type": workplace_type, "experience": experience, "currency": listing.salary_currency.value}
+            for skill, workplace_type, experience in itertools.product(skills, workplace_types, experiences)
+        ]
+
+    @classmethod
+    def add_increments(cls, increments: dict[str, tuple[dict[str, str], dict[str, int | float]]], listings: Iterable[JobListing], sign: int = 1):
+        """
+        Accumulates the `$inc` updates of `listings` into `increments` (key -> (key fields, dotted field path -> increment)),
+        `sign` -1 subtracts them.
+        """
+        for listing in listings:
+            listing_inc = {"count": sign}
+            for stats_field, listing_field in _SALARY_FIELDS.items():
+                salary = getattr(listing, listing_field)
+                if salary is None or salary <= 0:
+                    continue
+
+                listing_inc[f"{stats_field}.count"] = sign
+                listing_inc[f"{stats_field}.sum"] = sign * salary
+                listing_inc[f"{stats_field}.buckets.{cls.get_bucket(salary)}"] = sign
+
+            for key_fields in cls._get_key_fields(listing):
+                key = cls.get_key(**key_fields)
+                if key not in increments:
+                    increments[key] = (key_fields, {})
+
+                inc = increments[key][1]
+                for field_path, value in listing_inc.items():
+                    inc[field_path] = inc.get(field_path, 0) + value
+
+    async def rebuild(self):
+        stats_repo = await RepositoryFactory.get_repository(MarketStatsRepository)
+        listing_repo = await RepositoryFactory.get_repository(JobListingRepository)
+
+        increments = {}
+        async for listing in listing_repo.get_all():
+            self.add_increments(increments, [listing])
+
+        await stats_repo.replace_all(increments)
+
+    @classmethod
+    def drop_zero_increments(cls, increments: dict[str, tuple[dict[str, str], dict[str, int | float]]]) -> dict[str, tuple[dict[str, str], dict[str, int | float]]]:
+        # an update that did not change the counted values of a listing cancels out
+        non_zero = {}
+        for key, (key_fields, inc) in increments.items():
+            inc = {field_path: value for field_path, value in inc.items() if value != 0}
+            if inc:
+                non_zero[key] = (key_fields, inc)
+
+        return non_zero
+
+    def _get_salary_stats(self, sketch: SalarySketch) -> SalaryStats | None:
+        if sketch.count == 0:
+            return None
+
+        buckets = sorted((int(bucket), count) for bucket, count in sketch.buckets.items())
+
+        quantiles = {}
+        seen = 0
+        quantile_iter = iter(self.QUANTILES)
+        quantile = next(quantile_iter)
+        for bucket, count in buckets:
+            seen += count
+            while quantile is not None and seen >= quantile * sketch.count:
+                quantiles[quantile] = self.get_bucket_value(bucket)
+                quantile = next(quantile_iter, None)
+
+        return SalaryStats(
+            count = sketch.count,
+            mean = sketch.sum / sketch.count,
+            p25 = quantiles[0.25],
+            median = quantiles[0.5],
+            p75 = quantiles[0.75],
+            p90 = quantiles[0.9],
+        )
+
+    async def get_stats(self, skill: str | None = None, workplace_type: WorkplaceType | None = None,
+                        experience: ExperienceLevel | None = None, currency: Currency | None = None) -> list[MarketStatsResponse]:
+        """
+        Returns the statistics of listings matching the given values, one item per currency.
+        """
+        key_fields = {
+            "skill": skill if skill is not None else ANY,
+            "workplace_type": str(workplace_type.value) if workplace_type is not None else ANY,
+            "experience": str(experience.value) if experience is not None else ANY,
+        }
+        currencies = [currency] if currency is not None else list(Currency)
+
+        stats_repo = await RepositoryFactory.get_repository(MarketStatsRepository)
+        stats: list[MarketStats] = await stats_repo.fetch_by_keys([self.get_key(**key_fields, currency = currency.value) for currency in currencies])
+
+        return [
+            MarketStatsResponse(
+                currency = Currency(item.currency),
+                count = item.count,
+                min_salary = self._get_salary_stats(item.min_salary),
+                max_salary = self._get_salary_stats(item.max_salary),
+            )
+            for item in sorted(stats, key = lambda item: item.count, reverse = True)
+            if item.count > 0 # keys whose listings were all deleted
+        ]
+
+    # JobListingRepository write hooks
+    async def on_create(self, items: list[JobListing]):
+        increments = {}
+        self.add_increments(increments, items)
+
+        stats_repo = await RepositoryFactory.get_repository(MarketStatsRepository)
+        await stats_repo.increment(increments)
+
+    async def on_update(self, items: list[JobListing], previous_items: list[JobListing | None]):
+        increments = {}
+        self.add_increments(increments, items)
+        self.add_increments(increments, [item for item in previous_items if item is not None], sign = -1)
+
+        stats_repo = await RepositoryFactory.get_repository(MarketStatsRepository)
+        await stats_repo.increment(self.drop_zero_increments(increments))
+
+    async def on_delete(self, ids: list[PydanticObjectId], previous_items: list[JobListing | None]):
+        increments = {}
+        self.add_increments(increments, [item for item in previous_items if item is not None], sign = -1)
+
+        stats_repo = await RepositoryFactory.get_repository(MarketStatsRepository)
+        await stats_repo.increment(increments)
+
+JobListingRepository.add_write_listener(MarketStatsService())
@@ -0,0 +1,89 @@
+import asyncio
+import threading
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, TypeVar
+
+from services.exceptions import PasswordHashingSaturatedException
+
+TResult = TypeVar("TResult")
+
+class TimingStats:
+    def __init__(self):
+        self.count = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+
+        self._lock = threading.Lock() # added to from worker threads
+
+    def add(self, seconds: float):
+        with self._lock:
+            self.count += 1
+            self.total_seconds += seconds
+            self.max_seconds = max(self.max_seconds, seconds)
+
+    def stats(self) -> dict[str, float]:
+        return {
+            "count": self.count,
+            "mean_ms": self.total_seconds / self.count * 1000 if self.count else 0.0,
+            "max_ms": self.max_seconds * 1000,
+        }
+
+class PasswordHashingPool:
+    """
+    Runs password hashing off the event loop, on `concurrency` threads (argon2 releases the GIL).
+    At most `max_queued` calls wait for a thread, further calls are rejected right away
+    with PasswordHashingSaturatedException instead of piling up behind them.
+    """
+    def __init__(self, concurrency: int, max_queued: int):
+        self.concurrency = concurrency
+        self.max_queued = max_queued
+
+        self._executor: ThreadPoolExecutor | None = None
+        self._pending = 0 # running and queued calls
+
+        self.rejected = 0
+        self.queue_wait = TimingStats()
+        self.hash_time = TimingStats()
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers = self.concurrency, thread_name_prefix = "password-hashing")
+
+        return self._executor
+
+    def _run_timed(self, submitted_at: float, func: Callable[..., TResult], *args) -> TResult:
+        started_at = time.perf_counter()
+        self.queue_wait.add(started_at - submitted_at)
+        try:
+            return func(*args)
+        finally:
+            self.hash_time.add(time.perf_counter() - started_at)
+
+    async def run(self, func: Callable[..., TResult], *args) -> TResult:
+        if self._pending >= self.concurrency + self.max_queued:
+            self.rejected += 1
+            raise PasswordHashingSaturatedException(self._pending)
+
+        self._pending += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._get_executor(), self._run_timed, time.perf_counter(), func, *args)
+        finally:
+            self._pending -= 1
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait = False, cancel_futures = True)
+            self._executor = None
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "concurrency": self.concurrency,
+            "max_queued": self.max_queued,
+            "pending": self._pending,
+            "rejected": self.rejected,
+            "queue_wait": self.queue_wait.stats(),
+            "hash_time": self.hash_time.stats(),
+        }
@@ -4,12 +4,15 @@ from pydantic import BaseModel, FilePath
 from beanie import PydanticObjectId
 
 from datetime import datetime
+from enum import StrEnum
 
 from repositories.base import TRepo
+from repositories.schemas import OrderByField
 
 from models.base import TModel, TModelData
 
 import os
+import pathlib
 
 # Auth
 class Token(BaseModel):
@@ -21,6 +24,20 @@ class TokenData(BaseModel):
     username: str
     email: str
 
+# Document
+class PageExecution(StrEnum):
+    SEQUENTIAL = "sequential" # count, then fetch items
+    GATHER = "gather" # count and fetch items concurrently
+    FACET = "facet" # single $facet aggregation, falls back to GATHER if it can not be used
+
+class ElementCount(BaseModel):
+    count: int
+    exact: bool
+
+class SearchEngine(StrEnum):
+    TEXT_INDEX = "text_index" # mongo $text query
+    IN_MEMORY = "in_memory" # in-process BM25 index, mongo only fetches the matched documents
+
 # Import
 ENV_IMPORT_DEFAULT_BATCH_SIZE: int = int(os.getenv("IMPORT_DEFAULT_BATCH_SIZE"))
 class ImportJob(BaseModel):
@@ -34,4 +51,17 @@ class ImportJob(BaseModel):
 
     repo_type: Type[TRepo]
     model_type: Type[TModel]
-    model_data_type: Type[TModelData]
\ No newline at end of file
+    model_data_type: Type[TModelData]
+
+# Export
+class ExportJob(BaseModel):
+    id: str
+    file_path: pathlib.Path
+    filter_query: dict[str, Any] # compiled in the api process, beanie expressions are not picklable
+    order_by: list[OrderByField]
+
+    batch_size: int = 1000
+
+    repo_type: Type[TRepo]
+    model_type: Type[TModel]
+    model_data_type: Type[TModelData]
@@ -0,0 +1,43 @@
+from typing import Any, AsyncGenerator, AsyncIterable
+
+from pydantic import TypeAdapter
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+class ResponseSerializer:
+    """
+    JSON serializers compiled once per response type. Values are dumped straight to bytes
+    without the validation pass FastAPI runs on `response_model`s, so they must already be valid
+    (e.g. documents parsed from the database). `PydanticObjectId` and datetime fields are encoded
+    the same way FastAPI encodes them.
+    """
+    _ADAPTERS: dict[Any, TypeAdapter] = {}
+
+    @classmethod
+    def get_adapter(cls, response_type: Any) -> TypeAdapter:
+        adapter = cls._ADAPTERS.get(response_type)
+        if adapter is None:
+            adapter = TypeAdapter(response_type)
+            cls._ADAPTERS[response_type] = adapter
+
+        return adapter
+
+    @classmethod
+    def precompile(cls, *response_types: Any):
+        for response_type in response_types:
+            cls.get_adapter(response_type)
+
+    @classmethod
+    def dump_json(cls, value: Any, response_type: Any = None) -> bytes:
+        if response_type is None:
+            response_type = type(value)
+
+        return cls.get_adapter(response_type).dump_json(value, by_alias = True)
+
+    @classmethod
+    async def iter_ndjson(cls, batches: AsyncIterable[list[Any]]) -> AsyncGenerator[bytes]:
+        """
+        Encodes batches of values as newline delimited JSON, one chunk per batch.
+        """
+        async for batch in batches:
+            yield b"".join(cls.dump_json(value) + b"\n" for value in batch)
@@ -0,0 +1,37 @@
+import asyncio
+import os
+import socket
+
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Awaitable, Callable
+
+from repositories.factory import RepositoryFactory
+from repositories.search import SearchIndex
+
+# Job worker processes of ImportService and ExportService
+_WORKER_LOOP: asyncio.AbstractEventLoop = None
+
+def get_process_id() -> str:
+    # "host:pid" of an api process, job records store the one running them
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+def _init_worker():
+    # runs once per worker process, every job of the worker reuses its loop, client and beanie setup
+    global _WORKER_LOOP
+    SearchIndex.release_all() # inherited from the api process, the write hooks would keep filling it with every imported batch
+
+    _WORKER_LOOP = asyncio.new_event_loop()
+    asyncio.set_event_loop(_WORKER_LOOP)
+    _WORKER_LOOP.run_until_complete(RepositoryFactory.setup()) # the parent's client can not be used after fork
+
+def _run_in_worker(job_function: Callable[..., Awaitable[Any]], *args) -> Any:
+    return _WORKER_LOOP.run_until_complete(job_function(*args))
+
+def create_worker_pool(max_workers: int) -> ProcessPoolExecutor:
+    return ProcessPoolExecutor(max_workers = max_workers, initializer = _init_worker)
+
+def submit_job(pool: ProcessPoolExecutor, job_function: Callable[..., Awaitable[Any]], *args) -> asyncio.Future:
+    """
+    Runs the coroutine function on a worker of `pool`, `job_function` and `args` must be picklable.
+    """
+    return asyncio.wrap_future(pool.submit(_run_in_worker, job_function, *args))
@@ -0,0 +1,89 @@
+# uv run --env-file .env python benchmarks/csv_import.py
+# Compares rows/sec of the import csv reader with the previous one, up to the row dicts that get validated (parsing and empty value handling).
+# The file is generated in a temporary folder, nothing is written to the configured database.
+
+import asyncio
+import csv
+import json
+import pathlib
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parents[1] / "api"))
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parents[1]))
+
+import aiocsv
+import aiofiles
+
+from models.job_listing import JobListingData
+
+from services.data_import import ImportService
+
+from tests.utils import generate_random_listing
+
+ROWS = 200_000
+UNIQUE_ROWS = 2_000 # repeated, generating listings is slower than parsing them
+ROUNDS = 3
+
+def write_csv(file_path: pathlib.Path):
+    columns = list(JobListingData.model_fields)
+    rows = []
+    for _ in range(UNIQUE_ROWS):
+        data = generate_random_listing().model_dump(mode = "json")
+        rows.append(["" if data[c] is None else json.dumps(data[c]) if isinstance(data[c], list) else data[c] for c in columns])
+
+    with open(file_path, "w", newline = "") as f:
+        writer = csv.writer(f)
+        writer.writerow(columns)
+        for i in range(ROWS):
+            writer.writerow(rows[i % UNIQUE_ROWS])
+
+async def read_aiocsv_rows(file_path: pathlib.Path) -> int:
+    # the reader before blocks: an await and a dict per row, empty values replaced cell by cell
+    count = 0
+    async with aiofiles.open(file_path, "r") as f:
+        reader = aiocsv.AsyncReader(f, delimiter = ",")
+        headers = await anext(reader)
+        async for row in reader:
+            row_data = {k:v for k,v in zip(headers, row)}
+            for k,v in row_data.items():
+                if v == "":
+                    row_data[k] = None
+            count += 1
+
+    return count
+
+async def read_blocks(file_path: pathlib.Path) -> int:
+    count = 0
+    async for items in ImportService()._read_file(file_path, file_extension = ".csv"):
+        count += len(items)
+
+    return count
+
+async def measure(read) -> float:
+    best = float("inf")
+    for _ in range(ROUNDS):
+        start = time.perf_counter()
+        count = await read()
+        best = min(best, time.perf_counter() - start)
+
+    assert count == ROWS
+    return ROWS / best
+
+async def main():
+    with tempfile.TemporaryDirectory() as folder:
+        file_path = pathlib.Path(folder) / "listings.csv"
+        write_csv(file_path)
+        print(f"{ROWS} rows, {file_path.stat().st_size / 1024 / 1024:.1f} mb, best of {ROUNDS} rounds")
+        print(f"{'reader':>24} {'rows/sec':>12}")
+
+        cases = {
+            "aiocsv rows (previous)": lambda: read_aiocsv_rows(file_path),
+            "blocks": lambda: read_blocks(file_path),
+        }
+        for name, read in cases.items():
+            print(f"{name:>24} {await measure(read):>12,.0f}")
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,47 @@
+# uv run --env-file .env python benchmarks/get_page.py
+# Compares DocumentService.get_page execution modes (sequential, gathered, $facet) against the configured database.
+
+import asyncio
+import pathlib
+import statistics
+import sys
+import time
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parents[1] / "api"))
+
+from repositories.factory import RepositoryFactory
+
+from services.count import ExactCount
+from services.factory import ServiceFactory
+from services.schemas import PageExecution
+
+ROUNDS = 50
+PAGE_SIZE = 20
+PAGES = [1, 10, 100]
+
+async def measure(service, page: int, execution: PageExecution):
+    timings = []
+    for _ in range(ROUNDS):
+        start = time.perf_counter()
+        await service.get_page(page, PAGE_SIZE, count_strategy = ExactCount(), execution = execution)
+        timings.append((time.perf_counter() - start) * 1000)
+
+    timings.sort()
+    return statistics.median(timings), timings[int(len(timings) * 0.95) - 1]
+
+async def main():
+    await RepositoryFactory.setup()
+    service = ServiceFactory.get_job_listing_service()
+
+    element_count = await service.element_count()
+    print(f"{service.__class__.__name__}: {element_count} documents, {ROUNDS} rounds per case, page size {PAGE_SIZE}")
+    print(f"{'page':>6} {'execution':>12} {'median ms':>10} {'p95 ms':>10}")
+
+    for page in PAGES:
+        for execution in PageExecution:
+            await service.get_page(page, PAGE_SIZE, count_strategy = ExactCount(), execution = execution) # warm up
+            median, p95 = await measure(service, page, execution)
+            print(f"{page:>6} {execution.value:>12} {median:>10.2f} {p95:>10.2f}")
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,75 @@
+# uv run --env-file .env python benchmarks/serialization.py
+# Compares per-page CPU time of FastAPI's response_model serialization against the precompiled ResponseSerializer path.
+# Pages are generated in memory, nothing is written to the configured database.
+
+import asyncio
+import json
+import pathlib
+import statistics
+import sys
+import time
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parents[1] / "api"))
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parents[1]))
+
+from beanie import PydanticObjectId
+from fastapi.routing import serialize_response
+from fastapi.utils import create_model_field
+
+from apps.schemas import PaginatedResponse
+from models.job_listing import JobListing, JobListingSummary
+from repositories.factory import RepositoryFactory
+
+from services.serialization import ResponseSerializer
+
+from tests.utils import generate_random_listing
+
+ROUNDS = 200
+PAGE_SIZES = [10, 100]
+
+def create_page(size: int) -> PaginatedResponse[JobListing]:
+    # same path as a database read, documents are validated once
+    items = [JobListing.model_validate({"_id": PydanticObjectId(), **generate_random_listing().model_dump()}) for _ in range(size)]
+    return PaginatedResponse[JobListing].model_construct(page = 1, size = size, element_count = size, element_count_exact = True, items = items)
+
+async def measure_fastapi(page: PaginatedResponse[JobListing]) -> list[float]:
+    # what a route returning the response with `-> PaginatedResponse[JobListing] | PaginatedResponse[JobListingSummary]` does
+    field = create_model_field("response", PaginatedResponse[JobListing] | PaginatedResponse[JobListingSummary], mode = "serialization")
+
+    timings = []
+    for _ in range(ROUNDS):
+        start = time.process_time()
+        content = await serialize_response(field = field, response_content = page)
+        json.dumps(content, ensure_ascii = False, allow_nan = False, separators = (",", ":")).encode() # JSONResponse.render
+        timings.append((time.process_time() - start) * 1000)
+
+    return timings
+
+async def measure_serializer(page: PaginatedResponse[JobListing]) -> list[float]:
+    timings = []
+    for _ in range(ROUNDS):
+        start = time.process_time()
+        ResponseSerializer.dump_json(page)
+        timings.append((time.process_time() - start) * 1000)
+
+    return timings
+
+async def main():
+    await RepositoryFactory.setup() # documents are only created in memory, the odm has to be initialized
+    ResponseSerializer.precompile(PaginatedResponse[JobListing])
+    print(f"{ROUNDS} rounds per case, CPU time per page")
+    print(f"{'size':>6} {'path':>12} {'median ms':>10} {'p95 ms':>10}")
+
+    for size in PAGE_SIZES:
+        page = create_page(size)
+
+        fastapi_field = create_model_field("response", PaginatedResponse[JobListing] | PaginatedResponse[JobListingSummary], mode = "serialization")
+        fastapi_content = await serialize_response(field = fastapi_field, response_content = page)
+        assert json.loads(ResponseSerializer.dump_json(page)) == json.loads(json.dumps(fastapi_content)), "paths must produce the same JSON"
+
+        for name, measure in [("fastapi", measure_fastapi), ("serializer", measure_serializer)]:
+            timings = sorted(await measure(page))
+            print(f"{size:>6} {name:>12} {statistics.median(timings):>10.3f} {timings[int(len(timings) * 0.95) - 1]:>10.3f}")
+
+if __name__ == "__main__":
+    asyncio.run(main())
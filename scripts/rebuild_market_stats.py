@@ -0,0 +1,24 @@
+# uv run --env-file .env python scripts/rebuild_market_stats.py
+# Recomputes the market_stats collection from all job listings, run while no listings are being written.
+
+import asyncio
+import pathlib
+import sys
+import time
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parents[1] / "api"))
+
+from repositories.factory import RepositoryFactory
+
+from services.factory import ServiceFactory
+
+async def main():
+    await RepositoryFactory.setup()
+    service = ServiceFactory.get_market_stats_service()
+
+    start = time.perf_counter()
+    await service.rebuild()
+    print(f"Rebuilt market stats in {time.perf_counter() - start:.1f}s")
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,12 +1,15 @@
 import pytest
 
+import asyncio
 import logging
+import threading
 
 pytest_plugins = ('pytest_asyncio',)
 
 from apps.auth.requests import LoginRequest
 
-from services.exceptions import EmailExistsException, UsernameExistsException
+from services.exceptions import EmailExistsException, PasswordHashingSaturatedException, UsernameExistsException
+from services.password_hashing import PasswordHashingPool
 
 from services.auth import AuthService
 
@@ -24,6 +27,35 @@ async def test_hashing_class():
     assert not AuthService.verify_password(password, password)
     assert not AuthService.verify_password(hashed_password, hashed_password)
 
+@pytest.mark.asyncio(loop_scope="session")
+async def test_hashing_async():
+    password = "qwe123qwe123"
+
+    hashed_password = await AuthService._hash_password_async(password)
+
+    assert await AuthService.verify_password_async(password, hashed_password)
+    assert not await AuthService.verify_password_async(password+"qwewqew", hashed_password)
+    assert AuthService.get_hashing_pool().stats()["hash_time"]["count"] >= 3
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_hashing_pool_saturation():
+    pool = PasswordHashingPool(concurrency = 1, max_queued = 1)
+    release = threading.Event()
+
+    running = asyncio.ensure_future(pool.run(release.wait))
+    queued = asyncio.ensure_future(pool.run(release.wait))
+    await asyncio.sleep(0)
+
+    with pytest.raises(PasswordHashingSaturatedException):
+        await pool.run(release.wait)
+
+    release.set()
+    assert await asyncio.gather(running, queued) == [True, True]
+    assert pool.stats()["rejected"] == 1
+    assert pool.stats()["pending"] == 0
+
+    pool.shutdown()
+
 @pytest.mark.asyncio(loop_scope="session")
 async def test_create_user(setup_teardown_users):
     users_to_delete, user_ids_to_delete = setup_teardown_users
@@ -88,3 +120,20 @@ async def test_login(setup_teardown_users):
     user_token_data = AuthService.decode_token(login_response.token)
 
     assert random_user.id == user_token_data.user_id
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_get_user_from_token_cache(setup_teardown_users):
+    users_to_delete, user_ids_to_delete = setup_teardown_users
+
+    random_user = await AuthService.create_user(generate_random_user_data(username_prefix="test_token_cache_"))
+    users_to_delete.append(random_user)
+
+    token = AuthService.create_token(random_user).token
+    user = await AuthService.get_user_from_token(token)
+    assert user.id == random_user.id
+    assert await AuthService.get_user_from_token(token) is user # served from cache
+
+    update_data = generate_random_user_data(username_prefix="test_token_cache_updated_")
+    await AuthService.update_user(random_user.id, update_data)
+
+    assert (await AuthService.get_user_from_token(token)).username == update_data.username
@@ -0,0 +1,21 @@
+import csv
+import io
+
+from models.job_listing import JobListingData
+from services.data_export import _to_csv_cell
+
+from tests.utils import generate_random_listing
+
+def test_export_row_reimports():
+    listing = generate_random_listing(expected_skills = ["python", "c, c++"], min_salary_monthly = None, description = 'multi\nline "quoted"')
+
+    columns = list(JobListingData.model_fields)
+    item_data = listing.model_dump(mode = "json")
+
+    buffer = io.StringIO()
+    csv.writer(buffer, lineterminator = "\n").writerows([columns, [_to_csv_cell(item_data[column]) for column in columns]])
+
+    headers, row = csv.reader(io.StringIO(buffer.getvalue()))
+    row_data = {header: value if value != "" else None for header, value in zip(headers, row)} # as ImportService reads it
+
+    assert JobListingData.model_validate(row_data) == listing
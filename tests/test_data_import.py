@@ -0,0 +1,77 @@
+import pytest
+
+import json
+
+from pydantic import BaseModel, ValidationError
+
+from models.job_listing import JobListing, JobListingData
+from repositories.job_listing import JobListingRepository
+from services.data_import import ImportProgress, ImportService, _get_type_path, _resolve_type_path
+from services.import_rejects import RejectedRowSink
+
+pytest_plugins = ('pytest_asyncio',)
+
+def test_type_path_round_trip():
+    # queued jobs store their types as import paths, workers resolve them
+    for type_ in (JobListing, JobListingData, JobListingRepository):
+        assert _resolve_type_path(_get_type_path(type_)) is type_
+
+def test_import_progress_throttled_updates():
+    progress = ImportProgress(update_interval_seconds = 60)
+    assert not progress.is_update_due()
+
+    progress.rows_read = 3
+    progress.rows_rejected = 1
+    update = progress.to_update()
+    assert update["rows_read"] == 3
+    assert update["rows_rejected"] == 1
+    assert update["rows_per_second"] > 0
+    assert not progress.is_update_due()
+
+    progress = ImportProgress(update_interval_seconds = 0)
+    assert progress.is_update_due()
+
+def test_rejected_row_sink(tmp_path):
+    class Row(BaseModel):
+        count: int
+        tags: list[int]
+
+    sink = RejectedRowSink(tmp_path.joinpath("job.rejected.jsonl"), max_error_types = 2, top_error_types = 5)
+    assert sink.to_update() == {"rejected_file_name": None, "rejected_error_types": []}
+
+    rows = [{"count": "x", "tags": [1, "a", "b"]}, {"tags": []}]
+    for row_number, row in enumerate(rows, start = 1):
+        try:
+            Row.model_validate(row)
+        except ValidationError as ex:
+            sink.add(row_number, row, ex)
+    sink.close()
+
+    reports = [json.loads(line) for line in tmp_path.joinpath("job.rejected.jsonl").read_text().splitlines()]
+    assert [report["row"] for report in reports] == [1, 2]
+    assert reports[0]["errors"][1].startswith("tags.1: ")
+    assert reports[1]["data"] == {"tags": []}
+
+    # list indices share an error type, the third distinct type is counted as other
+    update = sink.to_update()
+    assert update["rejected_file_name"] == "job.rejected.jsonl"
+    assert update["rejected_error_types"] == [
+        {"error_type": "tags: int_parsing", "count": 2},
+        {"error_type": "count: int_parsing", "count": 1},
+        {"error_type": RejectedRowSink.OTHER_ERROR_TYPE, "count": 1},
+    ]
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_read_csv_blocks(tmp_path):
+    file_path = tmp_path.joinpath("rows.csv")
+    file_path.write_text('a,b,c\n1,,"x\ny"\n\n2,3\n4,5,6,7\n,,\n')
+
+    blocks = [items async for items in ImportService()._read_file(file_path, file_extension = ".csv", block_rows = 2)]
+
+    # blank lines are dropped, short rows padded and long rows cut off
+    assert [item for items in blocks for item in items] == [
+        {"a": "1", "b": None, "c": "x\ny"},
+        {"a": "2", "b": "3", "c": None},
+        {"a": "4", "b": "5", "c": "6"},
+        {"a": None, "b": None, "c": None},
+    ]
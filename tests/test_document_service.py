@@ -1,15 +1,24 @@
 import pytest
 
+import json
 import logging
+import uuid
 
 from beanie.odm.operators.find.evaluation import Text
 
+from apps.job_listing.requests import ListingFilterRequest
 from apps.schemas import PaginatedResponse
+from models.job_listing import JobListingSummary, WorkplaceType
 
 from repositories.base import BaseRepository
+from repositories.factory import RepositoryFactory
+from repositories.job_listing import JobListingRepository
 from services.document import DocumentService
 from services.factory import ServiceFactory
 from services.job_listing import JobListingService
+from services.listing_facet import ListingFacetService
+
+from tests.utils import generate_random_listing, setup_teardown_job_listings
 
 
 pytest_plugins = ('pytest_asyncio',)
@@ -104,5 +113,181 @@ async def test_get_page(document_service: DocumentService):
     assert p100_sct10.size == max_per_page
     assert len(p100_sct10.items) == 0
 
+@pytest.mark.asyncio(loop_scope="session")
+@pytest.mark.parametrize(
+    'document_service',
+    document_services,
+    ids = lambda cls: cls.__class__.__name__,
+)
+async def test_get_page_cursor(document_service: DocumentService):
+    size = 10
+    pages = 3
+
+    offset_item_ids = []
+    for page in range(1, pages + 1):
+        offset_page = await document_service.get_page(page, size)
+        offset_item_ids.extend([item.id for item in offset_page.items])
+
+    cursor_item_ids = []
+    after = None
+    for _ in range(pages):
+        cursor_page = await document_service.get_page(1, size, after = after)
+        cursor_item_ids.extend([item.id for item in cursor_page.items])
+
+        after = cursor_page.next_cursor
+        if after is None:
+            break
+
+    assert cursor_item_ids == offset_item_ids
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_get_page_projection():
+    listing_service = ServiceFactory.get_job_listing_service()
+
+    full_page = await listing_service.get_page(1, 10)
+    summary_page = await listing_service.get_page(1, 10, projection_model = JobListingSummary)
+
+    assert all(isinstance(item, JobListingSummary) for item in summary_page.items)
+    assert [item.id for item in summary_page.items] == [item.id for item in full_page.items]
+    assert summary_page.next_cursor == full_page.next_cursor
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_listing_filters(setup_teardown_job_listings):
+    job_listings_to_delete, job_listing_ids_to_delete = setup_teardown_job_listings
+
+    company = f"test_listing_filters_{uuid.uuid4().hex}"
+    listing_repo = await RepositoryFactory.get_repository(JobListingRepository)
+
+    remote_listing = await listing_repo.create(generate_random_listing(
+        company = company, workplace_type = WorkplaceType.Remote, expected_skills = ["python", "mongodb"]))
+    job_listings_to_delete.append(remote_listing)
+
+    onsite_listing = await listing_repo.create(generate_random_listing(
+        company = company, workplace_type = WorkplaceType.OnSite, expected_skills = ["python"]))
+    job_listings_to_delete.append(onsite_listing)
+
+    listing_service = ServiceFactory.get_job_listing_service()
+    async def get_filtered_ids(**filters):
+        filter_mappings = listing_service.get_filter_mappings(ListingFilterRequest(company = company, **filters))
+        page = await listing_service.get_page(1, 10, *filter_mappings)
+        return {item.id for item in page.items}
+
+    assert await get_filtered_ids() == {remote_listing.id, onsite_listing.id}
+    assert await get_filtered_ids(workplace_type = [WorkplaceType.Remote]) == {remote_listing.id}
+    assert await get_filtered_ids(skills_all = ["python", "mongodb"]) == {remote_listing.id}
+    assert await get_filtered_ids(skills_any = ["mongodb", "go"]) == {remote_listing.id}
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_listing_search(setup_teardown_job_listings):
+    job_listings_to_delete, job_listing_ids_to_delete = setup_teardown_job_listings
+
+    term = uuid.uuid4().hex
+    listing_repo = await RepositoryFactory.get_repository(JobListingRepository)
+
+    title_listing = await listing_repo.create(generate_random_listing(title = f"{term} engineer"))
+    job_listings_to_delete.append(title_listing)
+
+    description_listing = await listing_repo.create(generate_random_listing(description = f"works with {term}"))
+    job_listings_to_delete.append(description_listing)
+
+    listing_service = ServiceFactory.get_job_listing_service()
+    page = await listing_service.search(term.upper(), 1, 10)
+
+    # title matches weigh more than description matches
+    assert [scored_item.item.id for scored_item in page.items] == [title_listing.id, description_listing.id]
+    assert page.items[0].score > page.items[1].score
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_listing_facets(setup_teardown_job_listings):
+    job_listings_to_delete, job_listing_ids_to_delete = setup_teardown_job_listings
+
+    company = f"test_listing_facets_{uuid.uuid4().hex}"
+    listing_repo = await RepositoryFactory.get_repository(JobListingRepository)
+
+    for workplace_type, skills in [(WorkplaceType.Remote, ["python", "mongodb"]), (WorkplaceType.OnSite, ["python"])]:
+        listing = await listing_repo.create(generate_random_listing(company = company, workplace_type = workplace_type, expected_skills = skills))
+        job_listings_to_delete.append(listing)
+
+    listing_service = ServiceFactory.get_job_listing_service()
+    facet_service = ServiceFactory.get_listing_facet_service()
+    facets = await facet_service.get_facets(*listing_service.get_filter_mappings(ListingFilterRequest(company = company)))
+
+    assert [(value_count.value, value_count.count) for value_count in facets.skills] == [("python", 2), ("mongodb", 1)]
+    assert {value_count.value: value_count.count for value_count in facets.workplace_type} == {WorkplaceType.Remote: 1, WorkplaceType.OnSite: 1}
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_get_page_json_invalidation(setup_teardown_job_listings):
+    job_listings_to_delete, job_listing_ids_to_delete = setup_teardown_job_listings
+
+    listing_service = ServiceFactory.get_job_listing_service()
+    if listing_service.get_page_cache().max_bytes <= 0:
+        pytest.skip("page cache is disabled")
+
+    first_content = await listing_service.get_page_json(1, 10)
+    assert await listing_service.get_page_json(1, 10) is first_content # served from cache
+
+    listing_repo = await RepositoryFactory.get_repository(JobListingRepository)
+    new_listing = await listing_repo.create(generate_random_listing())
+    job_listings_to_delete.append(new_listing)
+
+    # default order is newest first, the write must not be hidden by the cache
+    assert str(new_listing.id) in (await listing_service.get_page_json(1, 10)).decode()
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_export_ndjson(setup_teardown_job_listings):
+    job_listings_to_delete, job_listing_ids_to_delete = setup_teardown_job_listings
+
+    company = f"test_export_ndjson_{uuid.uuid4().hex}"
+    listing_repo = await RepositoryFactory.get_repository(JobListingRepository)
+
+    listing_ids = set()
+    for _ in range(5):
+        listing = await listing_repo.create(generate_random_listing(company = company))
+        job_listings_to_delete.append(listing)
+        listing_ids.add(str(listing.id))
+
+    listing_service = ServiceFactory.get_job_listing_service()
+    filter_mappings = listing_service.get_filter_mappings(ListingFilterRequest(company = company))
+    chunks = [chunk async for chunk in listing_service.export_ndjson(*filter_mappings, batch_size = 2)]
+
+    assert len(chunks) == 3
+    assert {json.loads(line)["_id"] for chunk in chunks for line in chunk.splitlines()} == listing_ids
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_get_many(setup_teardown_job_listings):
+    job_listings_to_delete, job_listing_ids_to_delete = setup_teardown_job_listings
+
+    listing_repo = await RepositoryFactory.get_repository(JobListingRepository)
+
+    listings = []
+    for _ in range(3):
+        listing = await listing_repo.create(generate_random_listing())
+        job_listings_to_delete.append(listing)
+        listings.append(listing)
+
+    deleted_listing = await listing_repo.create(generate_random_listing())
+    await listing_repo.delete(deleted_listing)
+
+    listing_service = ServiceFactory.get_job_listing_service()
+    ids = [listings[2].id, deleted_listing.id, listings[0].id, listings[1].id, listings[0].id]
+    items, missing_ids = await listing_service.get_many(ids, projection_model = JobListingSummary)
+
+    assert [item.id for item in items] == [listings[2].id, listings[0].id, listings[1].id]
+    assert missing_ids == [deleted_listing.id]
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_get_by_id_cache(setup_teardown_job_listings):
+    job_listings_to_delete, job_listing_ids_to_delete = setup_teardown_job_listings
+
+    listing_repo = await RepositoryFactory.get_repository(JobListingRepository)
+    listing = await listing_repo.create(generate_random_listing())
+    job_listings_to_delete.append(listing)
 
+    listing_service = ServiceFactory.get_job_listing_service()
+    cached_listing = await listing_service.get_by_id(listing.id)
+    assert await listing_service.get_by_id(listing.id) is cached_listing
 
+    listing.title = f"updated {listing.title}"
+    await listing_repo.update(listing)
+    assert (await listing_service.get_by_id(listing.id)).title == listing.title
@@ -0,0 +1,40 @@
+import pytest
+
+from services.exceptions import LoginThrottledException
+from services.login_throttle import LoginThrottle, SlidingWindowCounter
+
+def test_sliding_window_counter():
+    counter = SlidingWindowCounter(window_seconds = 10, max_keys = 2)
+
+    for _ in range(4):
+        counter.add("a", now = 5)
+    assert counter.count("a", now = 9) == 4
+
+    # halfway through the next window, half of the previous window still counts
+    counter.add("a", now = 15)
+    assert counter.count("a", now = 15) == 3
+    assert counter.count("a", now = 35) == 0
+
+    counter.add("b", now = 35)
+    counter.add("c", now = 35)
+    assert len(counter) == 2
+    assert counter.evictions == 1
+    assert counter.count("a", now = 35) == 0
+
+def test_login_throttle():
+    throttle = LoginThrottle(window_seconds = 60, max_failures_per_identifier = 2, max_attempts_per_ip = 4, max_keys = 100)
+
+    for _ in range(2):
+        throttle.check("User@Example.com", "10.0.0.1")
+        throttle.record_failure("User@Example.com")
+
+    with pytest.raises(LoginThrottledException):
+        throttle.check(" user@example.com", "10.0.0.2")
+
+    throttle.check("other", "10.0.0.1")
+    throttle.check("another", "10.0.0.1")
+    with pytest.raises(LoginThrottledException) as ex_info:
+        throttle.check("yet another", "10.0.0.1")
+
+    assert ex_info.value.retry_after_seconds >= 1
+    assert throttle.stats()["hashes_avoided"] == 2
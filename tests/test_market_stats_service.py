@@ -0,0 +1,64 @@
+import random
+import statistics
+
+from models.job_listing import Currency, ExperienceLevel, WorkplaceType
+from models.market_stats import SalarySketch
+from services.market_stats import ANY, MarketStatsService
+
+from tests.utils import generate_random_listing
+
+def test_market_stats_increments():
+    listing = generate_random_listing(
+        expected_skills = ["python", "mongodb"], workplace_type = WorkplaceType.Remote,
+        expected_experience = ExperienceLevel.Senior, salary_currency = Currency.Euro,
+        min_salary_monthly = 1000, max_salary_monthly = 2000)
+
+    increments = {}
+    MarketStatsService.add_increments(increments, [listing])
+
+    # (any + 2 skills) * (any + 1 workplace type) * (any + 1 experience level)
+    assert len(increments) == 12
+
+    key_fields, inc = increments[MarketStatsService.get_key("python", str(WorkplaceType.Remote.value), ANY, Currency.Euro.value)]
+    assert key_fields["skill"] == "python"
+    assert inc["count"] == 1
+    assert inc["max_salary.sum"] == 2000
+
+def test_market_stats_update_increments():
+    listing = generate_random_listing(
+        expected_skills = ["python"], workplace_type = WorkplaceType.Remote,
+        expected_experience = None, salary_currency = Currency.Euro,
+        min_salary_monthly = 1000, max_salary_monthly = 2000)
+    updated_listing = listing.model_copy(update = {"expected_skills": ["go"], "max_salary_monthly": 3000})
+
+    # the new version is added, the previous one subtracted, unchanged values cancel out
+    increments = {}
+    MarketStatsService.add_increments(increments, [updated_listing])
+    MarketStatsService.add_increments(increments, [listing], sign = -1)
+    increments = MarketStatsService.drop_zero_increments(increments)
+
+    _, any_inc = increments[MarketStatsService.get_key(ANY, ANY, ANY, Currency.Euro.value)]
+    assert any_inc == {
+        "max_salary.sum": 1000,
+        f"max_salary.buckets.{MarketStatsService.get_bucket(3000)}": 1,
+        f"max_salary.buckets.{MarketStatsService.get_bucket(2000)}": -1,
+    }
+
+    _, python_inc = increments[MarketStatsService.get_key("python", ANY, ANY, Currency.Euro.value)]
+    assert python_inc["count"] == -1
+    assert python_inc["min_salary.sum"] == -1000
+
+def test_market_stats_quantiles():
+    salaries = [random.uniform(1000, 10_000) for _ in range(1000)]
+
+    sketch = SalarySketch()
+    for salary in salaries:
+        bucket = str(MarketStatsService.get_bucket(salary))
+        sketch.buckets[bucket] = sketch.buckets.get(bucket, 0) + 1
+        sketch.count += 1
+        sketch.sum += salary
+
+    salary_stats = MarketStatsService()._get_salary_stats(sketch)
+
+    median = statistics.median(salaries)
+    assert abs(salary_stats.median - median) / median <= 2 * MarketStatsService.SKETCH_RELATIVE_ERROR
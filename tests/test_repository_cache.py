@@ -0,0 +1,66 @@
+import time
+
+from repositories.cache import BytesLRUCache, EntityCache, TTLCache
+
+def test_ttl_cache_lru_eviction():
+    cache: TTLCache[str, int] = TTLCache(max_entries = 2)
+
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1 # "a" is now most recently used
+
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+    assert cache.evictions == 1
+
+def test_ttl_cache_expiry():
+    cache: TTLCache[str, int] = TTLCache(max_entries = 10, ttl_seconds = 60)
+
+    cache.set("short", 1, ttl_seconds = 0.01)
+    cache.set("long", 2)
+    time.sleep(0.02)
+
+    assert cache.get("short") is None
+    assert cache.get("long") == 2
+    assert len(cache) == 1
+
+def test_bytes_lru_cache_size_bound():
+    cache: BytesLRUCache[str] = BytesLRUCache(max_bytes = 10)
+
+    cache.set("a", b"1234")
+    cache.set("b", b"5678")
+    assert cache.get("a") == b"1234" # "a" is now most recently used
+
+    cache.set("c", b"90ab") # 12 bytes, evicts "b"
+    assert cache.get("b") is None
+    assert cache.get("a") == b"1234"
+    assert cache.stats()["bytes"] == 8
+
+    cache.set("d", b"too large value") # never stored
+    assert cache.get("d") is None
+
+def test_entity_cache_invalidation():
+    cache = EntityCache()
+    cache.configure("Listing", max_entries = 2, ttl_seconds = 60)
+    cache.configure("User", max_entries = 0, ttl_seconds = 60)
+
+    assert cache.is_enabled("Listing")
+    assert not cache.is_enabled("User")
+
+    version = cache.get_version("Listing")
+    cache.set("Listing", 1, "first", version)
+    assert cache.get("Listing", 1) == "first"
+
+    cache.invalidate("Listing", [1])
+    assert cache.get("Listing", 1) is None
+
+    # read started before the invalidation, would cache a stale document
+    cache.set("Listing", 1, "stale", version)
+    assert cache.get("Listing", 1) is None
+
+    cache.set("Listing", 1, "fresh", cache.get_version("Listing"))
+    assert cache.get("Listing", 1) == "fresh"
+    assert cache.stats()["Listing"]["hits"] == 2
+    assert "User" not in cache.stats()
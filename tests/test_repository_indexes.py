@@ -0,0 +1,41 @@
+from models.job_listing import JobListing
+
+from repositories.indexes import IndexRegistry, get_query_shape
+
+JOB_LISTING_INDEXES = [
+    [("_id", 1)],
+    [("date_created", -1), ("_id", -1)],
+    [("company", 1), ("date_created", -1), ("_id", -1)],
+]
+
+def test_query_shape():
+    filter_query = {"$and": [
+        {"company": "company"},
+        {"workplace_type": {"$in": [1, 2]}},
+        {"date_posted": {"$gte": 0}},
+        {"$or": [{"title": "a"}, {"title": "b"}]},
+    ]}
+    shape = get_query_shape(JobListing, filter_query, [("date_created", -1), ("_id", -1)])
+
+    assert shape.equality_fields == ["company", "workplace_type"]
+    assert shape.range_fields == ["date_posted"]
+    assert shape.sort == [("date_created", -1), ("_id", -1)]
+    assert not shape.text
+
+def test_index_support(monkeypatch):
+    monkeypatch.setitem(IndexRegistry._INDEXES, JobListing.__name__, JOB_LISTING_INDEXES)
+
+    def is_supported(filter_query, sort):
+        return IndexRegistry.is_supported(get_query_shape(JobListing, filter_query, sort))
+
+    # equality prefix, then the sort, in either direction
+    assert is_supported({"company": "company"}, [("date_created", -1), ("_id", -1)]) == (True, True)
+    assert is_supported({"company": "company"}, [("date_created", 1), ("_id", 1)]) == (True, True)
+
+    # mixed directions can not be read from the index
+    assert is_supported({}, [("date_created", -1), ("_id", 1)]) == (True, False)
+
+    # no index starts with description, but the sort index can be walked
+    assert is_supported({"description": "description"}, [("date_created", -1), ("_id", -1)]) == (True, True)
+    assert is_supported({"description": "description"}, []) == (False, True)
+    assert is_supported({"description": "description"}, [("title", 1), ("_id", 1)]) == (False, False)
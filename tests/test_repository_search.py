@@ -0,0 +1,39 @@
+from repositories.search import InvertedIndex
+
+def test_inverted_index_ranking():
+    index = InvertedIndex({"title": 3, "description": 1})
+    index.add("title_match", {"title": "Python developer", "description": "backend"})
+    index.add("description_match", {"title": "Go developer", "description": "some python"})
+    index.add("no_match", {"title": "Designer", "description": None})
+
+    assert [doc_id for doc_id, _ in index.search("PYTHON", 10)] == ["title_match", "description_match"]
+    assert index.search("rust", 10) == []
+
+def test_inverted_index_replace_and_remove():
+    index = InvertedIndex({"title": 1})
+    index.COMPACT_MIN_REMOVED = 2
+
+    for i in range(4):
+        index.add(i, {"title": f"python job{i}"})
+
+    index.add(0, {"title": "rust job"}) # replaces the old document
+    index.remove(1)
+    index.remove(2) # triggers compaction
+
+    assert len(index) == 2
+    assert [doc_id for doc_id, _ in index.search("python", 10)] == [3]
+    assert [doc_id for doc_id, _ in index.search("rust", 10)] == [0]
+
+def test_inverted_index_phrase_boost():
+    index = InvertedIndex({"title": 1})
+    index.add("scattered", {"title": "python tooling for senior staff"})
+    index.add("phrase", {"title": "senior python tooling for staff"})
+
+    assert [doc_id for doc_id, _ in index.search("senior python", 10)] == ["phrase", "scattered"]
+
+    index = InvertedIndex({"title": 1}, index_phrases = False)
+    index.add("scattered", {"title": "python tooling for senior staff"})
+    index.add("phrase", {"title": "senior python tooling for staff"})
+
+    scores = dict(index.search("senior python", 10))
+    assert scores["phrase"] == scores["scattered"]
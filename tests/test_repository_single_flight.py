@@ -0,0 +1,55 @@
+import pytest
+
+import asyncio
+
+from repositories.single_flight import SingleFlight
+
+pytest_plugins = ('pytest_asyncio',)
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_single_flight_coalesces_concurrent_calls():
+    single_flight: SingleFlight[str, int] = SingleFlight(max_keys = 10)
+    calls = 0
+
+    async def fetch():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return calls
+
+    results = await asyncio.gather(*[single_flight.do("a", fetch) for _ in range(5)], single_flight.do("b", fetch))
+
+    assert calls == 2
+    assert results[:5] == [results[0]] * 5
+    assert single_flight.hits == 4
+    assert single_flight.misses == 2
+    assert len(single_flight) == 0
+
+    # finished calls are not reused
+    await single_flight.do("a", fetch)
+    assert calls == 3
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_single_flight_bounded_keys_and_errors():
+    single_flight: SingleFlight[str, int] = SingleFlight(max_keys = 1)
+    release = asyncio.Event()
+
+    async def fetch():
+        await release.wait()
+        raise ValueError("failed")
+
+    first = asyncio.ensure_future(single_flight.do("a", fetch))
+    second = asyncio.ensure_future(single_flight.do("b", fetch)) # key table is full, runs on its own
+    await asyncio.sleep(0)
+    assert single_flight.overflows == 1
+
+    joined = asyncio.ensure_future(single_flight.do("a", fetch))
+    await asyncio.sleep(0)
+    first.cancel() # does not cancel the shared call
+
+    release.set()
+    for task in (second, joined):
+        with pytest.raises(ValueError):
+            await task
+
+    assert len(single_flight) == 0
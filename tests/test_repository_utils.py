@@ -0,0 +1,49 @@
+import pytest
+
+from datetime import datetime
+
+from beanie import PydanticObjectId, SortDirection
+
+from repositories.exceptions import InvalidCursorException
+from repositories.utils import build_keyset_filter, decode_cursor, encode_cursor
+
+def test_cursor_round_trip():
+    field_names = ["date_created", "max_salary_monthly", "_id"]
+    values = [datetime(2025, 1, 2, 3, 4, 5, 678000), None, PydanticObjectId()]
+
+    cursor = encode_cursor(field_names, values)
+    assert "=" not in cursor
+
+    assert decode_cursor(cursor, field_names) == values
+
+def test_cursor_rejects_other_sort_order():
+    cursor = encode_cursor(["date_created", "_id"], [datetime.now(), PydanticObjectId()])
+
+    with pytest.raises(InvalidCursorException):
+        decode_cursor(cursor, ["title", "_id"])
+
+    with pytest.raises(InvalidCursorException):
+        decode_cursor("not a cursor", ["date_created", "_id"])
+
+def test_cursor_rejects_operator_values():
+    # a crafted token must not place query operators into the keyset filter
+    for value in ({"$ne": None}, [1, 2]):
+        cursor = encode_cursor(["title", "_id"], [value, PydanticObjectId()])
+        with pytest.raises(InvalidCursorException):
+            decode_cursor(cursor, ["title", "_id"])
+
+def test_keyset_filter():
+    _id = PydanticObjectId()
+    sort_expressions = [("max_salary_monthly", SortDirection.DESCENDING), ("_id", SortDirection.DESCENDING)]
+
+    keyset_filter = build_keyset_filter(sort_expressions, [1000.0, _id])
+    assert keyset_filter == {"$or": [
+        {"$or": [{"max_salary_monthly": {"$lt": 1000.0}}, {"max_salary_monthly": None}]},
+        {"max_salary_monthly": 1000.0, "$or": [{"_id": {"$lt": _id}}, {"_id": None}]},
+    ]}
+
+    # nothing sorts after null in descending order, only the tie-breaker branch remains
+    keyset_filter = build_keyset_filter(sort_expressions, [None, _id])
+    assert keyset_filter == {"$or": [
+        {"max_salary_monthly": None, "$or": [{"_id": {"$lt": _id}}, {"_id": None}]},
+    ]}
@@ -3,4 +3,6 @@ export interface PaginatedResponse<T> {
     page: number,
     size: number,
     element_count: number,
+    element_count_exact: boolean,
+    next_cursor?: string,
 }
\ No newline at end of file